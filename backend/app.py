@@ -1,42 +1,226 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from datetime import datetime
+import base64
+import csv
+import io
+import json
 import os
 import sqlite3
-from contextlib import contextmanager
 
 # Import route blueprints
 from routes.categories import categories_bp
+from count_cache import count_cache, estimate_count, normalize_filters
+from dataset_version import get_dataset_version, get_table_version
+from db import get_db_connection, pool_metrics
+from brand_store import brand_stores
+from category_index import category_indexes
+from http_cache import etag_cached
+from json_rows import cursor_columns, execute_tuples, get_shape, json_response, rows_data
+from query_audit import register_query
+import db
 
 app = Flask(__name__)
 CORS(app)
 
-# Database configuration
-DATABASE_PATH = os.getenv('DATABASE_URL', 'sqlite:///analytics.db').replace('sqlite:///', '')
-
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    try:
-        yield conn
-    finally:
-        conn.close()
-
 # Register blueprints
 app.register_blueprint(categories_bp, url_prefix='/api')
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    try:
+        with get_db_connection(readonly=True) as conn:
+            dataset_version = get_dataset_version(conn)
+    except sqlite3.Error:
+        # The service is up even before the ETL has created the database
+        dataset_version = None
+    
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'service': 'scout-analytics-api'
+        'service': 'scout-analytics-api',
+        'dataset_version': dataset_version
     })
 
+# Connection pool metrics endpoint
+@app.route('/api/health/db-pool', methods=['GET'])
+def db_pool_health():
+    return jsonify({'pools': pool_metrics()})
+
+def encode_cursor(date, transaction_id):
+    """Encode the last (date, transaction_id) of a page as an opaque cursor"""
+    raw = json.dumps([date, transaction_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date, transaction_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(date, str) or not isinstance(transaction_id, str):
+        raise ValueError('Invalid cursor')
+    return date, transaction_id
+
+TRANSACTIONS_SELECT = """
+            SELECT 
+                t.transaction_id,
+                t.date,
+                CAST(t.total_amount AS REAL) as total_amount,
+                s.name as store_name,
+                s.city,
+                s.region,
+                c.name as customer_name,
+                c.segment
+            FROM transactions t
+            LEFT JOIN stores s ON t.store_id = s.id
+            LEFT JOIN customers c ON t.customer_id = c.id
+"""
+
+def transactions_query(where_conditions, tail=""):
+    """The transactions listing in API order, with optional filters and a LIMIT/OFFSET tail"""
+    where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return f"""
+        {TRANSACTIONS_SELECT}
+        {where_clause}
+        ORDER BY t.date DESC, t.transaction_id DESC
+        {tail}
+    """
+
+def transactions_count_query(where_conditions):
+    where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    return f"""
+        SELECT COUNT(*) as total 
+        FROM transactions t 
+        {where_clause}
+    """
+
+KEYSET_CONDITION = "(t.date, t.transaction_id) < (?, ?)"
+
+def get_transactions_page_after(conn, where_conditions, params, cursor, per_page, shape,
+                                total=None, total_is_estimate=False):
+    """Keyset pagination: resume strictly after the (date, transaction_id) in the cursor.
+    
+    The range predicate lets SQLite seek straight to the next row instead of
+    scanning and discarding every row before it as OFFSET does.
+    """
+    where_conditions = list(where_conditions)
+    params = list(params)
+    
+    if cursor:
+        try:
+            last_date, last_transaction_id = decode_cursor(cursor)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        where_conditions.append(KEYSET_CONDITION)
+        params.extend([last_date, last_transaction_id])
+    
+    # Fetch one extra row to know whether another page exists
+    params.append(per_page + 1)
+    result = execute_tuples(conn, transactions_query(where_conditions, "LIMIT ?"), params)
+    columns = cursor_columns(result)
+    rows = result.fetchall()
+    
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    next_cursor = None
+    if has_more:
+        last = dict(zip(columns, rows[-1]))
+        next_cursor = encode_cursor(last['date'], last['transaction_id'])
+    
+    pagination = {
+        'per_page': per_page,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+    if total is not None:
+        pagination['total'] = total
+        pagination['total_is_estimate'] = total_is_estimate
+    
+    return json_response({
+        'data': rows_data(columns, rows, shape),
+        'pagination': pagination
+    })
+
+# transaction_categories is maintained by the ETL (see ETLPipeline.refresh_category_map)
+CATEGORY_FILTER = """
+    t.id IN (
+        SELECT tc.transaction_id
+        FROM transaction_categories tc
+        WHERE tc.category_id IN ({placeholders})
+    )
+"""
+
+def expand_category(categories, category_id):
+    """A category filter matches products in the category or anywhere beneath it"""
+    if categories is None or category_id not in categories:
+        return [category_id]
+    return categories.descendant_ids(category_id)
+
+def build_transaction_filters(args, categories=None):
+    """Translate the shared transaction filter query parameters into SQL conditions"""
+    where_conditions = []
+    params = []
+    
+    if args.get('date_from'):
+        where_conditions.append("t.date >= ?")
+        params.append(args.get('date_from'))
+    
+    if args.get('date_to'):
+        where_conditions.append("t.date <= ?")
+        params.append(args.get('date_to'))
+    
+    category_filters = [c for c in (args.get('parent_category'), args.get('sub_category')) if c]
+    if (len(category_filters) == 2 and categories is not None
+            and all(c in categories for c in category_filters)
+            and categories.is_descendant(category_filters[1], category_filters[0])):
+        # The sub category's subtree already lies inside the parent's
+        category_filters = category_filters[1:]
+    
+    for category_id in category_filters:
+        category_ids = expand_category(categories, category_id)
+        placeholders = ", ".join("?" for _ in category_ids)
+        where_conditions.append(CATEGORY_FILTER.format(placeholders=placeholders))
+        params.extend(category_ids)
+    
+    return where_conditions, params
+
+def get_filter_categories(conn, args):
+    """Load the category index only when a category filter needs expanding"""
+    if args.get('parent_category') or args.get('sub_category'):
+        return category_indexes.get(conn, db.DATABASE_PATH)
+    return None
+
+COUNT_SOURCE_TABLES = ('transactions', 'transaction_items', 'products', 'categories', 'transaction_categories')
+
+INCLUDE_TOTAL_MODES = ('exact', 'estimate', 'none')
+
+def get_transactions_total(conn, where_conditions, params, filter_key, include_total):
+    """Return (total, is_estimate) for the filtered transactions, using the count cache"""
+    if include_total == 'none':
+        return None, False
+    
+    version = tuple(get_table_version(conn, table) for table in COUNT_SOURCE_TABLES)
+    total = count_cache.get(('exact', filter_key), version)
+    if total is not None:
+        return total, False
+    
+    if include_total == 'estimate':
+        total = count_cache.get(('estimate', filter_key), version)
+        if total is None:
+            total = estimate_count(conn, 'transactions', 't', where_conditions, params)
+            count_cache.set(('estimate', filter_key), version, total)
+        return total, True
+    
+    total = conn.execute(transactions_count_query(where_conditions), params).fetchone()['total']
+    count_cache.set(('exact', filter_key), version, total)
+    return total, False
+
 # Transactions endpoint
 @app.route('/api/transactions', methods=['GET'])
+@etag_cached()
 def get_transactions():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 50, type=int)
@@ -44,90 +228,121 @@ def get_transactions():
     date_to = request.args.get('date_to')
     parent_category = request.args.get('parent_category')
     sub_category = request.args.get('sub_category')
+    # Passing `cursor` (empty for the first page) switches to keyset pagination
+    cursor = request.args.get('cursor')
+    include_total = request.args.get('include_total', 'exact' if cursor is None else 'none')
+    
+    if include_total not in INCLUDE_TOTAL_MODES:
+        return jsonify({'error': f"include_total must be one of {', '.join(INCLUDE_TOTAL_MODES)}"}), 400
     
+    try:
+        shape = get_shape(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    filter_key = normalize_filters(
+        date_from=date_from,
+        date_to=date_to,
+        parent_category=parent_category,
+        sub_category=sub_category
+    )
     offset = (page - 1) * per_page
     
     with get_db_connection() as conn:
         # Build query with optional filters
-        where_conditions = []
-        params = []
-        
-        if date_from:
-            where_conditions.append("t.date >= ?")
-            params.append(date_from)
-        
-        if date_to:
-            where_conditions.append("t.date <= ?")
-            params.append(date_to)
+        where_conditions, params = build_transaction_filters(
+            request.args, get_filter_categories(conn, request.args)
+        )
         
-        if parent_category:
-            where_conditions.append("p.parent_category_id = ?")
-            params.append(parent_category)
+        # Get total count (cached per filter set, or estimated/skipped on request)
+        total, total_is_estimate = get_transactions_total(
+            conn, where_conditions, params, filter_key, include_total
+        )
         
-        if sub_category:
-            where_conditions.append("p.category_id = ?")
-            params.append(sub_category)
-        
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        # Get total count
-        count_query = f"""
-            SELECT COUNT(*) as total 
-            FROM transactions t 
-            {where_clause}
-        """
-        total = conn.execute(count_query, params).fetchone()['total']
+        if cursor is not None:
+            return get_transactions_page_after(
+                conn, where_conditions, params, cursor, per_page, shape, total, total_is_estimate
+            )
         
         # Get transactions with joins
-        query = f"""
-            SELECT 
-                t.transaction_id,
-                t.date,
-                t.total_amount,
-                s.name as store_name,
-                s.city,
-                s.region,
-                c.name as customer_name,
-                c.segment
-            FROM transactions t
-            LEFT JOIN stores s ON t.store_id = s.id
-            LEFT JOIN customers c ON t.customer_id = c.id
-            {where_clause}
-            ORDER BY t.date DESC
-            LIMIT ? OFFSET ?
-        """
-        
         params.extend([per_page, offset])
-        transactions = conn.execute(query, params).fetchall()
-        
-        # Convert to list of dicts
-        data = []
-        for row in transactions:
-            data.append({
-                'transaction_id': row['transaction_id'],
-                'date': row['date'],
-                'total_amount': float(row['total_amount']),
-                'store_name': row['store_name'],
-                'city': row['city'],
-                'region': row['region'],
-                'customer_name': row['customer_name'],
-                'segment': row['segment']
-            })
+        result = execute_tuples(conn, transactions_query(where_conditions, "LIMIT ? OFFSET ?"), params)
+        data = rows_data(cursor_columns(result), result.fetchall(), shape)
         
-        pages = (total + per_page - 1) // per_page
+        pages = (total + per_page - 1) // per_page if total is not None else None
         
-        return jsonify({
+        return json_response({
             'data': data,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
                 'total': total,
+                'total_is_estimate': total_is_estimate,
                 'pages': pages
             }
         })
 
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+EXPORT_COLUMNS = [
+    'transaction_id', 'date', 'total_amount', 'store_name', 'city', 'region', 'customer_name', 'segment'
+]
+EXPORT_BATCH_SIZE = 1000
+
+def stream_transactions_export(query, params, export_format):
+    """Yield the export a batch at a time so memory stays flat regardless of row count"""
+    # The connection is checked out for the lifetime of the stream, not the request handler
+    with get_db_connection(readonly=True) as conn:
+        conn.row_factory = None
+        try:
+            cursor = conn.execute(query, params)
+            if export_format == 'csv':
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPORT_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                if export_format == 'csv':
+                    writer.writerows(rows)
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+                else:
+                    yield ''.join(
+                        json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + '\n' for row in rows
+                    )
+            if export_format == 'csv' and buffer.tell():
+                yield buffer.getvalue()
+        finally:
+            conn.row_factory = sqlite3.Row
+
+# Transactions export endpoint
+@app.route('/api/transactions/export', methods=['GET'])
+def export_transactions():
+    """Stream every transaction matching the filters as NDJSON or CSV"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of {', '.join(EXPORT_FORMATS)}"}), 400
+    
+    with get_db_connection() as conn:
+        categories = get_filter_categories(conn, request.args)
+    where_conditions, params = build_transaction_filters(request.args, categories)
+    query = transactions_query(where_conditions)
+    
+    response = Response(
+        stream_with_context(stream_transactions_export(query, params, export_format)),
+        mimetype=EXPORT_FORMATS[export_format]
+    )
+    response.headers['Content-Disposition'] = f'attachment; filename=transactions.{export_format}'
+    return response
+
 # Products endpoint
 @app.route('/api/products', methods=['GET'])
+@etag_cached()
 def get_products():
     category = request.args.get('category')
     search = request.args.get('search')
@@ -139,47 +354,155 @@ def get_products():
 
 # Regions endpoint
 @app.route('/api/regions', methods=['GET'])
+@etag_cached()
 def get_regions():
     return jsonify({
         'data': [],
         'total': 0
     })
 
+TOP_PRODUCTS_LIMIT = 5
+
+SUMMARY_TOTALS_QUERY = """
+    SELECT COALESCE(SUM(r.transactions), 0) as transactions,
+           COALESCE(SUM(r.revenue), 0) as revenue
+    FROM rollup_daily_region r
+    {where_clause}
+"""
+SUMMARY_REGION_QUERY = """
+    SELECT r.region, SUM(r.revenue) as revenue, SUM(r.transactions) as transactions
+    FROM rollup_daily_region r
+    {where_clause}
+    GROUP BY r.region
+    ORDER BY revenue DESC
+"""
+SUMMARY_CATEGORY_QUERY = """
+    SELECT r.category, SUM(r.revenue) as revenue, SUM(r.units) as units
+    FROM rollup_daily_region_category r
+    {where_clause}
+    GROUP BY r.category
+    ORDER BY revenue DESC
+"""
+SUMMARY_TOP_PRODUCTS_QUERY = """
+    SELECT r.product_id, p.name, p.brand, SUM(r.revenue) as revenue, SUM(r.units) as units
+    FROM rollup_daily_region_product r
+    LEFT JOIN products p ON r.product_id = p.id
+    {where_clause}
+    GROUP BY r.product_id
+    ORDER BY revenue DESC
+    LIMIT ?
+"""
+
 # Analytics summary endpoint
 @app.route('/api/analytics/summary', methods=['GET'])
+@etag_cached()
 def get_analytics_summary():
+    """Summarize sales from the ETL-maintained daily rollups, never the raw tables"""
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     region = request.args.get('region')
     
+    where_conditions = []
+    params = []
+    
+    if date_from:
+        where_conditions.append("r.day >= ?")
+        params.append(date_from[:10])
+    
+    if date_to:
+        where_conditions.append("r.day <= ?")
+        params.append(date_to[:10])
+    
+    if region:
+        where_conditions.append("r.region = ?")
+        params.append(region)
+    
+    where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+    
+    try:
+        with get_db_connection() as conn:
+            totals = conn.execute(SUMMARY_TOTALS_QUERY.format(where_clause=where_clause), params).fetchone()
+            
+            revenue_by_region = conn.execute(
+                SUMMARY_REGION_QUERY.format(where_clause=where_clause), params
+            ).fetchall()
+            
+            revenue_by_category = conn.execute(
+                SUMMARY_CATEGORY_QUERY.format(where_clause=where_clause), params
+            ).fetchall()
+            
+            top_products = conn.execute(
+                SUMMARY_TOP_PRODUCTS_QUERY.format(where_clause=where_clause), params + [TOP_PRODUCTS_LIMIT]
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        # The ETL hasn't created this database, or built its rollups, yet
+        if 'no such table' not in str(e) and 'unable to open' not in str(e):
+            raise
+        totals = {'transactions': 0, 'revenue': 0}
+        revenue_by_region = revenue_by_category = top_products = []
+    
+    total_transactions = totals['transactions']
+    total_revenue = float(totals['revenue'])
+    
     return jsonify({
-        'total_revenue': 0,
-        'total_transactions': 0,
-        'average_basket_size': 0,
-        'top_products': [],
-        'revenue_by_region': []
+        'total_revenue': round(total_revenue, 2),
+        'total_transactions': total_transactions,
+        'average_basket_size': round(total_revenue / total_transactions, 2) if total_transactions else 0,
+        'top_products': [
+            {
+                'product_id': row['product_id'],
+                'name': row['name'],
+                'brand': row['brand'],
+                'revenue': round(row['revenue'], 2),
+                'units': row['units']
+            }
+            for row in top_products
+        ],
+        'revenue_by_region': [
+            {
+                'region': row['region'],
+                'revenue': round(row['revenue'], 2),
+                'transactions': row['transactions']
+            }
+            for row in revenue_by_region
+        ],
+        'revenue_by_category': [
+            {
+                'category': row['category'],
+                'revenue': round(row['revenue'], 2),
+                'units': row['units']
+            }
+            for row in revenue_by_category
+        ]
     })
 
 # Brand performance endpoint
 @app.route('/api/analytics/brand-performance', methods=['GET'])
+@etag_cached()
 def get_brand_performance():
+    """Brand metrics from the in-memory columnar store, rebuilt after each ETL load"""
     brand = request.args.get('brand')
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
+    category = request.args.get('category')
+    
+    with get_db_connection() as conn:
+        store = brand_stores.get(conn, db.DATABASE_PATH)
+    
+    try:
+        performance = store.brand_performance(brand, date_from, date_to, category)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({
         'brand': brand,
-        'metrics': {
-            'revenue': 0,
-            'units_sold': 0,
-            'market_share': 0,
-            'growth_rate': 0
-        },
-        'trends': []
+        'metrics': performance['metrics'],
+        'trends': performance['trends']
     })
 
 # Consumer insights endpoint
 @app.route('/api/analytics/consumer-insights', methods=['GET'])
+@etag_cached()
 def get_consumer_insights():
     segment = request.args.get('segment')
     
@@ -189,6 +512,30 @@ def get_consumer_insights():
         'preferences': []
     })
 
+def register_audited_queries():
+    """Register representative shapes of the queries above for scripts/audit_query_plans.py"""
+    by_date, date_params = build_transaction_filters({'date_from': '2024-01-01', 'date_to': '2024-01-31'})
+    by_category, category_params = build_transaction_filters({'parent_category': 'beverages'})
+    
+    register_query('transactions.page', transactions_query([], "LIMIT ? OFFSET ?"), [50, 0])
+    register_query('transactions.page.date_range',
+                   transactions_query(by_date, "LIMIT ? OFFSET ?"), date_params + [50, 0])
+    register_query('transactions.page.category',
+                   transactions_query(by_category, "LIMIT ? OFFSET ?"), category_params + [50, 0])
+    register_query('transactions.after_cursor',
+                   transactions_query([KEYSET_CONDITION], "LIMIT ?"), ['2024-06-01', 'TXN-0001', 51])
+    register_query('transactions.count.date_range', transactions_count_query(by_date), date_params)
+    register_query('transactions.count.category', transactions_count_query(by_category), category_params)
+    register_query('transactions.export.date_range', transactions_query(by_date), date_params)
+    
+    day_range = "WHERE r.day >= ? AND r.day <= ?"
+    for name, query in (('totals', SUMMARY_TOTALS_QUERY), ('region', SUMMARY_REGION_QUERY),
+                        ('category', SUMMARY_CATEGORY_QUERY), ('top_products', SUMMARY_TOP_PRODUCTS_QUERY)):
+        params = ['2024-01-01', '2024-01-31'] + ([TOP_PRODUCTS_LIMIT] if 'LIMIT' in query else [])
+        register_query(f'summary.{name}.date_range', query.format(where_clause=day_range), params)
+
+register_audited_queries()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Process-local columnar store for brand performance queries.
+
+Line items are loaded once from `transaction_items` joined to `products` into
+NumPy arrays sorted by day, with brand and category dictionary-encoded as
+integer codes. Any date window is then two `searchsorted` calls and the
+per-brand aggregates are `bincount`s over the slice, with no SQL per request.
+"""
+
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+from dataset_version import get_table_version
+
+SOURCE_TABLES = ('transactions', 'transaction_items', 'products')
+
+SOURCE_QUERY = """
+    SELECT substr(t.date, 1, 10) as day,
+           COALESCE(p.brand, 'Unknown') as brand,
+           COALESCE(p.category, 'Unknown') as category,
+           COALESCE(ti.total_price, 0) as revenue,
+           COALESCE(ti.quantity, 0) as units
+    FROM transaction_items ti
+    JOIN transactions t ON ti.transaction_id = t.id
+    LEFT JOIN products p ON ti.product_id = p.id
+"""
+
+
+class BrandColumnarStore:
+    """Immutable column arrays for one snapshot of the line items"""
+
+    def __init__(self, days, brands, categories, revenue, units, version=None):
+        self.version = version
+        self.brands, brand_codes = np.unique(np.asarray(brands, dtype=object).astype(str), return_inverse=True)
+        self.categories, category_codes = np.unique(np.asarray(categories, dtype=object).astype(str), return_inverse=True)
+        self.brand_index = {name: code for code, name in enumerate(self.brands.tolist())}
+        self.category_index = {name: code for code, name in enumerate(self.categories.tolist())}
+
+        day_values = np.asarray(days, dtype='datetime64[D]')
+        self.base_day = day_values.min() if len(day_values) else np.datetime64('1970-01-01', 'D')
+        day_offsets = (day_values - self.base_day).astype(np.int32)
+
+        order = np.argsort(day_offsets, kind='stable')
+        self.day_offsets = day_offsets[order]
+        self.brand_codes = brand_codes.astype(np.int32)[order]
+        self.category_codes = category_codes.astype(np.int32)[order]
+        self.revenue = np.asarray(revenue, dtype=np.float64)[order]
+        self.units = np.asarray(units, dtype=np.int64)[order]
+
+    @classmethod
+    def from_connection(cls, conn, version=None):
+        try:
+            rows = conn.execute(SOURCE_QUERY).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'no such table' not in str(e):
+                raise
+            rows = []
+        columns = list(zip(*rows)) if rows else [[], [], [], [], []]
+        return cls(*columns, version=version)
+
+    def __len__(self):
+        return len(self.day_offsets)
+
+    def _offset(self, value, default, name):
+        if not value:
+            return default
+        try:
+            day = date.fromisoformat(value[:10])
+        except ValueError:
+            raise ValueError(f"{name} must be a date in YYYY-MM-DD format")
+        return int((np.datetime64(day, 'D') - self.base_day).astype(np.int64))
+
+    def _slice(self, start, end):
+        """Index bounds of rows with start <= day offset <= end"""
+        lo, hi = np.searchsorted(self.day_offsets, [start, end + 1], side='left')
+        return int(lo), int(hi)
+
+    def _brand_totals(self, lo, hi, category_code=None):
+        brand_codes = self.brand_codes[lo:hi]
+        revenue = self.revenue[lo:hi]
+        units = self.units[lo:hi]
+        if category_code is not None:
+            mask = self.category_codes[lo:hi] == category_code
+            brand_codes, revenue, units = brand_codes[mask], revenue[mask], units[mask]
+        n = len(self.brands)
+        return (np.bincount(brand_codes, weights=revenue, minlength=n),
+                np.bincount(brand_codes, weights=units, minlength=n))
+
+    def brand_performance(self, brand, date_from=None, date_to=None, category=None):
+        """Revenue, units, market share, growth vs. the preceding window, and a daily trend"""
+        empty = {
+            'metrics': {'revenue': 0, 'units_sold': 0, 'market_share': 0, 'growth_rate': 0},
+            'trends': []
+        }
+        if not len(self) or brand not in self.brand_index:
+            return empty
+        category_code = None
+        if category:
+            if category not in self.category_index:
+                return empty
+            category_code = self.category_index[category]
+
+        start = self._offset(date_from, int(self.day_offsets[0]), 'date_from')
+        end = self._offset(date_to, int(self.day_offsets[-1]), 'date_to')
+        if end < start:
+            return empty
+        code = self.brand_index[brand]
+
+        lo, hi = self._slice(start, end)
+        revenue_by_brand, units_by_brand = self._brand_totals(lo, hi, category_code)
+        revenue = float(revenue_by_brand[code])
+        total_revenue = float(revenue_by_brand.sum())
+
+        # Growth compares against the window of equal length right before this one
+        window = end - start + 1
+        prev_lo, prev_hi = self._slice(start - window, start - 1)
+        previous_revenue = float(self._brand_totals(prev_lo, prev_hi, category_code)[0][code])
+        growth_rate = (revenue - previous_revenue) / previous_revenue * 100 if previous_revenue else 0
+
+        mask = self.brand_codes[lo:hi] == code
+        if category_code is not None:
+            mask &= self.category_codes[lo:hi] == category_code
+        day_index = self.day_offsets[lo:hi][mask] - start
+        daily_revenue = np.bincount(day_index, weights=self.revenue[lo:hi][mask], minlength=window)
+        daily_units = np.bincount(day_index, weights=self.units[lo:hi][mask], minlength=window)
+        first_day = date.fromisoformat(str(self.base_day)) + timedelta(days=start)
+        active_days = np.flatnonzero((daily_units > 0) | (daily_revenue != 0))
+        trends = [
+            {
+                'date': (first_day + timedelta(days=i)).isoformat(),
+                'revenue': round(float(daily_revenue[i]), 2),
+                'units_sold': int(daily_units[i])
+            }
+            for i in active_days.tolist()
+        ]
+
+        return {
+            'metrics': {
+                'revenue': round(revenue, 2),
+                'units_sold': int(units_by_brand[code]),
+                'market_share': round(revenue / total_revenue * 100, 2) if total_revenue else 0,
+                'growth_rate': round(growth_rate, 2)
+            },
+            'trends': trends
+        }
+
+
+class BrandStoreHolder:
+    """Keeps the current store per database and swaps in a rebuilt one after ETL loads"""
+
+    def __init__(self):
+        self._stores = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, database_path):
+        version = tuple(get_table_version(conn, table) for table in SOURCE_TABLES)
+        store = self._stores.get(database_path)
+        if store is not None and store.version == version:
+            return store
+        with self._lock:
+            store = self._stores.get(database_path)
+            if store is None or store.version != version:
+                store = BrandColumnarStore.from_connection(conn, version=version)
+                # Single reference assignment, so readers see the old or new store, never a mix
+                self._stores[database_path] = store
+            return store
+
+    def clear(self):
+        with self._lock:
+            self._stores.clear()
+
+
+brand_stores = BrandStoreHolder()
@@ -0,0 +1,140 @@
+"""
+In-memory index over the `categories` tree.
+
+The table built by scripts/create_category_tree.py is loaded once and laid out
+in depth-first (Euler tour) order. Every category gets an interval
+[enter, exit) into that order, so its whole subtree is one contiguous slice:
+subtrees and descendant id sets cost O(subtree) and ancestors O(depth), with no
+per-level queries. The index is rebuilt when the table's version changes;
+triggers on the table bump it on every insert, update and delete.
+"""
+
+import sqlite3
+import threading
+
+from dataset_version import get_table_version
+
+CATEGORIES_QUERY = """
+    SELECT id, name, parent_id, level, path
+    FROM categories
+    ORDER BY name
+"""
+
+
+class CategoryIndex:
+    """Immutable nested-interval index for one snapshot of the categories table"""
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.nodes = {}
+        self.children = {None: []}
+        for row in rows:
+            category = {
+                'id': row[0],
+                'name': row[1],
+                'parent_id': row[2],
+                'level': row[3],
+                'path': row[4]
+            }
+            self.nodes[category['id']] = category
+            self.children.setdefault(category['id'], [])
+        for category in self.nodes.values():
+            parent_id = category['parent_id']
+            # Orphans are treated as roots so they stay reachable
+            if parent_id is not None and parent_id not in self.nodes:
+                parent_id = None
+            self.children[parent_id].append(category['id'])
+
+        self.order = []
+        self.enter = {}
+        self.exit = {}
+        # Iterative DFS; rows arrive sorted by name, so siblings stay alphabetical
+        stack = [(category_id, False) for category_id in reversed(self.children[None])]
+        while stack:
+            category_id, done = stack.pop()
+            if done:
+                self.exit[category_id] = len(self.order)
+                continue
+            self.enter[category_id] = len(self.order)
+            self.order.append(category_id)
+            stack.append((category_id, True))
+            stack.extend((child_id, False) for child_id in reversed(self.children[category_id]))
+
+    @classmethod
+    def from_connection(cls, conn, version=None):
+        try:
+            rows = conn.execute(CATEGORIES_QUERY).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'no such table' not in str(e):
+                raise
+            rows = []
+        return cls([tuple(row) for row in rows], version=version)
+
+    def __contains__(self, category_id):
+        # Rows caught in a parent_id cycle are never reached from a root, so they aren't indexed
+        return category_id in self.enter
+
+    def get_children(self, parent_id=None):
+        return [self.nodes[child_id] for child_id in self.children.get(parent_id, [])]
+
+    def is_descendant(self, category_id, ancestor_id):
+        """True if category_id lies in ancestor_id's subtree (an interval check)"""
+        return self.enter[ancestor_id] <= self.enter[category_id] < self.exit[ancestor_id]
+
+    def descendant_ids(self, category_id, include_self=True):
+        start = self.enter[category_id] + (0 if include_self else 1)
+        return self.order[start:self.exit[category_id]]
+
+    def ancestors(self, category_id):
+        """Ancestors from the root down to the direct parent"""
+        chain = []
+        parent_id = self.nodes[category_id]['parent_id']
+        while parent_id in self.nodes:
+            chain.append(self.nodes[parent_id])
+            parent_id = self.nodes[parent_id]['parent_id']
+        return list(reversed(chain))
+
+    def subtree(self, category_id=None):
+        """Nested {..., 'children': [...]} trees under category_id (the whole forest if None)"""
+        if category_id is None:
+            ids = self.order
+            roots = self.children[None]
+        else:
+            ids = self.descendant_ids(category_id)
+            roots = [category_id]
+        root_ids = set(roots)
+        built = {}
+        for node_id in ids:
+            built[node_id] = dict(self.nodes[node_id], children=[])
+        for node_id in ids:
+            parent_id = self.nodes[node_id]['parent_id']
+            if node_id not in root_ids and parent_id in built:
+                built[parent_id]['children'].append(built[node_id])
+        return [built[root_id] for root_id in roots]
+
+
+class CategoryIndexHolder:
+    """Keeps the current index per database and rebuilds it when the table changes"""
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, conn, database_path):
+        version = get_table_version(conn, 'categories')
+        index = self._indexes.get(database_path)
+        if index is not None and index.version == version:
+            return index
+        with self._lock:
+            index = self._indexes.get(database_path)
+            if index is None or index.version != version:
+                index = CategoryIndex.from_connection(conn, version=version)
+                self._indexes[database_path] = index
+            return index
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+category_indexes = CategoryIndexHolder()
@@ -0,0 +1,88 @@
+"""
+Cached and estimated row counts for paginated endpoints.
+
+Counting every filtered row on each page request doubles the cost of a scroll.
+Counts are cached per normalized filter set and tagged with the table version
+the ETL records (see dataset_version.py), so a reload invalidates them even when
+it runs in a different process.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Number of evenly spaced rowids probed when estimating a filtered count
+ESTIMATE_SAMPLE_SIZE = 500
+
+
+def normalize_filters(**filters):
+    """Build a hashable cache key, treating missing and empty filters alike"""
+    return tuple(sorted((name, value or None) for name, value in filters.items()))
+
+
+class CountCache:
+    """Thread-safe LRU cache of counts with a TTL and table-version invalidation"""
+
+    def __init__(self, ttl=300, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, entry_version, stored_at = entry
+            if entry_version != version or time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (value, version, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def estimate_count(conn, table, alias, where_conditions, params):
+    """Estimate a filtered row count from a fixed-size sample of rowids.
+
+    Probes ESTIMATE_SAMPLE_SIZE evenly spaced rowids through the primary key and
+    scales the matching fraction by the rowid span, so the cost does not grow
+    with the table.
+    """
+    bounds = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+    low, high = bounds[0], bounds[1]
+    if low is None:
+        return 0
+
+    span = high - low + 1
+    if not where_conditions:
+        return span
+
+    step = max(span // ESTIMATE_SAMPLE_SIZE, 1)
+    sample = list(range(low, high + 1, step))[:ESTIMATE_SAMPLE_SIZE]
+    placeholders = ", ".join("?" for _ in sample)
+    query = f"""
+        SELECT COUNT(*)
+        FROM {table} {alias}
+        WHERE {alias}.rowid IN ({placeholders}) AND {" AND ".join(where_conditions)}
+    """
+    matching = conn.execute(query, sample + list(params)).fetchone()[0]
+    return round(span * matching / len(sample))
+
+
+count_cache = CountCache(ttl=int(os.getenv('COUNT_CACHE_TTL', 300)))
@@ -0,0 +1,76 @@
+"""
+Table and dataset versions recorded by data loads.
+
+Every load bumps a per-table counter in `etl_table_versions`. Caches derived
+from a table compare its version to decide whether they are stale, and the
+dataset version (the sum of all table versions) changes on every load, which
+makes it usable as a cross-process validator for HTTP caching.
+"""
+
+import sqlite3
+from datetime import datetime
+
+TABLE_VERSIONS_TABLE = 'etl_table_versions'
+
+
+def _create_versions_table(conn):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TABLE_VERSIONS_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            loaded_at TEXT
+        )
+    """)
+
+
+def bump_table_version(conn, table_name):
+    """Record a reload of table_name on a DB-API connection (the caller commits)"""
+    _create_versions_table(conn)
+    conn.execute(f"""
+        INSERT INTO {TABLE_VERSIONS_TABLE} (table_name, version, loaded_at)
+        VALUES (?, 1, ?)
+        ON CONFLICT(table_name) DO UPDATE
+        SET version = version + 1, loaded_at = excluded.loaded_at
+    """, (table_name, datetime.utcnow().isoformat()))
+
+
+def create_version_triggers(conn, table_name):
+    """Bump table_name's version on every INSERT, UPDATE and DELETE, whoever makes it.
+
+    For tables edited in place rather than reloaded by the ETL, so caches keyed
+    on the version (and the ETags built from it) still see every change.
+    """
+    _create_versions_table(conn)
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table_name}_version_{event.lower()}
+            AFTER {event} ON {table_name}
+            BEGIN
+                INSERT INTO {TABLE_VERSIONS_TABLE} (table_name, version, loaded_at)
+                VALUES ('{table_name}', 1, strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+                ON CONFLICT(table_name) DO UPDATE
+                SET version = version + 1, loaded_at = excluded.loaded_at;
+            END
+        """)
+
+
+def get_table_version(conn, table_name):
+    """Return the load version recorded for a table (0 if never recorded)"""
+    try:
+        row = conn.execute(
+            f"SELECT version FROM {TABLE_VERSIONS_TABLE} WHERE table_name = ?",
+            (table_name,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # Table versions are only tracked once the ETL has run against this database
+        return 0
+    return row[0] if row else 0
+
+
+def get_dataset_version(conn):
+    """Return a counter that increases whenever any table is reloaded"""
+    try:
+        row = conn.execute(f"SELECT COALESCE(SUM(version), 0) FROM {TABLE_VERSIONS_TABLE}").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0]
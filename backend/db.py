@@ -0,0 +1,171 @@
+"""
+Shared SQLite connection pool for the app and its blueprints.
+
+Opening a connection per request pays for a file open, a schema parse and a
+cold page cache every time. Connections are instead kept in small per-database
+pools, tuned once with PRAGMAs when they are opened, and handed out read-only
+to GET requests.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+
+from flask import has_request_context, request
+
+# Database configuration
+DATABASE_PATH = os.getenv('DATABASE_URL', 'sqlite:///analytics.db').replace('sqlite:///', '')
+
+POOL_SIZE = int(os.getenv('SQLITE_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.getenv('SQLITE_POOL_TIMEOUT', 30))
+MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+# Negative values are KiB rather than pages
+CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))
+
+READ_ONLY_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection frees up within the pool timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of tuned sqlite3 connections to one database"""
+
+    def __init__(self, database_path, readonly=False, max_size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.database_path = database_path
+        self.readonly = readonly
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        if self.readonly:
+            uri = f"file:{quote(os.path.abspath(self.database_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.database_path, check_same_thread=False)
+            # WAL lets readers keep going while the ETL writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size={CACHE_SIZE}")
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        return conn
+
+    def acquire(self):
+        with self._cond:
+            self._checkouts += 1
+            if not self._idle and self._open >= self.max_size:
+                self._waits += 1
+                if not self._cond.wait_for(lambda: self._idle or self._open < self.max_size,
+                                           timeout=self.timeout):
+                    raise PoolTimeout(f"No connection to {self.database_path} available "
+                                      f"after {self.timeout}s")
+            if self._idle:
+                # LIFO so the most recently used (warmest) connection is reused first
+                return self._idle.pop()
+            self._open += 1
+        try:
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        with self._cond:
+            if not self._closed:
+                self._idle.append(conn)
+                self._cond.notify()
+                return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Close idle connections; checked-out ones are closed as they come back"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+    def metrics(self):
+        with self._cond:
+            return {
+                'database': self.database_path,
+                'readonly': self.readonly,
+                'max_size': self.max_size,
+                'open': self._open,
+                'idle': len(self._idle),
+                'in_use': self._open - len(self._idle),
+                'checkouts': self._checkouts,
+                'waits': self._waits
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(database_path=None, readonly=False):
+    """Return the shared pool for a database path, creating it on first use"""
+    key = (database_path or DATABASE_PATH, readonly)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key[0], readonly=readonly)
+        return pool
+
+
+@contextmanager
+def get_db_connection(readonly=None):
+    """Check out a pooled connection, read-only by default for GET requests"""
+    if readonly is None:
+        readonly = has_request_context() and request.method in READ_ONLY_METHODS
+    with get_pool(DATABASE_PATH, readonly).connection() as conn:
+        yield conn
+
+
+def close_all_pools():
+    # Closed pools never re-pool connections, so later callers get fresh ones
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close_all()
+
+
+def pool_metrics():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.metrics() for pool in pools]
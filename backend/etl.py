@@ -1,12 +1,115 @@
 import pandas as pd
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Float, DateTime, ForeignKey, text
 from sqlalchemy.orm import declarative_base
-from datetime import datetime
+from datetime import datetime, timedelta
+import csv
 import os
-import json
+import time
+
+import dataset_version
+import etl_state
+from json_stream import iter_json_batches
 
 Base = declarative_base()
 
+# Composite indexes matching the API's filter and sort patterns. Loads replace
+# whole tables (dropping their indexes), so these are recreated after every load.
+INDEXES = [
+    # Date-ordered pages, keyset seeks and date-range counts without touching the table
+    ('idx_transactions_date_txn', 'transactions', 'date DESC, transaction_id DESC, id, store_id, customer_id, total_amount'),
+    ('idx_transactions_id', 'transactions', 'id'),
+    ('idx_transaction_items_txn', 'transaction_items', 'transaction_id, product_id, quantity, total_price'),
+    ('idx_products_id', 'products', 'id, category_id'),
+    ('idx_stores_id', 'stores', 'id'),
+    ('idx_customers_id', 'customers', 'id'),
+]
+
+# Loads are written to "<table>__shadow" and renamed over the live table when complete
+SHADOW_SUFFIX = '__shadow'
+
+# Rows per read_csv chunk; each chunk is inserted and committed as one transaction
+CSV_CHUNK_SIZE = int(os.getenv('ETL_CSV_CHUNK_SIZE', 50000))
+
+# Records per batch when streaming JSON/NDJSON sources
+JSON_BATCH_SIZE = int(os.getenv('ETL_JSON_BATCH_SIZE', 50000))
+
+# Explicit column types for CSV and JSON sources, so chunks neither re-infer types
+# nor disagree about them. Columns not listed are still inferred chunk by chunk.
+CSV_DTYPES = {
+    'regions': {'id': 'Int64', 'name': 'string', 'parent_region_id': 'Int64', 'level': 'string'},
+    'products': {
+        'id': 'Int64', 'sku': 'string', 'name': 'string', 'category': 'string',
+        'category_id': 'string', 'brand': 'string', 'price': 'float64'
+    },
+    'stores': {'id': 'Int64', 'store_code': 'string', 'name': 'string', 'city': 'string', 'region': 'string'},
+    'customers': {
+        'id': 'Int64', 'customer_code': 'string', 'name': 'string', 'region_id': 'Int64', 'segment': 'string'
+    },
+    'transactions': {
+        'id': 'Int64', 'transaction_id': 'string', 'date': 'string', 'customer_id': 'Int64',
+        'store_id': 'string', 'total_amount': 'float64'
+    },
+    'transaction_items': {
+        'id': 'Int64', 'transaction_id': 'Int64', 'product_id': 'Int64', 'quantity': 'Int64',
+        'unit_price': 'float64', 'total_price': 'float64'
+    },
+}
+
+# Incremental loads replace existing rows that share this key
+UPSERT_KEY = 'id'
+
+# Earliest rollup day of the rows whose keys are in temp.etl_delta_keys
+ROLLUP_DAY_QUERIES = {
+    'transactions': """
+        SELECT MIN(substr(date, 1, 10))
+        FROM transactions
+        WHERE id IN (SELECT key FROM temp.etl_delta_keys)
+    """,
+    'transaction_items': """
+        SELECT MIN(substr(t.date, 1, 10))
+        FROM transaction_items ti
+        JOIN transactions t ON ti.transaction_id = t.id
+        WHERE ti.id IN (SELECT key FROM temp.etl_delta_keys)
+    """,
+}
+
+ROLLUP_SOURCE_TABLES = {'stores', 'products', 'transactions', 'transaction_items'}
+
+def json_chunks(file_path, table_name, batch_size):
+    """DataFrames of batch_size streamed records, aligned to the first batch's columns"""
+    columns = None
+    dtypes = CSV_DTYPES.get(table_name, {})
+    for batch in iter_json_batches(file_path, batch_size):
+        # Keys missing from a record become nulls; keys the first batch didn't have are dropped
+        chunk = pd.DataFrame.from_records(batch, columns=columns)
+        columns = list(chunk.columns)
+        yield chunk.astype({column: dtype for column, dtype in dtypes.items() if column in chunk.columns})
+
+def source_chunks(file_path, table_name):
+    """DataFrame chunks of a CSV or JSON source file, with the table's declared dtypes"""
+    if str(file_path).endswith('.csv'):
+        with pd.read_csv(file_path, dtype=CSV_DTYPES.get(table_name), chunksize=CSV_CHUNK_SIZE) as chunks:
+            yield from chunks
+    else:
+        yield from json_chunks(file_path, table_name, JSON_BATCH_SIZE)
+
+def read_csv_header(file_path):
+    with open(file_path, newline='') as f:
+        return next(csv.reader(f), [])
+
+def create_table_indexes(conn, table_name=None):
+    """Create the INDEXES for table_name (all tables if None) on a DB-API connection.
+    
+    Indexes on tables or columns that haven't been loaded are skipped.
+    """
+    for name, table, columns in INDEXES:
+        if table_name is not None and table != table_name:
+            continue
+        try:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+        except Exception as e:
+            print(f"Skipping index {name}: {str(e).splitlines()[0]}")
+
 class ETLPipeline:
     def __init__(self, db_url='sqlite:///analytics.db'):
         self.engine = create_engine(db_url)
@@ -14,6 +117,9 @@ class ETLPipeline:
         
     def create_tables(self):
         """Create database tables if they don't exist"""
+        # Lets the same pipeline run more than once (e.g. repeated incremental runs)
+        self.metadata.clear()
+        
         # Regions table
         regions = Table('regions', self.metadata,
             Column('id', Integer, primary_key=True),
@@ -29,11 +135,22 @@ class ETLPipeline:
             Column('sku', String(50), unique=True),
             Column('name', String(200)),
             Column('category', String(100)),
+            Column('category_id', String(200)),
             Column('brand', String(100)),
             Column('price', Float),
             Column('created_at', DateTime, default=datetime.utcnow)
         )
         
+        # Stores table
+        stores = Table('stores', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('store_code', String(50), unique=True),
+            Column('name', String(200)),
+            Column('city', String(100)),
+            Column('region', String(100)),
+            Column('created_at', DateTime, default=datetime.utcnow)
+        )
+        
         # Customers table
         customers = Table('customers', self.metadata,
             Column('id', Integer, primary_key=True),
@@ -68,25 +185,374 @@ class ETLPipeline:
         
         self.metadata.create_all(self.engine)
         
-    def load_csv_data(self, file_path, table_name):
-        """Load data from CSV file into database table"""
+    def create_rollup_tables(self):
+        """Create the daily pre-aggregated tables behind /api/analytics/summary"""
+        with self.engine.begin() as conn:
+            # Transaction counts can't be summed across categories, so they get their own grain
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS rollup_daily_region (
+                    day TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    transactions INTEGER NOT NULL,
+                    revenue REAL NOT NULL,
+                    PRIMARY KEY (day, region)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS rollup_daily_region_category (
+                    day TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    revenue REAL NOT NULL,
+                    units INTEGER NOT NULL,
+                    PRIMARY KEY (day, region, category)
+                )
+            """))
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS rollup_daily_region_product (
+                    day TEXT NOT NULL,
+                    region TEXT NOT NULL,
+                    product_id INTEGER NOT NULL,
+                    revenue REAL NOT NULL,
+                    units INTEGER NOT NULL,
+                    PRIMARY KEY (day, region, product_id)
+                )
+            """))
+    
+    def refresh_rollups(self, day_from=None, day_to=None):
+        """Recompute rollup rows for the given day range (all days when omitted).
+        
+        Only rows for the affected days are deleted and re-aggregated, so loading a
+        day of new transactions doesn't rebuild the whole history.
+        """
+        self.create_rollup_tables()
+        
+        # Range predicates on the raw date column stay index-friendly
+        raw_conditions = []
+        rollup_conditions = []
+        params = {}
+        if day_from:
+            raw_conditions.append("t.date >= :day_from")
+            rollup_conditions.append("day >= :day_from")
+            params['day_from'] = day_from
+        if day_to:
+            raw_conditions.append("t.date < :day_after")
+            rollup_conditions.append("day <= :day_to")
+            params['day_to'] = day_to
+            params['day_after'] = (datetime.strptime(day_to, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+        where_clause = "WHERE " + " AND ".join(raw_conditions) if raw_conditions else ""
+        rollup_where = "WHERE " + " AND ".join(rollup_conditions) if rollup_conditions else ""
+        
+        with self.engine.begin() as conn:
+            for table in ('rollup_daily_region', 'rollup_daily_region_category', 'rollup_daily_region_product'):
+                conn.execute(text(f"DELETE FROM {table} {rollup_where}"), params)
+            
+            conn.execute(text(f"""
+                INSERT INTO rollup_daily_region (day, region, transactions, revenue)
+                SELECT substr(t.date, 1, 10), COALESCE(s.region, 'Unknown'),
+                       COUNT(*), COALESCE(SUM(t.total_amount), 0)
+                FROM transactions t
+                LEFT JOIN stores s ON t.store_id = s.id
+                {where_clause}
+                GROUP BY 1, 2
+            """), params)
+            conn.execute(text(f"""
+                INSERT INTO rollup_daily_region_category (day, region, category, revenue, units)
+                SELECT substr(t.date, 1, 10), COALESCE(s.region, 'Unknown'), COALESCE(p.category, 'Unknown'),
+                       COALESCE(SUM(ti.total_price), 0), COALESCE(SUM(ti.quantity), 0)
+                FROM transaction_items ti
+                JOIN transactions t ON ti.transaction_id = t.id
+                LEFT JOIN stores s ON t.store_id = s.id
+                LEFT JOIN products p ON ti.product_id = p.id
+                {where_clause}
+                GROUP BY 1, 2, 3
+            """), params)
+            conn.execute(text(f"""
+                INSERT INTO rollup_daily_region_product (day, region, product_id, revenue, units)
+                SELECT substr(t.date, 1, 10), COALESCE(s.region, 'Unknown'), ti.product_id,
+                       COALESCE(SUM(ti.total_price), 0), COALESCE(SUM(ti.quantity), 0)
+                FROM transaction_items ti
+                JOIN transactions t ON ti.transaction_id = t.id
+                LEFT JOIN stores s ON t.store_id = s.id
+                {where_clause}
+                GROUP BY 1, 2, 3
+            """), params)
+        
+        self.bump_table_version('rollups')
+    
+    def refresh_category_map(self):
+        """Rebuild the category -> transaction mapping behind category filters.
+        
+        Each (category_id, transaction_id) pair is stored once, clustered by
+        category, so a filter is an index range per category instead of probing
+        every transaction's line items.
+        """
+        shadow = f"transaction_categories{SHADOW_SUFFIX}"
+        with self.engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {shadow}"))
+            conn.execute(text(f"""
+                CREATE TABLE {shadow} (
+                    category_id TEXT NOT NULL,
+                    transaction_id INTEGER NOT NULL,
+                    PRIMARY KEY (category_id, transaction_id)
+                ) WITHOUT ROWID
+            """))
+            conn.execute(text(f"""
+                INSERT OR IGNORE INTO {shadow} (category_id, transaction_id)
+                SELECT p.category_id, ti.transaction_id
+                FROM transaction_items ti
+                JOIN products p ON ti.product_id = p.id
+                WHERE p.category_id IS NOT NULL AND ti.transaction_id IS NOT NULL
+            """))
+        
+        conn = self.engine.raw_connection()
+        try:
+            self.swap_in_shadow(conn, 'transaction_categories')
+        finally:
+            conn.close()
+    
+    def create_indexes(self):
+        """Create any missing INDEXES and refresh planner statistics.
+        
+        Loads going through bulk_load index their table as it is swapped in; this
+        covers tables written any other way and runs ANALYZE once they're all loaded.
+        """
+        conn = self.engine.raw_connection()
+        try:
+            create_table_indexes(conn)
+            conn.execute("ANALYZE")
+            conn.commit()
+        finally:
+            conn.close()
+    
+    def swap_in_shadow(self, conn, table_name):
+        """Atomically replace table_name with its fully loaded shadow table.
+        
+        The drop, rename, index builds and version bump commit as one transaction
+        on a DB-API connection. Readers (in WAL mode) keep seeing the old table
+        until the commit and then see the complete new one, never an empty or
+        partially loaded table. Indexes are built here rather than on the shadow
+        table because SQLite index names are global and can't be renamed.
+        """
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+            conn.execute(f'ALTER TABLE "{table_name}{SHADOW_SUFFIX}" RENAME TO "{table_name}"')
+            create_table_indexes(conn, table_name)
+            dataset_version.bump_table_version(conn, table_name)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Swapped in {table_name} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    
+    def bump_table_version(self, table_name):
+        """Record a reload of table_name so API caches derived from it are invalidated"""
+        conn = self.engine.raw_connection()
+        try:
+            dataset_version.bump_table_version(conn, table_name)
+            conn.commit()
+        finally:
+            conn.close()
+        
+    def bulk_load(self, table_name, chunks):
+        """Replace table_name with the rows of an iterable of DataFrames, one transaction per chunk.
+        
+        Only the current chunk is held in memory. Chunks are bulk-inserted with
+        executemany into a shadow table created from the first chunk's columns,
+        which is swapped in once complete (see swap_in_shadow), so the API keeps
+        serving the previous data until then. Synchronous writes are off while
+        the shadow table fills; a crash there loses nothing the API can see.
+        Returns (rows loaded, seconds taken).
+        """
+        started = time.perf_counter()
+        shadow = f"{table_name}{SHADOW_SUFFIX}"
+        rows_loaded = 0
+        created = False
+        conn = self.engine.raw_connection()
         try:
-            df = pd.read_csv(file_path)
-            df.to_sql(table_name, self.engine, if_exists='replace', index=False)
-            print(f"Loaded {len(df)} rows into {table_name}")
+            # Lets readers carry on during the swap; a no-op once set
+            conn.execute("PRAGMA journal_mode = WAL")
+            synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+            conn.execute("PRAGMA synchronous = OFF")
+            try:
+                for chunk in chunks:
+                    if not created:
+                        conn.execute(f'DROP TABLE IF EXISTS "{shadow}"')
+                        conn.execute(pd.io.sql.get_schema(chunk, shadow))
+                        columns = ", ".join(f'"{column}"' for column in chunk.columns)
+                        placeholders = ", ".join("?" for _ in chunk.columns)
+                        insert = f'INSERT INTO "{shadow}" ({columns}) VALUES ({placeholders})'
+                        created = True
+                    # Boxing to object turns numpy scalars into Python ones and missing values into None
+                    values = chunk.astype(object).where(chunk.notna(), None)
+                    conn.executemany(insert, values.itertuples(index=False, name=None))
+                    conn.commit()
+                    rows_loaded += len(chunk)
+            except Exception:
+                conn.rollback()
+                conn.execute(f'DROP TABLE IF EXISTS "{shadow}"')
+                raise
+            finally:
+                conn.execute(f"PRAGMA synchronous = {synchronous}")
+            
+            if created:
+                self.swap_in_shadow(conn, table_name)
+        finally:
+            conn.close()
+        return rows_loaded, time.perf_counter() - started
+    
+    def load_csv_data(self, file_path, table_name, chunksize=None):
+        """Load data from CSV file into database table, streaming it in chunks"""
+        try:
+            chunks = pd.read_csv(
+                file_path,
+                dtype=CSV_DTYPES.get(table_name),
+                chunksize=chunksize or CSV_CHUNK_SIZE
+            )
+            with chunks:
+                rows, elapsed = self.bulk_load(table_name, chunks)
+            rate = rows / elapsed if elapsed else 0
+            print(f"Loaded {rows} rows into {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
             return True
         except Exception as e:
             print(f"Error loading {file_path}: {str(e)}")
             return False
     
-    def load_json_data(self, file_path, table_name):
-        """Load data from JSON file into database table"""
+    def append_csv_data(self, file_path, table_name, columns, start, end, checksum):
+        """Upsert the CSV rows after byte offset `start` into table_name in one transaction.
+        
+        Each row replaces any existing row with the same UPSERT_KEY, so reading a
+        row twice (such as one still being written during the last run) is
+        harmless. The new high-water mark (`end` and its checksum) is saved in the
+        same transaction. Returns (rows, earliest rollup day touched or None).
+        """
+        started = time.perf_counter()
+        day_query = ROLLUP_DAY_QUERIES.get(table_name)
+        quoted = ", ".join(f'"{column}"' for column in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        insert = f'INSERT INTO "{table_name}" ({quoted}) VALUES ({placeholders})'
+        rows_loaded = 0
+        days = []
+        conn = self.engine.raw_connection()
+        try:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS etl_delta_keys (key PRIMARY KEY)")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                with open(file_path, 'rb') as f:
+                    f.seek(start)
+                    chunks = pd.read_csv(
+                        f, header=None, names=columns,
+                        dtype=CSV_DTYPES.get(table_name), chunksize=CSV_CHUNK_SIZE
+                    )
+                    with chunks:
+                        for chunk in chunks:
+                            chunk = chunk.drop_duplicates(UPSERT_KEY, keep='last')
+                            values = chunk.astype(object).where(chunk.notna(), None)
+                            conn.execute("DELETE FROM temp.etl_delta_keys")
+                            conn.executemany(
+                                "INSERT OR IGNORE INTO temp.etl_delta_keys (key) VALUES (?)",
+                                ((key,) for key in values[UPSERT_KEY])
+                            )
+                            # Days of the rows being replaced and of their replacements
+                            if day_query:
+                                days.append(conn.execute(day_query).fetchone()[0])
+                            conn.execute(
+                                f'DELETE FROM "{table_name}" WHERE "{UPSERT_KEY}" IN (SELECT key FROM temp.etl_delta_keys)'
+                            )
+                            conn.executemany(insert, values.itertuples(index=False, name=None))
+                            if day_query:
+                                days.append(conn.execute(day_query).fetchone()[0])
+                            rows_loaded += len(chunk)
+                dataset_version.bump_table_version(conn, table_name)
+                etl_state.save_load_state(conn, table_name, file_path, columns, end, checksum)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        finally:
+            conn.close()
+        
+        elapsed = time.perf_counter() - started
+        rate = rows_loaded / elapsed if elapsed else 0
+        print(f"Upserted {rows_loaded} new rows into {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+        return rows_loaded, min((day for day in days if day), default=None)
+    
+    def load_incremental(self, file_path, table_name):
+        """Load only what changed in file_path since table_name was last loaded from it.
+        
+        CSV files that were only appended to (same header, same bytes up to the
+        recorded high-water mark) have just their new rows upserted; a file seen
+        for the first time, edited, truncated or given new columns is reloaded in
+        full. JSON files are skipped when unchanged and otherwise reloaded.
+        Returns (mode, day_from): mode is 'unchanged', 'appended', 'reloaded' or
+        None if the load failed, and day_from the earliest rollup day an append
+        touched.
+        """
+        file_path = str(file_path)
+        try:
+            is_csv = file_path.endswith('.csv')
+            columns = read_csv_header(file_path) if is_csv else []
+            end = etl_state.complete_lines_end(file_path) if is_csv else os.path.getsize(file_path)
+            
+            conn = self.engine.raw_connection()
+            try:
+                state = etl_state.get_load_state(conn, table_name)
+                table_exists = conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+                ).fetchone() is not None
+            finally:
+                conn.close()
+            
+            reason = None
+            if state is None or not table_exists:
+                reason = "no previous load"
+            elif state['source_path'] != os.path.abspath(file_path):
+                reason = "source file changed"
+            elif state['columns'] != columns:
+                reason = "columns changed"
+            elif state['byte_offset'] > end:
+                reason = "file was truncated"
+            elif is_csv and UPSERT_KEY not in columns:
+                reason = f"no {UPSERT_KEY} column to upsert on"
+            
+            start = state['byte_offset'] if reason is None else 0
+            previous, checksum = etl_state.file_checksums(file_path, [start, end])
+            if reason is None and previous != state['checksum']:
+                reason = "checksum changed"
+            
+            if reason is None:
+                if end == start:
+                    print(f"{table_name} is up to date")
+                    return 'unchanged', None
+                if is_csv:
+                    rows, day_from = self.append_csv_data(file_path, table_name, columns, start, end, checksum)
+                    return 'appended', day_from
+                reason = "checksum changed"
+            
+            print(f"Reloading {table_name} in full: {reason}")
+            loaded = self.load_csv_data(file_path, table_name) if is_csv else self.load_json_data(file_path, table_name)
+            if not loaded:
+                return None, None
+            conn = self.engine.raw_connection()
+            try:
+                etl_state.save_load_state(conn, table_name, file_path, columns, end, checksum)
+                conn.commit()
+            finally:
+                conn.close()
+            return 'reloaded', None
+        except Exception as e:
+            print(f"Error loading {file_path} incrementally: {str(e)}")
+            return None, None
+    
+    def load_json_data(self, file_path, table_name, batch_size=None):
+        """Load a JSON array or NDJSON file into database table, streaming it in batches"""
         try:
-            with open(file_path, 'r') as f:
-                data = json.load(f)
-            df = pd.DataFrame(data)
-            df.to_sql(table_name, self.engine, if_exists='replace', index=False)
-            print(f"Loaded {len(df)} rows into {table_name}")
+            chunks = json_chunks(file_path, table_name, batch_size or JSON_BATCH_SIZE)
+            rows, elapsed = self.bulk_load(table_name, chunks)
+            rate = rows / elapsed if elapsed else 0
+            print(f"Loaded {rows} rows into {table_name} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
             return True
         except Exception as e:
             print(f"Error loading {file_path}: {str(e)}")
@@ -108,11 +574,11 @@ class ETLPipeline:
         
         # Sample products
         products_data = [
-            {'id': 1, 'sku': 'RICE-001', 'name': 'Jasmine Rice 5kg', 'category': 'Rice', 'brand': 'Royal Harvest', 'price': 280.00},
-            {'id': 2, 'sku': 'NOOD-001', 'name': 'Lucky Me Pancit Canton Original', 'category': 'Noodles', 'brand': 'Lucky Me', 'price': 12.00},
-            {'id': 3, 'sku': 'SOAP-001', 'name': 'Safeguard White 135g', 'category': 'Personal Care', 'brand': 'Safeguard', 'price': 35.00},
-            {'id': 4, 'sku': 'DTRG-001', 'name': 'Tide Original 1kg', 'category': 'Detergent', 'brand': 'Tide', 'price': 115.00},
-            {'id': 5, 'sku': 'BEVG-001', 'name': 'Coca Cola 1.5L', 'category': 'Beverages', 'brand': 'Coca Cola', 'price': 65.00},
+            {'id': 1, 'sku': 'RICE-001', 'name': 'Jasmine Rice 5kg', 'category': 'Rice', 'category_id': None, 'brand': 'Royal Harvest', 'price': 280.00},
+            {'id': 2, 'sku': 'NOOD-001', 'name': 'Lucky Me Pancit Canton Original', 'category': 'Noodles', 'category_id': None, 'brand': 'Lucky Me', 'price': 12.00},
+            {'id': 3, 'sku': 'SOAP-001', 'name': 'Safeguard White 135g', 'category': 'Personal Care', 'category_id': 'personal-care-soap-bar-soap', 'brand': 'Safeguard', 'price': 35.00},
+            {'id': 4, 'sku': 'DTRG-001', 'name': 'Tide Original 1kg', 'category': 'Detergent', 'category_id': 'household-items-laundry-detergent', 'brand': 'Tide', 'price': 115.00},
+            {'id': 5, 'sku': 'BEVG-001', 'name': 'Coca Cola 1.5L', 'category': 'Beverages', 'category_id': 'beverages-soda-cola', 'brand': 'Coca Cola', 'price': 65.00},
         ]
         
         # Sample customers
@@ -123,46 +589,129 @@ class ETLPipeline:
         ]
         
         # Convert to DataFrames and save
-        pd.DataFrame(regions_data).to_sql('regions', self.engine, if_exists='replace', index=False)
-        pd.DataFrame(products_data).to_sql('products', self.engine, if_exists='replace', index=False)
-        pd.DataFrame(customers_data).to_sql('customers', self.engine, if_exists='replace', index=False)
+        self.bulk_load('regions', [pd.DataFrame(regions_data)])
+        self.bulk_load('products', [pd.DataFrame(products_data)])
+        self.bulk_load('customers', [pd.DataFrame(customers_data)])
         
         print("Sample data generated successfully")
         
-    def run_etl(self, data_dir='../data'):
-        """Run the complete ETL pipeline"""
-        print("Starting ETL pipeline...")
-        
-        # Create tables
-        self.create_tables()
-        
-        # Check if data files exist
+    def find_sources(self, data_dir):
+        """Map each table to the first of its candidate source files present in data_dir"""
         data_files = {
             'regions': ['regions.csv', 'regions.json'],
             'products': ['products.csv', 'products.json'],
             'customers': ['customers.csv', 'customers.json'],
+            'stores': ['stores.csv', 'stores.json'],
             'transactions': ['philippines_transactions.csv', 'transactions.json'],
+            'transaction_items': ['transaction_items.csv', 'transaction_items.json'],
         }
         
-        data_loaded = False
-        
+        sources = {}
         for table, files in data_files.items():
             for file in files:
                 file_path = os.path.join(data_dir, file)
                 if os.path.exists(file_path):
-                    if file.endswith('.csv'):
-                        data_loaded = self.load_csv_data(file_path, table) or data_loaded
-                    else:
-                        data_loaded = self.load_json_data(file_path, table) or data_loaded
+                    sources[table] = file_path
                     break
+        return sources
+    
+    def run_etl(self, data_dir='../data', incremental=False, workers=None):
+        """Run the complete ETL pipeline.
+        
+        With `incremental`, each source is loaded through load_incremental, so
+        appended rows are upserted and rollups are refreshed only from the
+        earliest day they touched. With `workers`, full reloads parse the source
+        files in that many processes (see etl_scheduler.py) and print a per-stage
+        timing report.
+        """
+        print("Starting ETL pipeline...")
+        started = time.perf_counter()
+        
+        # Create tables
+        self.create_tables()
+        
+        # Check if data files exist
+        sources = self.find_sources(data_dir)
+        
+        data_loaded = False
+        loaded_tables = set()
+        appended_tables = set()
+        rollup_days = []
+        report = None
+        
+        if workers and not incremental:
+            # Imported here as etl_scheduler imports this module
+            from etl_scheduler import load_parallel
+            
+            report = load_parallel(self, sources, workers)
+            loaded_tables = {table for table, timings in report.items() if timings['loaded']}
+            data_loaded = bool(loaded_tables)
+        else:
+            for table, file_path in sources.items():
+                if incremental:
+                    mode, day_from = self.load_incremental(file_path, table)
+                    loaded = mode is not None
+                    if mode == 'reloaded':
+                        loaded_tables.add(table)
+                    elif mode == 'appended':
+                        appended_tables.add(table)
+                        rollup_days.append(day_from)
+                else:
+                    if file_path.endswith('.csv'):
+                        loaded = self.load_csv_data(file_path, table)
+                    else:
+                        loaded = self.load_json_data(file_path, table)
+                    if loaded:
+                        loaded_tables.add(table)
+                data_loaded = loaded or data_loaded
+        
+        stages = []
+        
+        def timed(stage, func, *args, **kwargs):
+            stage_started = time.perf_counter()
+            func(*args, **kwargs)
+            stages.append((stage, time.perf_counter() - stage_started))
         
         # If no data files found, generate sample data
         if not data_loaded:
             print("No data files found. Generating sample data...")
-            self.generate_sample_data()
+            timed('generate sample data', self.generate_sample_data)
         
+        # Full reloads replace every row, so every rollup day has to be recomputed;
+        # appends only touch the days from the earliest one they changed
+        appended_without_days = (appended_tables & ROLLUP_SOURCE_TABLES) - set(ROLLUP_DAY_QUERIES)
+        if loaded_tables & ROLLUP_SOURCE_TABLES or appended_without_days:
+            print("Refreshing rollup tables...")
+            timed('refresh rollups', self.refresh_rollups)
+        elif any(rollup_days):
+            day_from = min(day for day in rollup_days if day)
+            print(f"Refreshing rollup tables from {day_from}...")
+            timed('refresh rollups', self.refresh_rollups, day_from=day_from)
+        
+        changed_tables = loaded_tables | appended_tables
+        if not incremental or changed_tables & {'products', 'transaction_items'}:
+            timed('refresh category map', self.refresh_category_map)
+        # Indexes anything written outside bulk_load and refreshes planner statistics
+        if not incremental or loaded_tables:
+            timed('create indexes + analyze', self.create_indexes)
+        
+        if report is not None:
+            from etl_scheduler import format_timing_report
+            
+            print(format_timing_report(report, stages, time.perf_counter() - started))
         print("ETL pipeline completed")
+        return report
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Load source files into the analytics database')
+    parser.add_argument('--data-dir', default='../data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only load rows appended since the last run, reloading changed files in full')
+    parser.add_argument('--workers', type=int,
+                        help='parse source files in this many processes (full reloads only)')
+    args = parser.parse_args()
+    
     etl = ETLPipeline()
-    etl.run_etl()
\ No newline at end of file
+    etl.run_etl(args.data_dir, incremental=args.incremental, workers=args.workers)
\ No newline at end of file
@@ -0,0 +1,94 @@
+"""
+Per-table load state for incremental ETL runs.
+
+After each load the ETL records, per table, the source file it came from, its
+header and a high-water mark: the byte offset just past the last complete line
+loaded plus a checksum of every byte before it. If the next run finds the same
+header and the same bytes up to that offset, the file has only been appended
+to and just the rows after the offset need loading. Anything else (an edited
+or truncated file, a new column) means a full reload.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import datetime
+
+ETL_STATE_TABLE = 'etl_state'
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+
+def get_load_state(conn, table_name):
+    """Return the state recorded by the last load of table_name as a dict, or None"""
+    try:
+        row = conn.execute(f"""
+            SELECT source_path, columns, byte_offset, checksum, loaded_at
+            FROM {ETL_STATE_TABLE}
+            WHERE table_name = ?
+        """, (table_name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    if row is None:
+        return None
+    return {
+        'source_path': row[0],
+        'columns': json.loads(row[1]),
+        'byte_offset': row[2],
+        'checksum': row[3],
+        'loaded_at': row[4]
+    }
+
+
+def save_load_state(conn, table_name, source_path, columns, byte_offset, checksum):
+    """Record the high-water mark of a load on a DB-API connection (the caller commits)"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ETL_STATE_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            source_path TEXT NOT NULL,
+            columns TEXT NOT NULL,
+            byte_offset INTEGER NOT NULL,
+            checksum TEXT NOT NULL,
+            loaded_at TEXT
+        )
+    """)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO {ETL_STATE_TABLE}
+            (table_name, source_path, columns, byte_offset, checksum, loaded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (table_name, os.path.abspath(source_path), json.dumps(columns), byte_offset, checksum,
+          datetime.utcnow().isoformat()))
+
+
+def complete_lines_end(file_path):
+    """Offset just past the file's last newline, so a row still being written is read again next run"""
+    with open(file_path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - CHECKSUM_BLOCK_SIZE, 0)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def file_checksums(file_path, offsets):
+    """SHA-256 of the bytes before each of the given offsets, in one pass over the file"""
+    hasher = hashlib.sha256()
+    checksums = {}
+    position = 0
+    with open(file_path, 'rb') as f:
+        for offset in sorted(set(offsets)):
+            while position < offset:
+                block = f.read(min(CHECKSUM_BLOCK_SIZE, offset - position))
+                if not block:
+                    break
+                hasher.update(block)
+                position += len(block)
+            checksums[offset] = hasher.hexdigest() if position == offset else None
+    return [checksums[offset] for offset in offsets]
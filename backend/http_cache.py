@@ -0,0 +1,63 @@
+"""
+HTTP validators for GET endpoints.
+
+Responses are identified by a strong ETag derived from the dataset version, the
+database and the request URL, so it only changes when a load changes the data.
+A matching `If-None-Match` is answered with 304 before the view runs, which
+makes repeat dashboard loads a single small-table lookup on the server.
+"""
+
+import hashlib
+import sqlite3
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+import db
+from dataset_version import get_dataset_version
+
+DEFAULT_CACHE_CONTROL = 'no-cache'
+
+
+def compute_etag(dataset_version):
+    """Strong ETag for the current request against the given dataset version"""
+    args = sorted(request.args.items(multi=True))
+    key = repr((db.DATABASE_PATH, dataset_version, request.path, args))
+    return f"v{dataset_version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}"
+
+
+def get_cache_control(endpoint, default):
+    """Per-route Cache-Control, overridable through app.config['CACHE_CONTROL'][endpoint]"""
+    return current_app.config.get('CACHE_CONTROL', {}).get(endpoint, default)
+
+
+def etag_cached(cache_control=DEFAULT_CACHE_CONTROL):
+    """Attach a dataset-version ETag and Cache-Control to a GET view, answering 304 when unchanged.
+
+    `no-cache` (the default) still lets browsers store the response but makes
+    them revalidate it, which is what keeps dashboards correct right after a load.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            try:
+                with db.get_db_connection(readonly=True) as conn:
+                    etag = compute_etag(get_dataset_version(conn))
+            except sqlite3.Error:
+                # No database to version the response against yet; serve it unvalidated
+                return make_response(view(*args, **kwargs))
+            control = get_cache_control(request.endpoint, cache_control)
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                # Errors must not be revalidated into a cached success or vice versa
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = control
+            return response
+        return wrapper
+    return decorator
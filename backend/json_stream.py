@@ -0,0 +1,125 @@
+"""
+Incremental JSON readers for large source files.
+
+json.load needs the whole document in memory at once, and the Python objects
+it builds take several times the file size. These readers decode one record
+at a time from a buffered stream, so peak memory is bounded by the batch size
+rather than by the file. Both a top-level JSON array of records and NDJSON
+(one record per line) are supported; the format is detected from the first
+non-whitespace character.
+"""
+
+import json
+import re
+
+# Characters read from the file per buffer refill
+READ_SIZE = 1024 * 1024
+
+# Reads one array element may span before it is treated as malformed; bounds
+# how much of the file a bad record can pull into memory
+MAX_RECORD_READS = 16
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_decoder = json.JSONDecoder()
+
+
+def iter_json_records(file_path, read_size=READ_SIZE):
+    """Yield the records of a JSON array or NDJSON file one at a time"""
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        buffer = f.read(read_size)
+        offset = 0
+        position = _skip_whitespace(buffer, 0)
+        while position == len(buffer):
+            offset += len(buffer.encode('utf-8'))
+            buffer = f.read(read_size)
+            if not buffer:
+                return
+            position = _skip_whitespace(buffer, 0)
+        if buffer[position] == '[':
+            yield from _iter_array(f, buffer, position + 1, read_size, offset)
+        else:
+            f.seek(0)
+            yield from _iter_lines(f)
+
+
+def iter_json_batches(file_path, batch_size, read_size=READ_SIZE):
+    """Yield lists of at most batch_size records"""
+    batch = []
+    for record in iter_json_records(file_path, read_size):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _skip_whitespace(buffer, position):
+    return WHITESPACE.match(buffer, position).end()
+
+
+def _iter_lines(f):
+    for line_number, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON on line {line_number}: {e}")
+
+
+def _iter_array(f, buffer, position, read_size, offset=0):
+    """Yield the array's records; offset is the byte offset of buffer[0] in the file"""
+    limit = MAX_RECORD_READS * read_size
+    expect = 'first'  # 'first' element or ']', a 'value' after ',', or a 'separator'
+    eof = False
+
+    def byte_offset():
+        return offset + len(buffer[:position].encode('utf-8'))
+
+    while True:
+        position = _skip_whitespace(buffer, position)
+        if position == len(buffer):
+            if eof:
+                raise ValueError("Unexpected end of file inside JSON array")
+            more = f.read(read_size)
+            eof = not more
+            offset += len(buffer.encode('utf-8'))
+            buffer, position = more, 0
+            continue
+
+        char = buffer[position]
+        if char == ']' and expect != 'value':
+            return
+        if expect == 'separator':
+            if char != ',':
+                raise ValueError(f"Expected ',' or ']' after array element at byte {byte_offset()}")
+            position += 1
+            expect = 'value'
+            continue
+
+        try:
+            record, end = _decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            end = None
+        # A value running into the end of the buffer may be cut short (a number
+        # or a truncated object), so decode it again with more of the file
+        if end is None or (end == len(buffer) and not eof):
+            if len(buffer) - position > limit:
+                raise ValueError(f"Invalid JSON array element at byte {byte_offset()} "
+                                 f"(no complete value within {limit:,} characters)")
+            more = f.read(read_size)
+            if not more:
+                if end is None:
+                    raise ValueError(f"Invalid or truncated JSON array element at byte {byte_offset()}")
+                eof = True
+                continue
+            offset = byte_offset()
+            buffer, position = buffer[position:] + more, 0
+            continue
+
+        yield record
+        position = end
+        expect = 'separator'
@@ -0,0 +1,79 @@
+"""
+EXPLAIN QUERY PLAN audit for the API's SQL.
+
+Endpoints register the query shapes they run, with representative parameters,
+through register_query. audit() plans each of them against a loaded database
+and reports any that read a whole table, so a dropped or missing index fails
+loudly (see scripts/audit_query_plans.py) instead of showing up as a slow
+dashboard.
+"""
+
+import re
+import sqlite3
+
+# Query name -> (sql, params), filled in as route modules are imported
+REGISTERED_QUERIES = {}
+
+# A bare "SCAN t" reads every row; index scans say "USING ... INDEX". Older
+# SQLite versions print "SCAN TABLE transactions AS t".
+FULL_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS (\w+))?(?: LEFT-JOIN)?$')
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# The planner rightly scans tables this small instead of seeking an index
+SMALL_TABLE_ROWS = 64
+
+
+def register_query(name, sql, params=()):
+    REGISTERED_QUERIES[name] = (sql, tuple(params))
+
+
+def explain(conn, sql, params=()):
+    """Return the detail column of EXPLAIN QUERY PLAN for sql"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+
+
+def table_aliases(sql):
+    """Map each alias (and bare table name) in sql's FROM/JOIN clauses to its table"""
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in ('ON', 'WHERE', 'LEFT', 'JOIN', 'GROUP', 'ORDER', 'LIMIT'):
+            aliases[alias] = table
+    return aliases
+
+
+def is_small(conn, table):
+    count = conn.execute(f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} LIMIT {SMALL_TABLE_ROWS + 1})").fetchone()[0]
+    return count <= SMALL_TABLE_ROWS
+
+
+def full_scans(conn, sql, plan):
+    """Plan lines that read every row of a table too large to scan"""
+    aliases = table_aliases(sql)
+    scans = []
+    for detail in plan:
+        match = FULL_SCAN.match(detail)
+        if not match or detail.startswith('SCAN CONSTANT ROW'):
+            continue
+        table = aliases.get(match.group(2) or match.group(1), match.group(1))
+        if not is_small(conn, table):
+            scans.append(detail)
+    return scans
+
+
+def audit(conn, queries=None):
+    """Plan every registered query, returning {name: problems} for those that don't use an index.
+    
+    A query that can't be planned at all (e.g. a table the ETL hasn't built) is
+    reported as a problem too.
+    """
+    queries = REGISTERED_QUERIES if queries is None else queries
+    failures = {}
+    for name, (sql, params) in queries.items():
+        try:
+            problems = full_scans(conn, sql, explain(conn, sql, params))
+        except sqlite3.Error as e:
+            problems = [f"ERROR {e}"]
+        if problems:
+            failures[name] = problems
+    return failures
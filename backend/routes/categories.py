@@ -1,62 +1,83 @@
 from flask import Blueprint, request, jsonify
-import sqlite3
-from contextlib import contextmanager
-import os
+
+import db
+from category_index import category_indexes
+from db import get_db_connection
+from http_cache import etag_cached
+from json_rows import get_shape, json_response, rows_data
 
 categories_bp = Blueprint('categories', __name__)
 
-# Database configuration
-DATABASE_PATH = os.getenv('DATABASE_URL', 'sqlite:///analytics.db').replace('sqlite:///', '')
+CATEGORY_COLUMNS = ['id', 'name', 'parent_id', 'level']
 
-@contextmanager
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    try:
-        yield conn
-    finally:
-        conn.close()
+def get_category_index():
+    """Return the in-memory category tree, rebuilt if the table changed"""
+    with get_db_connection() as conn:
+        return category_indexes.get(conn, db.DATABASE_PATH)
+
+def category_not_found(category_id):
+    return jsonify({'error': f'Category {category_id} not found'}), 404
 
 @categories_bp.route('/categories', methods=['GET'])
+@etag_cached('public, max-age=60')
 def get_categories():
     """Get categories with optional parent filter"""
     parent_id = request.args.get('parent')
     
-    with get_db_connection() as conn:
-        if parent_id:
-            # Get child categories for the specified parent
-            query = """
-                SELECT id, name, parent_id, level
-                FROM categories
-                WHERE parent_id = ?
-                ORDER BY name
-            """
-            categories = conn.execute(query, (parent_id,)).fetchall()
-        else:
-            # Get top-level categories (parent_id is NULL)
-            query = """
-                SELECT id, name, parent_id, level
-                FROM categories
-                WHERE parent_id IS NULL
-                ORDER BY name
-            """
-            categories = conn.execute(query).fetchall()
-        
-        # Convert to list of dicts
-        result = []
-        for row in categories:
-            result.append({
-                'id': row['id'],
-                'name': row['name'],
-                'parent_id': row['parent_id'],
-                'level': row['level']
-            })
-        
-        # Add "All Categories" option
-        all_option = {
-            'id': None,
-            'name': 'All Categories' if not parent_id else 'All Subcategories',
-            'level': 0
-        }
-        
-        return jsonify([all_option] + result)
\ No newline at end of file
+    try:
+        shape = get_shape(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Get child categories for the specified parent, or top-level categories
+    categories = get_category_index().get_children(parent_id or None)
+    rows = [tuple(category[column] for column in CATEGORY_COLUMNS) for category in categories]
+    
+    if shape == 'columnar':
+        return json_response(rows_data(CATEGORY_COLUMNS, rows, shape))
+    
+    # Add "All Categories" option
+    all_option = {
+        'id': None,
+        'name': 'All Categories' if not parent_id else 'All Subcategories',
+        'level': 0
+    }
+    
+    return json_response([all_option] + rows_data(CATEGORY_COLUMNS, rows))
+
+@categories_bp.route('/categories/tree', methods=['GET'])
+@etag_cached('public, max-age=60')
+def get_category_tree():
+    """Get the nested category tree, or the full subtree under `root`"""
+    root_id = request.args.get('root')
+    index = get_category_index()
+    
+    if root_id and root_id not in index:
+        return category_not_found(root_id)
+    
+    return json_response(index.subtree(root_id or None))
+
+@categories_bp.route('/categories/<category_id>/ancestors', methods=['GET'])
+@etag_cached('public, max-age=60')
+def get_category_ancestors(category_id):
+    """Get the chain of ancestors from the root down to the direct parent"""
+    index = get_category_index()
+    
+    if category_id not in index:
+        return category_not_found(category_id)
+    
+    return json_response(index.ancestors(category_id))
+
+@categories_bp.route('/categories/<category_id>/descendants', methods=['GET'])
+@etag_cached('public, max-age=60')
+def get_category_descendants(category_id):
+    """Get the ids of every category under category_id at any depth"""
+    index = get_category_index()
+    
+    if category_id not in index:
+        return category_not_found(category_id)
+    
+    return json_response({
+        'id': category_id,
+        'descendant_ids': index.descendant_ids(category_id, include_self=False)
+    })
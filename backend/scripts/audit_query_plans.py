@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Fail when any registered API query would fall back to a full table scan.
+
+Plans every query the API registers (see query_audit.py) with EXPLAIN QUERY
+PLAN against the given database (the API's database by default) and exits
+non-zero if one of them reads a whole table. Run it after `python etl.py`.
+"""
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: F401  (registers the API's queries)
+import db
+from query_audit import REGISTERED_QUERIES, audit
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    database_path = argv[0] if argv else db.DATABASE_PATH
+    conn = sqlite3.connect(f'file:{database_path}?mode=ro', uri=True)
+    try:
+        failures = audit(conn)
+        for name in REGISTERED_QUERIES:
+            status = 'FULL SCAN' if name in failures else 'ok'
+            print(f"{status:<10}{name}")
+            if name in failures:
+                for detail in failures[name]:
+                    print(f"{'':<10}  {detail}")
+    finally:
+        conn.close()
+    
+    if failures:
+        print(f"\n{len(failures)} of {len(REGISTERED_QUERIES)} queries scan a whole table or can't be planned; "
+              f"run ETLPipeline.create_indexes() or add an index to etl.INDEXES")
+        return 1
+    print(f"\nAll {len(REGISTERED_QUERIES)} queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark loading a large transactions.json: json.load into one DataFrame (the
+previous path) against the streaming json_stream batches used by
+ETLPipeline.load_json_data. Each path runs in a fresh process so its peak RSS
+is measured on its own. The generated file defaults to 2 GB; pass --size-mb
+for a quicker run.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from etl import ETLPipeline
+
+BATCH_SIZE = 50000
+
+
+def generate_file(path, size_mb, file_format):
+    """Write transaction records until the file reaches size_mb; returns the record count"""
+    target = size_mb * 1024 * 1024
+    count = 0
+    with open(path, 'w') as f:
+        if file_format == 'array':
+            f.write('[\n')
+        while f.tell() < target:
+            record = {
+                'id': count + 1,
+                'transaction_id': f"TXN-{count + 1:010d}",
+                'date': f"2024-{(count % 12) + 1:02d}-{(count % 28) + 1:02d}T10:00:00",
+                'customer_id': count % 400 + 1,
+                'store_id': str(count % 100 + 1),
+                'total_amount': round(100.0 + count % 500 * 1.25, 2)
+            }
+            if file_format == 'array':
+                f.write((',\n' if count else '') + json.dumps(record))
+            else:
+                f.write(json.dumps(record) + '\n')
+            count += 1
+        if file_format == 'array':
+            f.write('\n]\n')
+    return count
+
+
+def load_whole_file(etl, path):
+    with open(path, 'r') as f:
+        data = json.load(f)
+    etl.bulk_load('transactions', [pd.DataFrame(data)])
+
+
+def load_streaming(etl, path):
+    etl.load_json_data(path, 'transactions', batch_size=BATCH_SIZE)
+
+
+def run_path(name, path, database_path, results):
+    etl = ETLPipeline(f'sqlite:///{database_path}')
+    started = time.perf_counter()
+    {'json.load + DataFrame': load_whole_file, 'json_stream batches': load_streaming}[name](etl, path)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss is in KiB on Linux
+    results.put((elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=2048)
+    parser.add_argument('--format', choices=['array', 'ndjson'], default='array')
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'transactions.json')
+        records = generate_file(path, args.size_mb, args.format)
+        print(f"{records:,} records, {os.path.getsize(path) / 1024 / 1024:,.0f} MB ({args.format})")
+        print(f"{'path':<24}{'seconds':>10}{'rows/sec':>12}{'peak RSS MB':>14}")
+        for name in ('json.load + DataFrame', 'json_stream batches'):
+            results = context.Queue()
+            process = context.Process(
+                target=run_path, args=(name, path, os.path.join(workdir, 'bench.db'), results)
+            )
+            process.start()
+            process.join()
+            if process.exitcode != 0:
+                print(f"{name:<24}{'failed (exit code ' + str(process.exitcode) + ')':>36}")
+                continue
+            elapsed, peak_mb = results.get()
+            print(f"{name:<24}{elapsed:>10.1f}{records / elapsed:>12,.0f}{peak_mb:>14,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
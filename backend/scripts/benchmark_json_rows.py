@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Benchmark JSON serialization of already-fetched transaction rows: sqlite3.Row
+copied into dicts and passed to jsonify (the previous path) against the
+json_rows fast path in records and columnar shapes.
+"""
+
+import os
+import sqlite3
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from json_rows import cursor_columns, dumps, execute_tuples, rows_data
+
+ROW_COUNTS = [1000, 10000, 50000]
+REPEATS = 7
+
+QUERY = """
+    SELECT transaction_id, date, total_amount, store_name, city, region, customer_name, segment
+    FROM transactions
+"""
+
+
+def build_database(row_count):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("""
+        CREATE TABLE transactions (
+            transaction_id TEXT, date TEXT, total_amount REAL, store_name TEXT,
+            city TEXT, region TEXT, customer_name TEXT, segment TEXT
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (f"TXN-{i:08d}", f"2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}T10:00:00Z", 100.0 + i % 500,
+             f"Store {i % 100}", "Quezon City", "NCR", f"Customer {i % 400}", "Traditional Trade")
+            for i in range(row_count)
+        )
+    )
+    return conn
+
+
+def row_dicts_jsonify(rows):
+    data = []
+    for row in rows:
+        data.append({
+            'transaction_id': row['transaction_id'],
+            'date': row['date'],
+            'total_amount': float(row['total_amount']),
+            'store_name': row['store_name'],
+            'city': row['city'],
+            'region': row['region'],
+            'customer_name': row['customer_name'],
+            'segment': row['segment']
+        })
+    return jsonify({'data': data}).get_data()
+
+
+def fast_path(columns, rows, shape):
+    return dumps({'data': rows_data(columns, rows, shape)})
+
+
+def main():
+    app = Flask(__name__)
+    print(f"{'rows':>8}  {'path':<22}{'ms / 1k rows':>14}{'speedup':>10}")
+    with app.app_context():
+        for row_count in ROW_COUNTS:
+            conn = build_database(row_count)
+            conn.row_factory = sqlite3.Row
+            row_objects = conn.execute(QUERY).fetchall()
+            result = execute_tuples(conn, QUERY)
+            columns = cursor_columns(result)
+            tuples = result.fetchall()
+            paths = [
+                ('Row -> dict + jsonify', lambda: row_dicts_jsonify(row_objects)),
+                ('json_rows records', lambda: fast_path(columns, tuples, 'records')),
+                ('json_rows columnar', lambda: fast_path(columns, tuples, 'columnar')),
+            ]
+            baseline = None
+            for name, func in paths:
+                best = min(timeit.repeat(func, number=1, repeat=REPEATS))
+                per_1k = best * 1000 / (row_count / 1000)
+                baseline = baseline or per_1k
+                print(f"{row_count:>8}  {name:<22}{per_1k:>14.3f}{baseline / per_1k:>9.1f}x")
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
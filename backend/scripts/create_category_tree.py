@@ -7,6 +7,10 @@ import sqlite3
 import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dataset_version import create_version_triggers
+
 # Database configuration
 DATABASE_PATH = os.getenv('DATABASE_URL', 'sqlite:///analytics.db').replace('sqlite:///', '')
 
@@ -135,6 +139,8 @@ def create_categories_table(conn):
         FOREIGN KEY (parent_id) REFERENCES categories(id)
     )
     ''')
+    # Any edit to the tree invalidates the API's category index and ETags
+    create_version_triggers(conn, 'categories')
     conn.commit()
 
 def insert_category(conn, category_id, name, parent_id=None, level=1, path=None):
@@ -1,7 +1,16 @@
 import pytest
 import json
+import sqlite3
+import pandas as pd
+import app as app_module
+import db as db_module
 from app import app
 from etl import ETLPipeline
+from etl_scheduler import load_parallel
+from count_cache import count_cache
+from json_stream import iter_json_records
+from query_audit import REGISTERED_QUERIES, audit
+from scripts.create_category_tree import CATEGORY_TREE, create_categories_table, create_category_tree
 
 @pytest.fixture
 def client():
@@ -18,6 +27,58 @@ def setup_test_db():
     etl.generate_sample_data()
     yield etl
 
+@pytest.fixture
+def sample_db(tmp_path, monkeypatch):
+    """Build a small database with transactions and point the app at it"""
+    db_path = tmp_path / 'sample.db'
+    etl = ETLPipeline(f'sqlite:///{db_path}')
+    etl.create_tables()
+    etl.generate_sample_data()
+    
+    pd.DataFrame([
+        {'id': 1, 'store_code': 'STORE-1', 'name': 'Store 1', 'city': 'Manila', 'region': 'NCR'},
+        {'id': 2, 'store_code': 'STORE-2', 'name': 'Store 2', 'city': 'Cavite', 'region': 'Region IV-A'},
+    ]).to_csv(tmp_path / 'stores.csv', index=False)
+    pd.DataFrame([
+        {
+            'id': i,
+            'transaction_id': f'TXN-{i:04d}',
+            'date': f'2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}T10:00:00',
+            'customer_id': (i % 3) + 1,
+            'store_id': (i % 2) + 1,
+            'total_amount': 100.0 + i,
+        }
+        for i in range(1, 121)
+    ]).to_csv(tmp_path / 'transactions.csv', index=False)
+    pd.DataFrame([
+        {
+            'id': i,
+            'transaction_id': (i % 120) + 1,
+            'product_id': (i % 5) + 1,
+            'quantity': (i % 3) + 1,
+            'unit_price': 10.0,
+            'total_price': 10.0 * ((i % 3) + 1),
+        }
+        for i in range(1, 301)
+    ]).to_csv(tmp_path / 'transaction_items.csv', index=False)
+    etl.load_csv_data(tmp_path / 'stores.csv', 'stores')
+    etl.load_csv_data(tmp_path / 'transactions.csv', 'transactions')
+    etl.load_csv_data(tmp_path / 'transaction_items.csv', 'transaction_items')
+    etl.create_indexes()
+    etl.refresh_rollups()
+    etl.refresh_category_map()
+    
+    conn = sqlite3.connect(db_path)
+    create_categories_table(conn)
+    create_category_tree(conn, CATEGORY_TREE)
+    conn.close()
+    
+    monkeypatch.setattr(db_module, 'DATABASE_PATH', str(db_path))
+    count_cache.invalidate()
+    yield etl
+    count_cache.invalidate()
+    db_module.close_all_pools()
+
 def test_health_endpoint(client):
     """Test health check endpoint"""
     response = client.get('/api/health')
@@ -27,6 +88,21 @@ def test_health_endpoint(client):
     assert 'timestamp' in data
     assert data['service'] == 'scout-analytics-api'
 
+def test_endpoints_without_database_file(client, tmp_path, monkeypatch):
+    """Test routes that don't need data still answer before any database exists"""
+    missing = tmp_path / 'missing.db'
+    monkeypatch.setattr(db_module, 'DATABASE_PATH', str(missing))
+    for url in ('/api/products', '/api/regions', '/api/analytics/consumer-insights'):
+        response = client.get(url)
+        assert response.status_code == 200, url
+        assert 'ETag' not in response.headers
+    
+    summary = client.get('/api/analytics/summary')
+    assert summary.status_code == 200
+    assert json.loads(summary.data)['total_transactions'] == 0
+    assert not missing.exists()
+    db_module.close_all_pools()
+
 def test_transactions_endpoint(client):
     """Test transactions endpoint"""
     response = client.get('/api/transactions')
@@ -45,6 +121,455 @@ def test_transactions_with_pagination(client):
     assert data['pagination']['page'] == 2
     assert data['pagination']['per_page'] == 10
 
+def test_transactions_cursor_pagination(client, sample_db):
+    """Test keyset pagination walks every row exactly once, newest first"""
+    response = client.get('/api/transactions?cursor=&per_page=25')
+    assert response.status_code == 200
+    first = json.loads(response.data)
+    assert len(first['data']) == 25
+    assert 'total' not in first['pagination']
+    assert first['pagination']['has_more'] is True
+    
+    pages = [first]
+    while pages[-1]['pagination']['has_more']:
+        cursor = pages[-1]['pagination']['next_cursor']
+        response = client.get(f'/api/transactions?cursor={cursor}&per_page=25')
+        assert response.status_code == 200
+        pages.append(json.loads(response.data))
+    
+    assert [len(page['data']) for page in pages] == [25, 25, 25, 25, 20]
+    assert pages[-1]['pagination']['next_cursor'] is None
+    rows = [row for page in pages for row in page['data']]
+    assert len({row['transaction_id'] for row in rows}) == 120
+    assert [row['date'] for row in rows] == sorted((row['date'] for row in rows), reverse=True)
+
+def test_transactions_cursor_matches_offset(client, sample_db):
+    """Test cursor pages return the same rows as page/per_page"""
+    offset_page = json.loads(client.get('/api/transactions?page=2&per_page=5').data)
+    first = json.loads(client.get('/api/transactions?cursor=&per_page=5').data)
+    cursor = first['pagination']['next_cursor']
+    assert cursor is not None
+    second = json.loads(client.get(f'/api/transactions?cursor={cursor}&per_page=5').data)
+    assert len(second['data']) == 5
+    assert second['data'] == offset_page['data']
+
+def test_transactions_invalid_cursor(client):
+    """Test malformed cursors are rejected"""
+    response = client.get('/api/transactions?cursor=not-a-cursor')
+    assert response.status_code == 400
+
+def test_transactions_total_modes(client, sample_db):
+    """Test exact, estimated and omitted totals"""
+    exact = json.loads(client.get('/api/transactions?per_page=10').data)['pagination']
+    assert exact['total'] == 120
+    assert exact['pages'] == 12
+    assert exact['total_is_estimate'] is False
+    
+    count_cache.invalidate()
+    estimate = json.loads(client.get('/api/transactions?include_total=estimate').data)['pagination']
+    assert estimate['total'] == 120
+    assert estimate['total_is_estimate'] is True
+    
+    filtered = json.loads(client.get(
+        '/api/transactions?include_total=estimate&date_from=2024-07-01'
+    ).data)['pagination']
+    assert 0 < filtered['total'] <= 120
+    
+    none = json.loads(client.get('/api/transactions?include_total=none').data)['pagination']
+    assert none['total'] is None
+    assert none['pages'] is None
+    
+    response = client.get('/api/transactions?include_total=sometimes')
+    assert response.status_code == 400
+
+def test_transactions_total_cache_invalidated_by_etl(client, sample_db):
+    """Test cached totals survive direct writes but not an ETL table version bump"""
+    assert json.loads(client.get('/api/transactions').data)['pagination']['total'] == 120
+    
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    conn.execute(
+        "INSERT INTO transactions (id, transaction_id, date, customer_id, store_id, total_amount) "
+        "VALUES (121, 'TXN-0121', '2024-12-31T10:00:00', 1, 1, 50.0)"
+    )
+    conn.commit()
+    conn.close()
+    assert json.loads(client.get('/api/transactions').data)['pagination']['total'] == 120
+    
+    sample_db.bump_table_version('transactions')
+    assert json.loads(client.get('/api/transactions').data)['pagination']['total'] == 121
+
+def test_db_pool_reuses_connections(client, sample_db):
+    """Test GET requests share pooled read-only connections"""
+    pool = db_module.get_pool(db_module.DATABASE_PATH, readonly=True)
+    before = pool.metrics()
+    for _ in range(3):
+        assert client.get('/api/transactions?per_page=5').status_code == 200
+    after = pool.metrics()
+    assert after['checkouts'] >= before['checkouts'] + 3
+    assert after['open'] <= max(before['open'], 1)
+    assert after['in_use'] == 0
+    
+    response = client.get('/api/health/db-pool')
+    assert response.status_code == 200
+    pools = json.loads(response.data)['pools']
+    assert any(p['database'] == db_module.DATABASE_PATH and p['readonly'] for p in pools)
+
+def test_db_pool_readonly_connections_reject_writes(sample_db):
+    """Test read-only pooled connections cannot modify the database"""
+    with db_module.get_db_connection(readonly=True) as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM transactions")
+    with db_module.get_db_connection(readonly=False) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+def test_db_pool_waits_when_exhausted(tmp_path):
+    """Test checkouts beyond max_size wait and time out"""
+    pool = db_module.ConnectionPool(str(tmp_path / 'pool.db'), max_size=1, timeout=0.05)
+    with pool.connection():
+        with pytest.raises(db_module.PoolTimeout):
+            pool.acquire()
+    metrics = pool.metrics()
+    assert metrics['waits'] == 1
+    assert metrics['open'] == 1
+    with pool.connection():
+        pass
+    pool.close_all()
+    assert pool.metrics()['open'] == 0
+
+def test_db_pool_close_all_closes_checked_out_connections(tmp_path):
+    """Test connections returned after close_all are closed rather than pooled again"""
+    pool = db_module.ConnectionPool(str(tmp_path / 'pool.db'), max_size=2)
+    conn = pool.acquire()
+    pool.close_all()
+    pool.release(conn)
+    metrics = pool.metrics()
+    assert metrics['open'] == 0
+    assert metrics['idle'] == 0
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+
+def test_transactions_export_ndjson(client, sample_db):
+    """Test NDJSON export streams every filtered row"""
+    response = client.get('/api/transactions/export?date_from=2024-07-01')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert rows
+    assert all(row['date'] >= '2024-07-01' for row in rows)
+    
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    expected = conn.execute("SELECT COUNT(*) FROM transactions WHERE date >= '2024-07-01'").fetchone()[0]
+    conn.close()
+    assert len(rows) == expected
+    assert set(rows[0]) == {
+        'transaction_id', 'date', 'total_amount', 'store_name', 'city', 'region', 'customer_name', 'segment'
+    }
+
+def test_transactions_export_csv(client, sample_db, monkeypatch):
+    """Test CSV export across several fetch batches"""
+    monkeypatch.setattr(app_module, 'EXPORT_BATCH_SIZE', 7)
+    response = client.get('/api/transactions/export?format=csv')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/csv'
+    lines = response.get_data(as_text=True).splitlines()
+    assert lines[0].startswith('transaction_id,date,total_amount')
+    assert len(lines) == 121
+    
+    assert client.get('/api/transactions/export?format=xml').status_code == 400
+
+def test_transactions_columnar_shape(client, sample_db):
+    """Test the columnar shape carries the same rows as the records shape"""
+    records = json.loads(client.get('/api/transactions?per_page=5').data)['data']
+    columnar = json.loads(client.get('/api/transactions?per_page=5&shape=columnar').data)['data']
+    assert [dict(zip(columnar['columns'], row)) for row in columnar['rows']] == records
+    assert isinstance(records[0]['total_amount'], float)
+    
+    assert client.get('/api/transactions?shape=table').status_code == 400
+
+def test_categories_endpoint(client, sample_db):
+    """Test category listing in both response shapes"""
+    data = json.loads(client.get('/api/categories').data)
+    assert data[0] == {'id': None, 'name': 'All Categories', 'level': 0}
+    assert [c['name'] for c in data[1:]] == ['Beverages', 'Household Items', 'Personal Care', 'Snacks']
+    
+    children = json.loads(client.get('/api/categories?parent=beverages').data)
+    assert children[0]['name'] == 'All Subcategories'
+    assert {c['parent_id'] for c in children[1:]} == {'beverages'}
+    
+    columnar = json.loads(client.get('/api/categories?parent=beverages&shape=columnar').data)
+    assert columnar['columns'] == ['id', 'name', 'parent_id', 'level']
+    assert len(columnar['rows']) == len(children) - 1
+
+def test_etag_not_modified_until_dataset_changes(client, sample_db):
+    """Test GET responses revalidate with 304 until the ETL bumps the dataset version"""
+    response = client.get('/api/transactions?per_page=5')
+    etag = response.headers['ETag']
+    assert not etag.startswith('W/')
+    assert response.headers['Cache-Control'] == 'no-cache'
+    
+    cached = client.get('/api/transactions?per_page=5', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.data == b''
+    assert cached.headers['ETag'] == etag
+    
+    # Different query parameters are a different representation
+    other = client.get('/api/transactions?per_page=6', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    
+    sample_db.bump_table_version('transactions')
+    reloaded = client.get('/api/transactions?per_page=5', headers={'If-None-Match': etag})
+    assert reloaded.status_code == 200
+    assert reloaded.headers['ETag'] != etag
+
+def test_cache_control_configurable_per_route(client, sample_db):
+    """Test route defaults and app.config overrides for Cache-Control"""
+    assert client.get('/api/categories').headers['Cache-Control'] == 'public, max-age=60'
+    
+    app.config['CACHE_CONTROL'] = {'get_analytics_summary': 'private, max-age=30'}
+    try:
+        response = client.get('/api/analytics/summary')
+        assert response.headers['Cache-Control'] == 'private, max-age=30'
+    finally:
+        del app.config['CACHE_CONTROL']
+    
+    # Errors are never cached
+    error = client.get('/api/transactions?shape=table')
+    assert error.status_code == 400
+    assert 'ETag' not in error.headers
+
+def test_category_subtree_and_ancestors(client, sample_db):
+    """Test subtree, ancestor and descendant queries served from the in-memory index"""
+    tree = json.loads(client.get('/api/categories/tree?root=beverages').data)
+    assert len(tree) == 1
+    assert [c['name'] for c in tree[0]['children']] == ['Coffee', 'Juice', 'Soda', 'Tea']
+    assert [c['name'] for c in tree[0]['children'][2]['children']] == ['Cola', 'Lemon-Lime', 'Root Beer']
+    
+    forest = json.loads(client.get('/api/categories/tree').data)
+    assert [c['id'] for c in forest] == ['beverages', 'household-items', 'personal-care', 'snacks']
+    
+    ancestors = json.loads(client.get('/api/categories/beverages-soda-cola/ancestors').data)
+    assert [c['id'] for c in ancestors] == ['beverages', 'beverages-soda']
+    
+    descendants = json.loads(client.get('/api/categories/personal-care/descendants').data)
+    assert len(descendants['descendant_ids']) == 8
+    assert 'personal-care' not in descendants['descendant_ids']
+    assert 'personal-care-soap-bar-soap' in descendants['descendant_ids']
+    
+    assert client.get('/api/categories/nope/descendants').status_code == 404
+    assert client.get('/api/categories/tree?root=nope').status_code == 404
+
+def test_category_index_reloads_when_table_changes(client, sample_db):
+    """Test direct edits to the categories table are picked up"""
+    assert len(json.loads(client.get('/api/categories?parent=snacks').data)) == 4
+    
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    conn.execute(
+        "INSERT INTO categories (id, name, parent_id, level, path) "
+        "VALUES ('snacks-nuts', 'Nuts', 'snacks', 2, 'snacks › Nuts')"
+    )
+    conn.commit()
+    conn.close()
+    
+    children = json.loads(client.get('/api/categories?parent=snacks').data)
+    assert 'Nuts' in [c['name'] for c in children]
+    
+    # Renames keep the row count and rowids, and still invalidate the index and its ETag
+    etag = client.get('/api/categories?parent=snacks').headers['ETag']
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    conn.execute("UPDATE categories SET name = 'Mixed Nuts' WHERE id = 'snacks-nuts'")
+    conn.commit()
+    conn.close()
+    
+    response = client.get('/api/categories?parent=snacks', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert 'Mixed Nuts' in [c['name'] for c in json.loads(response.data)]
+
+def test_transactions_filter_by_category_subtree(client, sample_db):
+    """Test a parent category filter matches products in any descendant category"""
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    expected = conn.execute(
+        "SELECT COUNT(DISTINCT transaction_id) FROM transaction_items WHERE product_id = 4"
+    ).fetchone()[0]
+    conn.close()
+    
+    # Tide is filed under household-items › laundry › detergent
+    data = json.loads(client.get('/api/transactions?parent_category=household-items&per_page=200').data)
+    assert data['pagination']['total'] == expected == len(data['data'])
+    
+    narrowed = json.loads(client.get(
+        '/api/transactions?parent_category=household-items'
+        '&sub_category=household-items-laundry&per_page=200'
+    ).data)
+    assert narrowed['pagination']['total'] == expected
+    
+    none = json.loads(client.get(
+        '/api/transactions?parent_category=household-items-cleaning&per_page=200'
+    ).data)
+    assert none['pagination']['total'] == 0
+
+def test_query_plans_use_indexes(sample_db, tmp_path):
+    """Test every registered API query is served from an index once the ETL has created them"""
+    assert 'transactions.page.category' in REGISTERED_QUERIES
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert audit(conn) == {}
+
+def test_query_plan_audit_flags_full_scans(sample_db, tmp_path):
+    """Test a reload keeps its indexes and the audit reports full scans once one is missing"""
+    sample_db.load_csv_data(tmp_path / 'transactions.csv', 'transactions')
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert audit(conn) == {}
+        conn.execute("DROP INDEX idx_transactions_date_txn")
+    # A fresh connection, as the cached EXPLAIN statements don't notice schema changes
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        failures = audit(conn)
+    assert 'transactions.page.date_range' in failures
+    assert 'summary.totals.date_range' not in failures
+    
+    sample_db.create_indexes()
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert audit(conn) == {}
+
+def test_load_csv_data_in_chunks(sample_db, tmp_path):
+    """Test a chunked CSV load keeps every row, maps blanks to NULL and applies the declared types"""
+    df = pd.read_csv(tmp_path / 'transactions.csv')
+    df.loc[0, 'customer_id'] = None
+    df.to_csv(tmp_path / 'chunked.csv', index=False)
+    
+    assert sample_db.load_csv_data(tmp_path / 'chunked.csv', 'transactions', chunksize=7)
+    
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 120
+        assert conn.execute("SELECT COUNT(*) FROM transactions WHERE customer_id IS NULL").fetchone()[0] == 1
+        assert conn.execute("SELECT typeof(customer_id), typeof(total_amount) FROM transactions WHERE id = 2").fetchone() == ('integer', 'real')
+
+def test_failed_load_leaves_live_table(sample_db, tmp_path):
+    """Test a load that fails part way keeps serving the previous table and drops its shadow copy"""
+    df = pd.read_csv(tmp_path / 'transactions.csv')
+    df['customer_id'] = df['customer_id'].astype(object)
+    df.loc[100, 'customer_id'] = 'not-a-number'
+    df.to_csv(tmp_path / 'broken.csv', index=False)
+    
+    assert not sample_db.load_csv_data(tmp_path / 'broken.csv', 'transactions', chunksize=10)
+    
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 120
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert not [table for table in tables if table.endswith('__shadow')]
+
+@pytest.mark.parametrize('file_format', ['array', 'ndjson'])
+def test_load_json_data_streams_batches(sample_db, tmp_path, file_format):
+    """Test JSON arrays and NDJSON load in batches, with keys missing from a record stored as NULL"""
+    records = pd.read_csv(tmp_path / 'transactions.csv').to_dict('records')
+    del records[3]['customer_id']
+    with open(tmp_path / 'transactions.json', 'w') as f:
+        if file_format == 'array':
+            json.dump(records, f, indent=2)
+        else:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+    
+    assert sample_db.load_json_data(tmp_path / 'transactions.json', 'transactions', batch_size=16)
+    
+    with sqlite3.connect(tmp_path / 'sample.db') as conn:
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 120
+        assert conn.execute("SELECT customer_id FROM transactions WHERE id = 4").fetchone()[0] is None
+        assert conn.execute("SELECT typeof(customer_id) FROM transactions WHERE id = 5").fetchone()[0] == 'integer'
+
+def test_json_array_reader_rejects_malformed_records(tmp_path):
+    """Test a bad array element fails at its byte offset without reading the rest of the file"""
+    path = tmp_path / 'bad.json'
+    path.write_text('[{"id": 1}, {"id": 2,}, ' + '{"id": 3}, ' * 10000 + '{"id": 4}]')
+    with pytest.raises(ValueError, match='at byte 12'):
+        list(iter_json_records(path, read_size=64))
+    
+    path.write_text('[{"id": 1} {"id": 2}]')
+    with pytest.raises(ValueError, match="Expected ',' or ']'"):
+        list(iter_json_records(path))
+
+def test_parallel_load_reports_no_rows_for_failed_write(sample_db, tmp_path, monkeypatch):
+    """Test a table whose write fails is reported with zero rows"""
+    def failing_bulk_load(table_name, chunks):
+        raise sqlite3.OperationalError('disk I/O error')
+    monkeypatch.setattr(sample_db, 'bulk_load', failing_bulk_load)
+    
+    report = load_parallel(sample_db, {'stores': str(tmp_path / 'stores.csv')}, workers=1)
+    assert report['stores']['loaded'] is False
+    assert report['stores']['rows'] == 0
+
+def incremental_source(tmp_path):
+    """Copy the sample_db source files into a data directory laid out for run_etl"""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    (data_dir / 'stores.csv').write_text((tmp_path / 'stores.csv').read_text())
+    (data_dir / 'philippines_transactions.csv').write_text((tmp_path / 'transactions.csv').read_text())
+    return data_dir
+
+def test_incremental_etl_upserts_appended_rows(sample_db, tmp_path):
+    """Test an incremental run loads only appended rows, replacing rows with the same id"""
+    data_dir = incremental_source(tmp_path)
+    etl = ETLPipeline(f"sqlite:///{tmp_path / 'incremental.db'}")
+    etl.run_etl(str(data_dir), incremental=True)
+    
+    with open(data_dir / 'philippines_transactions.csv', 'a') as f:
+        f.write('121,TXN-0121,2024-12-30T10:00:00,1,1,500.0\n')
+        f.write('5,TXN-0005,2024-06-06T10:00:00,3,2,999.0\n')
+    
+    assert etl.load_incremental(data_dir / 'philippines_transactions.csv', 'transactions') == ('appended', '2024-06-06')
+    assert etl.load_incremental(data_dir / 'philippines_transactions.csv', 'transactions') == ('unchanged', None)
+    
+    conn = sqlite3.connect(tmp_path / 'incremental.db')
+    assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 121
+    assert conn.execute("SELECT total_amount FROM transactions WHERE id = 5").fetchone()[0] == 999.0
+    conn.close()
+    
+    # Rollups refreshed by run_etl from the earliest touched day match a full recompute
+    etl.refresh_rollups()
+    with open(data_dir / 'philippines_transactions.csv', 'a') as f:
+        f.write('122,TXN-0122,2024-12-31T10:00:00,1,2,250.0\n')
+        f.write('9,TXN-0009,2024-01-02T10:00:00,1,2,1.0\n')
+    etl.run_etl(str(data_dir), incremental=True)
+    conn = sqlite3.connect(tmp_path / 'incremental.db')
+    rollup_revenue = conn.execute("SELECT SUM(revenue) FROM rollup_daily_region").fetchone()[0]
+    raw_revenue = conn.execute("SELECT SUM(total_amount) FROM transactions").fetchone()[0]
+    conn.close()
+    assert rollup_revenue == pytest.approx(raw_revenue)
+
+def test_incremental_etl_reloads_edited_file(sample_db, tmp_path):
+    """Test editing already-loaded rows falls back to a full reload"""
+    data_dir = incremental_source(tmp_path)
+    etl = ETLPipeline(f"sqlite:///{tmp_path / 'incremental.db'}")
+    assert etl.load_incremental(data_dir / 'philippines_transactions.csv', 'transactions') == ('reloaded', None)
+    
+    source = data_dir / 'philippines_transactions.csv'
+    source.write_text(source.read_text().replace('TXN-0007', 'TXN-7000'))
+    assert etl.load_incremental(source, 'transactions') == ('reloaded', None)
+    
+    conn = sqlite3.connect(tmp_path / 'incremental.db')
+    assert conn.execute("SELECT transaction_id FROM transactions WHERE id = 7").fetchone()[0] == 'TXN-7000'
+    conn.close()
+
+def test_parallel_etl_respects_foreign_key_order(sample_db, tmp_path, capsys):
+    """Test a parallel run loads every source, writes referenced tables first and reports stage timings"""
+    data_dir = incremental_source(tmp_path)
+    (data_dir / 'transaction_items.csv').write_text((tmp_path / 'transaction_items.csv').read_text())
+    pd.read_csv(tmp_path / 'transactions.csv').to_json(data_dir / 'transactions.json', orient='records')
+    (data_dir / 'philippines_transactions.csv').unlink()
+    
+    etl = ETLPipeline(f"sqlite:///{tmp_path / 'parallel.db'}")
+    report = etl.run_etl(str(data_dir), workers=2)
+    
+    order = list(report)
+    assert order.index('stores') < order.index('transactions') < order.index('transaction_items')
+    assert {table: timings['rows'] for table, timings in report.items()} == {
+        'stores': 2, 'transactions': 120, 'transaction_items': 300
+    }
+    assert 'refresh rollups' in capsys.readouterr().out
+    
+    conn = sqlite3.connect(tmp_path / 'parallel.db')
+    assert conn.execute("SELECT COUNT(*) FROM transaction_items").fetchone()[0] == 300
+    assert conn.execute("SELECT SUM(transactions) FROM rollup_daily_region").fetchone()[0] == 120
+    conn.close()
+
 def test_products_endpoint(client):
     """Test products endpoint"""
     response = client.get('/api/products')
@@ -86,6 +611,48 @@ def test_analytics_summary_with_filters(client):
     data = json.loads(response.data)
     assert 'total_revenue' in data
 
+def test_analytics_summary_from_rollups(client, sample_db):
+    """Test the summary matches aggregates computed from the raw tables"""
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    revenue, count = conn.execute(
+        "SELECT SUM(total_amount), COUNT(*) FROM transactions "
+        "WHERE date >= '2024-03-01' AND date < '2024-07-01' AND store_id = 1"
+    ).fetchone()
+    item_revenue = conn.execute("SELECT SUM(total_price) FROM transaction_items").fetchone()[0]
+    conn.close()
+    
+    data = json.loads(client.get(
+        '/api/analytics/summary?date_from=2024-03-01&date_to=2024-06-30&region=NCR'
+    ).data)
+    assert data['total_transactions'] == count
+    assert data['total_revenue'] == round(revenue, 2)
+    assert data['average_basket_size'] == round(revenue / count, 2)
+    assert [r['region'] for r in data['revenue_by_region']] == ['NCR']
+    
+    data = json.loads(client.get('/api/analytics/summary').data)
+    assert data['total_transactions'] == 120
+    assert sum(c['revenue'] for c in data['revenue_by_category']) == pytest.approx(item_revenue)
+    assert len(data['top_products']) == 5
+    assert data['top_products'][0]['revenue'] >= data['top_products'][-1]['revenue']
+    assert data['top_products'][0]['name']
+
+def test_rollups_refresh_only_affected_days(client, sample_db):
+    """Test a ranged refresh picks up new rows for those days only"""
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    conn.execute(
+        "INSERT INTO transactions (id, transaction_id, date, customer_id, store_id, total_amount) "
+        "VALUES (500, 'TXN-0500', '2024-02-03T12:00:00', 1, 2, 1000.0)"
+    )
+    conn.execute("DELETE FROM transactions WHERE date LIKE '2024-05-%'")
+    conn.commit()
+    conn.close()
+    
+    before = json.loads(client.get('/api/analytics/summary').data)['total_transactions']
+    sample_db.refresh_rollups('2024-02-03', '2024-02-03')
+    after = json.loads(client.get('/api/analytics/summary').data)['total_transactions']
+    # The deleted May rows are still counted because May was not refreshed
+    assert after == before + 1
+
 def test_brand_performance_endpoint(client):
     """Test brand performance endpoint"""
     response = client.get('/api/analytics/brand-performance?brand=Lucky Me')
@@ -99,6 +666,63 @@ def test_brand_performance_endpoint(client):
     assert 'growth_rate' in data['metrics']
     assert 'trends' in data
 
+def test_brand_performance_from_columnar_store(client, sample_db):
+    """Test brand metrics match the equivalent SQL aggregation"""
+    conn = sqlite3.connect(db_module.DATABASE_PATH)
+    brand_revenue, brand_units = conn.execute("""
+        SELECT SUM(ti.total_price), SUM(ti.quantity)
+        FROM transaction_items ti
+        JOIN transactions t ON ti.transaction_id = t.id
+        JOIN products p ON ti.product_id = p.id
+        WHERE p.brand = 'Lucky Me' AND t.date >= '2024-04-01' AND t.date < '2024-07-01'
+    """).fetchone()
+    total_revenue = conn.execute("""
+        SELECT SUM(ti.total_price)
+        FROM transaction_items ti
+        JOIN transactions t ON ti.transaction_id = t.id
+        WHERE t.date >= '2024-04-01' AND t.date < '2024-07-01'
+    """).fetchone()[0]
+    previous_revenue = conn.execute("""
+        SELECT SUM(ti.total_price)
+        FROM transaction_items ti
+        JOIN transactions t ON ti.transaction_id = t.id
+        JOIN products p ON ti.product_id = p.id
+        WHERE p.brand = 'Lucky Me' AND t.date >= '2024-01-01' AND t.date < '2024-04-01'
+    """).fetchone()[0]
+    conn.close()
+    
+    data = json.loads(client.get(
+        '/api/analytics/brand-performance?brand=Lucky Me&date_from=2024-04-01&date_to=2024-06-30'
+    ).data)
+    metrics = data['metrics']
+    assert metrics['revenue'] == round(brand_revenue, 2)
+    assert metrics['units_sold'] == brand_units
+    assert metrics['market_share'] == round(brand_revenue / total_revenue * 100, 2)
+    # The preceding window is the 91 days before 2024-04-01
+    assert metrics['growth_rate'] == round((brand_revenue - previous_revenue) / previous_revenue * 100, 2)
+    assert sum(t['revenue'] for t in data['trends']) == pytest.approx(brand_revenue)
+    assert all('2024-04-01' <= t['date'] <= '2024-06-30' for t in data['trends'])
+
+def test_brand_performance_rejects_malformed_dates(client, sample_db):
+    """Test an unparseable date filter is a 400, not a server error"""
+    response = client.get('/api/analytics/brand-performance?brand=Lucky Me&date_from=2024-13-45')
+    assert response.status_code == 400
+    assert 'date_from' in json.loads(response.data)['error']
+
+def test_brand_store_reloads_after_etl(client, sample_db, tmp_path):
+    """Test the columnar store is rebuilt when the ETL reloads its source tables"""
+    url = '/api/analytics/brand-performance?brand=Tide'
+    before = json.loads(client.get(url).data)['metrics']['revenue']
+    
+    pd.DataFrame([
+        {'id': 1, 'transaction_id': 1, 'product_id': 4, 'quantity': 2, 'unit_price': 115.0, 'total_price': 230.0}
+    ]).to_csv(tmp_path / 'items.csv', index=False)
+    sample_db.load_csv_data(tmp_path / 'items.csv', 'transaction_items')
+    
+    metrics = json.loads(client.get(url).data)['metrics']
+    assert metrics['revenue'] == 230.0 != before
+    assert metrics['market_share'] == 100.0
+
 def test_consumer_insights_endpoint(client):
     """Test consumer insights endpoint"""
     response = client.get('/api/analytics/consumer-insights')
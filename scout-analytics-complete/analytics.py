@@ -1,26 +1,35 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from src.models.analytics import (
-    Transaction, Store, Product, Brand, Customer, 
+    Transaction, Store, Product, Brand,
     TransactionItem, Device, RequestBehavior, Substitution, db
 )
-from sqlalchemy import func, desc, text
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime
 import random
-import os
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from src.json_rows import (
+    STREAM_CHUNK_ROWS, data_response, get_shape, json_response, rows_data, stream_rows_response
+)
+from src.rollups import category_mix, volume_series
+from src.demographics import DIMENSIONS, cube_cells, filter_cells, rollup
+from src.dataset_version import get_dataset_version
+from src.scoutbot import ScoutBotOverloaded, get_scoutbot
+from src.sql_cache import normalize_sql, result_cache
+from src.sql_guard import (
+    MAX_ROWS, GuardedQuery, StaleCursorError, check_statement, decode_cursor, encode_cursor
+)
 
 # Load environment variables
 load_dotenv()
 
 analytics_bp = Blueprint('analytics', __name__)
 
-# Initialize Azure OpenAI client
-client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    api_version=os.getenv("AZURE_API_VERSION"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT")
-)
+# Longest window the volume charts can ask for
+MAX_VOLUME_DAYS = 366
+
+# Seconds clients are asked to wait when ScoutBot is at capacity
+SCOUTBOT_RETRY_AFTER_SECONDS = 5
 
 @analytics_bp.route('/transactions', methods=['GET'])
 def get_transactions():
@@ -32,134 +41,94 @@ def get_transactions():
         store_id = request.args.get('store_id')
         from_date = request.args.get('from_date')
         to_date = request.args.get('to_date')
-        
-        # Build query
-        query = Transaction.query
+        shape = get_shape(request.args)
+        
+        # Select only the returned columns, so rows come back as tuples
+        query = select(
+            Transaction.transaction_id,
+            Transaction.timestamp,
+            Transaction.store_id,
+            Transaction.store_location,
+            Transaction.device_id,
+            Transaction.total_amount,
+            Transaction.payment_method,
+            Transaction.customer_id
+        )
         
         if store_id:
-            query = query.filter(Transaction.store_id == store_id)
+            query = query.where(Transaction.store_id == store_id)
         if from_date:
-            query = query.filter(Transaction.timestamp >= from_date)
+            query = query.where(Transaction.timestamp >= from_date)
         if to_date:
-            query = query.filter(Transaction.timestamp <= to_date)
+            query = query.where(Transaction.timestamp <= to_date)
             
-        # Apply pagination
-        transactions = query.offset(offset).limit(limit).all()
-        
-        # Convert to dict
-        result = []
-        for t in transactions:
-            result.append({
-                'transaction_id': t.transaction_id,
-                'timestamp': t.timestamp,
-                'store_id': t.store_id,
-                'store_location': t.store_location,
-                'device_id': t.device_id,
-                'total_amount': t.total_amount,
-                'payment_method': t.payment_method,
-                'customer_id': t.customer_id
-            })
+        # Apply pagination, streaming the page from the cursor in chunks
+        query = query.offset(offset).limit(limit).execution_options(yield_per=STREAM_CHUNK_ROWS)
+        result = db.session.execute(query)
             
-        return jsonify({
-            'data': result,
-            'total': len(result),
-            'offset': offset,
-            'limit': limit
-        })
+        return stream_rows_response(result, shape, count_key='total', offset=offset, limit=limit)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/volume', methods=['GET'])
 def get_volume():
-    """Get transaction volume data for charts"""
+    """Get hourly and daily transaction volume for charts from the maintained volume rollup"""
     try:
-        # Simulate hourly volume data
-        hourly_data = []
-        for hour in range(24):
-            volume = random.randint(50, 200)
-            hourly_data.append({
-                'hour': f"{hour:02d}:00",
-                'volume': volume
-            })
+        days = request.args.get('days', 30, type=int)
+        if not 1 <= days <= MAX_VOLUME_DAYS:
+            raise ValueError(f"days must be between 1 and {MAX_VOLUME_DAYS}")
         
-        # Simulate daily volume for the last 30 days
-        daily_data = []
-        for i in range(30):
-            date = datetime.now() - timedelta(days=i)
-            volume = random.randint(800, 1500)
-            daily_data.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'volume': volume
-            })
-        
-        return jsonify({
-            'hourly': hourly_data,
-            'daily': list(reversed(daily_data))
-        })
+        return json_response(volume_series(db.session, days))
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/category-mix', methods=['GET'])
 def get_category_mix():
-    """Get product category distribution"""
+    """Get revenue, units and transactions per product category from the daily category rollup"""
     try:
-        # Get category distribution from products
-        categories = db.session.query(
-            Product.category,
-            func.count(Product.product_id).label('count'),
-            func.avg(Product.price).label('avg_price')
-        ).group_by(Product.category).all()
-        
-        result = []
-        for cat in categories:
-            result.append({
-                'category': cat.category,
-                'count': cat.count,
-                'avg_price': round(cat.avg_price, 2) if cat.avg_price else 0,
-                'revenue': round(cat.count * (cat.avg_price or 0), 2)
-            })
+        from_date = request.args.get('from_date')
+        to_date = request.args.get('to_date')
         
-        return jsonify({'data': result})
+        return json_response({'data': category_mix(db.session, from_date, to_date)})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/demographics', methods=['GET'])
 def get_demographics():
-    """Get customer demographics data"""
+    """Get customer demographics data from the cached demographics cube
+    
+    Query parameters age_group, gender and region filter the cube, and
+    crosstab=<dimension>,<dimension> adds a 2-D cross-tab of the filtered cells.
+    """
     try:
-        # Age group distribution
-        age_groups = db.session.query(
-            func.case(
-                (Customer.age < 25, '18-24'),
-                (Customer.age < 35, '25-34'),
-                (Customer.age < 45, '35-44'),
-                (Customer.age < 55, '45-54'),
-                else_='55+'
-            ).label('age_group'),
-            func.count(Customer.customer_id).label('count')
-        ).group_by('age_group').all()
+        cells = cube_cells(db.session)
+        filters = {dimension: request.args[dimension] for dimension in DIMENSIONS if dimension in request.args}
+        cells = filter_cells(cells, filters)
+        
+        payload = {
+            'age_groups': rows_data(['age_group', 'count'], rollup(cells, ['age_group'])),
+            'gender': rows_data(['gender', 'count'], rollup(cells, ['gender'])),
+            'regions': rows_data(['region', 'count'], rollup(cells, ['region']))
+        }
         
-        # Gender distribution
-        gender_dist = db.session.query(
-            Customer.gender,
-            func.count(Customer.customer_id).label('count')
-        ).group_by(Customer.gender).all()
+        crosstab = request.args.get('crosstab')
+        if crosstab:
+            dimensions = crosstab.split(',')
+            if len(dimensions) != 2 or len(set(dimensions)) != 2 or not set(dimensions) <= set(DIMENSIONS):
+                raise ValueError(f"crosstab must name two different dimensions of {', '.join(DIMENSIONS)}")
+            payload['crosstab'] = rows_data([*dimensions, 'count'], rollup(cells, dimensions))
         
-        # Regional distribution
-        regional_dist = db.session.query(
-            Customer.region,
-            func.count(Customer.customer_id).label('count')
-        ).group_by(Customer.region).all()
-        
-        return jsonify({
-            'age_groups': [{'age_group': ag.age_group, 'count': ag.count} for ag in age_groups],
-            'gender': [{'gender': g.gender, 'count': g.count} for g in gender_dist],
-            'regions': [{'region': r.region, 'count': r.count} for r in regional_dist]
-        })
+        return json_response(payload)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -167,22 +136,23 @@ def get_demographics():
 def get_stores():
     """Get all stores"""
     try:
-        stores = Store.query.all()
-        result = []
-        for s in stores:
-            result.append({
-                'store_id': s.store_id,
-                'name': s.name,
-                'location': s.location,
-                'barangay': s.barangay,
-                'city': s.city,
-                'region': s.region,
-                'latitude': s.latitude,
-                'longitude': s.longitude
-            })
-        
-        return jsonify({'data': result})
-        
+        shape = get_shape(request.args)
+        query = select(
+            Store.store_id,
+            Store.name,
+            Store.location,
+            Store.barangay,
+            Store.city,
+            Store.region,
+            Store.latitude,
+            Store.longitude
+        ).execution_options(yield_per=STREAM_CHUNK_ROWS)
+        result = db.session.execute(query)
+        
+        return stream_rows_response(result, shape)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -192,109 +162,144 @@ def get_products():
     try:
         category = request.args.get('category')
         limit = request.args.get('limit', 50, type=int)
+        shape = get_shape(request.args)
         
-        query = Product.query
+        query = select(
+            Product.product_id,
+            Product.name,
+            Product.category,
+            Product.brand_id,
+            Product.price,
+            Product.cost
+        )
         if category:
-            query = query.filter(Product.category == category)
+            query = query.where(Product.category == category)
             
-        products = query.limit(limit).all()
+        query = query.limit(limit).execution_options(yield_per=STREAM_CHUNK_ROWS)
+        result = db.session.execute(query)
         
-        result = []
-        for p in products:
-            result.append({
-                'product_id': p.product_id,
-                'name': p.name,
-                'category': p.category,
-                'brand_id': p.brand_id,
-                'price': p.price,
-                'cost': p.cost
-            })
-        
-        return jsonify({'data': result})
+        return stream_rows_response(result, shape)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @analytics_bp.route('/ask', methods=['POST'])
 def ask_scoutbot():
-    """ScoutBot AI assistant - natural language to SQL and insights"""
+    """ScoutBot AI assistant - natural language to SQL and insights
+    
+    The request waits here for the answer, but ScoutBot bounds how many can
+    wait at once and answers 503 beyond that, so the rest of the API keeps
+    its workers. Identical questions already in flight share one call (see
+    scoutbot).
+    """
     try:
         data = request.get_json()
         user_query = data.get('query', '')
+        if not user_query.strip():
+            raise ValueError('query is required')
         
-        # System prompt for ScoutBot
-        system_prompt = """You are ScoutBot, a retail BI assistant for Scout Analytics. You help analyze Philippine retail transaction data.
-
-Database Schema:
-- transactions: transaction_id, timestamp, store_id, store_location, device_id, total_amount, payment_method, customer_id
-- stores: store_id, name, location, barangay, city, region, latitude, longitude
-- products: product_id, name, category, brand_id, price, cost
-- brands: brand_id, name, category
-- customers: customer_id, age, gender, location, barangay, city, region
-- transaction_items: transaction_id, product_id, quantity, unit_price, total_price
-
-When users ask questions, provide:
-1. Interpreted intent
-2. Suggested SQL query (if applicable)
-3. Chart recommendation (bar, line, pie, table)
-4. Key insights and recommendations
-
-Focus on Philippine retail context: regions like NCR, Cebu, Davao; categories like Beverages, Snacks, Personal Care, Household; payment methods like Cash, GCash, Credit Card."""
-
-        # Call Azure OpenAI
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_DEPLOYMENT_NAME"),
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_query}
-            ],
-            max_tokens=1000,
-            temperature=0.7
-        )
-        
-        ai_response = response.choices[0].message.content
+        scoutbot = get_scoutbot()
+        ai_response, shared = scoutbot.ask(user_query)
         
         return jsonify({
             'query': user_query,
             'response': ai_response,
-            'model': os.getenv("AZURE_DEPLOYMENT_NAME"),
+            'model': scoutbot.backend.model,
+            'shared': shared,
             'timestamp': datetime.now().isoformat()
         })
         
+    except ScoutBotOverloaded as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(SCOUTBOT_RETRY_AFTER_SECONDS)
+        return response
+    except FutureTimeoutError:
+        return jsonify({'error': 'ScoutBot did not answer in time'}), 504
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/ask/stats', methods=['GET'])
+def get_scoutbot_stats():
+    """Report ScoutBot upstream calls, shared answers and refusals"""
+    return jsonify(get_scoutbot().stats())
+
 @analytics_bp.route('/sql', methods=['POST'])
 def execute_sql():
-    """Execute SQL query against the database"""
+    """Execute a read-only SQL query under the cost, time and row limits of sql_guard
+    
+    Results are streamed. When more than max_rows rows remain, next_cursor is
+    returned; post it back as `cursor` with the same sql for the next page.
+    Pages are cached by normalized SQL and dataset version (see sql_cache).
+    """
     try:
         data = request.get_json()
         sql_query = data.get('sql', '')
+        shape = get_shape(data)
+        max_rows = int(data.get('max_rows', MAX_ROWS))
+        if not 1 <= max_rows <= MAX_ROWS:
+            raise ValueError(f"max_rows must be between 1 and {MAX_ROWS}")
+        
+        sql_query = check_statement(sql_query)
+        normalized = normalize_sql(sql_query)
+        secret_key = current_app.config['SECRET_KEY']
+        version = get_dataset_version(db.session)
+        offset, after = decode_cursor(secret_key, data['cursor'], normalized, version) if data.get('cursor') else (0, None)
+        
+        cache_key = (normalized, offset, max_rows, shape)
+        cached = result_cache.get(cache_key, version)
+        if cached:
+            rows_json, fields = cached
+            response = data_response(rows_json, sql=sql_query, **fields)
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        
+        query = GuardedQuery(db.engine.url.database, sql_query, offset=offset, after=after, max_rows=max_rows)
+        captured = {}
+        
+        def trailer():
+            resume = query.has_more or query.error is not None
+            next_offset, next_after = query.next_position()
+            fields = {
+                'row_count': query.sent,
+                'truncated': resume,
+                'next_cursor': encode_cursor(secret_key, normalized, next_offset, version, next_after) if resume else None
+            }
+            if query.error:
+                fields['error'] = query.error
+            elif 'data' in captured:
+                result_cache.put(cache_key, version, captured['data'], {
+                    'columns': query.columns,
+                    'estimated_rows': query.estimated_rows,
+                    **fields
+                })
+            return fields
+        
+        response = stream_rows_response(
+            query, shape, trailer=trailer,
+            capture=lambda rows_json: captured.update(data=rows_json),
+            capture_limit=result_cache.max_entry_bytes,
+            sql=sql_query, columns=query.columns, estimated_rows=query.estimated_rows
+        )
+        response.headers['X-Cache'] = 'MISS'
+        return response
         
-        # Basic SQL injection protection - only allow SELECT statements
-        if not sql_query.strip().upper().startswith('SELECT'):
-            return jsonify({'error': 'Only SELECT queries are allowed'}), 400
-        
-        # Execute the query
-        result = db.session.execute(text(sql_query))
-        rows = result.fetchall()
-        columns = result.keys()
-        
-        # Convert to list of dictionaries
-        data_rows = []
-        for row in rows:
-            data_rows.append(dict(zip(columns, row)))
-        
-        return jsonify({
-            'sql': sql_query,
-            'columns': list(columns),
-            'data': data_rows,
-            'row_count': len(data_rows)
-        })
-        
+    except StaleCursorError as e:
+        return jsonify({'error': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@analytics_bp.route('/sql/cache', methods=['GET'])
+def get_sql_cache_stats():
+    """Report /sql result cache entries, bytes held and hit ratio"""
+    return jsonify(result_cache.stats())
+
 @analytics_bp.route('/retailbot', methods=['POST'])
 def retailbot():
     """RetailBot AI assistant endpoint (legacy compatibility)"""
@@ -0,0 +1,87 @@
+"""
+Minimal src.models.analytics for the tests: the tables and columns data_loader
+writes and the routes read.
+"""
+
+from src.models.user import db
+
+class Transaction(db.Model):
+    __tablename__ = 'transactions'
+    transaction_id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.String)
+    store_id = db.Column(db.String)
+    store_location = db.Column(db.String)
+    device_id = db.Column(db.String)
+    total_amount = db.Column(db.Float)
+    payment_method = db.Column(db.String)
+    customer_id = db.Column(db.String)
+
+class Store(db.Model):
+    __tablename__ = 'stores'
+    store_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    location = db.Column(db.String)
+    barangay = db.Column(db.String)
+    city = db.Column(db.String)
+    region = db.Column(db.String)
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+
+class Product(db.Model):
+    __tablename__ = 'products'
+    product_id = db.Column(db.String, primary_key=True)
+    name = db.Column(db.String)
+    category = db.Column(db.String)
+    brand_id = db.Column(db.String)
+    price = db.Column(db.Float)
+    cost = db.Column(db.Float)
+
+class Brand(db.Model):
+    __tablename__ = 'brands'
+    brand_id = db.Column(db.String, primary_key=True)
+    name = db.Column(db.String)
+    category = db.Column(db.String)
+    is_tbwa = db.Column(db.Boolean)
+    created_at = db.Column(db.String)
+
+class Customer(db.Model):
+    __tablename__ = 'customers'
+    customer_id = db.Column(db.String, primary_key=True)
+    age = db.Column(db.Integer)
+    gender = db.Column(db.String)
+    location = db.Column(db.String)
+    barangay = db.Column(db.String)
+    city = db.Column(db.String)
+    region = db.Column(db.String)
+
+class TransactionItem(db.Model):
+    __tablename__ = 'transaction_items'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    transaction_id = db.Column(db.Integer)
+    product_id = db.Column(db.String)
+    quantity = db.Column(db.Integer)
+    unit_price = db.Column(db.Float)
+    total_price = db.Column(db.Float)
+
+class Device(db.Model):
+    __tablename__ = 'devices'
+    device_id = db.Column(db.String, primary_key=True)
+    type = db.Column(db.String)
+    location = db.Column(db.String)
+    store_id = db.Column(db.String)
+
+class RequestBehavior(db.Model):
+    __tablename__ = 'request_behaviors'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    transaction_id = db.Column(db.Integer)
+    behavior_type = db.Column(db.String)
+    timestamp = db.Column(db.String)
+    details = db.Column(db.String)
+
+class Substitution(db.Model):
+    __tablename__ = 'substitutions'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    transaction_id = db.Column(db.Integer)
+    original_product_id = db.Column(db.String)
+    substitute_product_id = db.Column(db.String)
+    reason = db.Column(db.String)
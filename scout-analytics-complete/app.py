@@ -1,7 +1,7 @@
 import os
-from src.main import app
+from src.main import app, start_database_initialization
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
+    start_database_initialization()
     app.run(host="0.0.0.0", port=port, debug=False)
-
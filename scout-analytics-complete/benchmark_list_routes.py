@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Benchmark the /transactions, /stores and /products routes at 100, 1k and 10k
+rows: streamed column-only Core selects (the routes as they are) against
+loading full ORM objects with .all() and copying their attributes into dicts
+(the routes as they were). Reports median latency and, from a separate
+tracemalloc run, the peak memory allocated while serving one request.
+"""
+
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+
+from src.models.user import db
+from src.models.analytics import Product, Store, Transaction
+from src.routes.analytics import analytics_bp
+from src.data_loader import bulk_upsert
+
+SIZES = (100, 1000, 10000)
+
+ROUTES = {
+    'transactions': (Transaction, '/api/transactions?limit={rows}'),
+    'stores': (Store, '/api/stores'),
+    'products': (Product, '/api/products?limit={rows}'),
+}
+
+
+def seed(rows):
+    """Replace the three tables with `rows` synthetic rows each"""
+    index = np.arange(rows)
+    frames = {
+        Transaction: pd.DataFrame({
+            'transaction_id': index + 1,
+            'timestamp': [f"2025-05-{i % 28 + 1:02d} {i % 24:02d}:00:00" for i in index],
+            'store_id': (index % 50 + 1).astype(str),
+            'store_location': 'Metro Manila',
+            'device_id': [f"DEV-{i % 500:03d}" for i in index],
+            'total_amount': 100.0 + (index % 500) * 1.25,
+            'payment_method': 'cash',
+            'customer_id': [f"CUST-{i % 400:04d}" for i in index]
+        }),
+        Store: pd.DataFrame({
+            'store_id': index + 1,
+            'name': [f"Store {i + 1}" for i in index],
+            'location': 'Metro Manila',
+            'barangay': 'Poblacion',
+            'city': 'Makati',
+            'region': 'NCR',
+            'latitude': 14.55 + index * 1e-5,
+            'longitude': 121.02 + index * 1e-5
+        }),
+        Product: pd.DataFrame({
+            'product_id': [f"prod_{i + 1:05d}" for i in index],
+            'name': [f"Product {i + 1}" for i in index],
+            'category': 'Beverages',
+            'brand_id': (index % 50 + 1).astype(str),
+            'price': 50.0 + (index % 100) * 2.5,
+            'cost': 30.0 + (index % 100) * 1.5
+        }),
+    }
+    for model, frame in frames.items():
+        db.session.execute(model.__table__.delete())
+        bulk_upsert(model, frame)
+    db.session.commit()
+
+
+def orm_response(model, rows):
+    """The previous implementation: full ORM objects copied attribute by attribute"""
+    query = model.query
+    if model is not Store:
+        query = query.limit(rows)
+    columns = [column.name for column in model.__table__.columns]
+    data = [{column: getattr(obj, column) for column in columns} for obj in query.all()]
+    return jsonify({'data': data}).get_data()
+
+
+def streamed_response(client, url):
+    return client.get(url).get_data()
+
+
+def measure(run, repeat):
+    """Median latency in ms and peak KiB allocated during one traced run"""
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        latencies.append((time.perf_counter() - started) * 1000)
+        db.session.remove()
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    db.session.remove()
+    return statistics.median(latencies), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        app.register_blueprint(analytics_bp, url_prefix='/api')
+        client = app.test_client()
+
+        print(f"{'route':<14}{'rows':>7}  {'path':<10}{'median ms':>11}{'peak KiB':>10}")
+        with app.app_context():
+            db.create_all()
+            for rows in SIZES:
+                seed(rows)
+                for route, (model, url) in ROUTES.items():
+                    paths = {
+                        'orm': lambda: orm_response(model, rows),
+                        'streamed': lambda: streamed_response(client, url.format(rows=rows)),
+                    }
+                    for name, run in paths.items():
+                        run()  # warm up
+                        median_ms, peak_kib = measure(run, args.repeat)
+                        print(f"{route:<14}{rows:>7}  {name:<10}{median_ms:>11.2f}{peak_kib:>10,.0f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Build the prebuilt SQLite snapshot of the Scout database from the CSVs in
+database/, for initialize_database to copy into place at startup. Run it
+whenever the CSVs change, e.g. as a step of the container image build.
+"""
+
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import glob
+import time
+
+from flask import Flask
+
+from src.models.user import db
+from src.data_loader import CSV_FILES, DATABASE_DIR, TABLES, load_csv_data
+from src.rollups import ensure_rollups
+from src.snapshot import (
+    csv_hashes, csv_stats, dataset_version, finalize_snapshot, snapshot_dir, write_manifest
+)
+
+
+def build_snapshot():
+    """Load the CSVs into a new snapshot database; returns the manifest, or None on failure"""
+    started = time.perf_counter()
+    out_dir = snapshot_dir(DATABASE_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    build_path = os.path.join(out_dir, 'building.db')
+    if os.path.exists(build_path):
+        os.remove(build_path)
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{build_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        loaded = load_csv_data()
+        ensure_rollups(db.engine)
+        db.session.remove()
+        db.engine.dispose()
+
+    failed = [table_name for table_name, *_ in TABLES if table_name not in loaded]
+    if failed:
+        print(f"Not building a snapshot: failed to load {', '.join(failed)}")
+        os.remove(build_path)
+        return None
+
+    # Hashed after loading, as the loader may add a brand_id column to brands.csv
+    hashes = csv_hashes(DATABASE_DIR, CSV_FILES)
+    stats = csv_stats(DATABASE_DIR, CSV_FILES)
+    version = dataset_version(hashes)
+    finalize_snapshot(build_path, version)
+
+    snapshot_name = f"app-{version}.db"
+    os.replace(build_path, os.path.join(out_dir, snapshot_name))
+    manifest = write_manifest(
+        DATABASE_DIR, version, hashes, snapshot_name,
+        {table_name: table['rows'] for table_name, table in loaded.items()},
+        stats
+    )
+    for old_path in glob.glob(os.path.join(out_dir, 'app-*.db')):
+        if os.path.basename(old_path) != snapshot_name:
+            os.remove(old_path)
+
+    size_mb = os.path.getsize(os.path.join(out_dir, snapshot_name)) / 1024 / 1024
+    print(f"Built database snapshot {version} ({size_mb:.1f} MB) in {time.perf_counter() - started:.2f}s")
+    return manifest
+
+
+def main():
+    return 0 if build_snapshot() else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,27 @@
+"""
+Test setup for running the flattened tree in place.
+
+The modules import each other as the deployed `src` package (src.x,
+src.models.x, src.routes.x). This directory is mounted as all three packages,
+and src.models.analytics, which isn't kept in this tree, is loaded from
+analytics_models.
+"""
+
+import importlib.util
+import os
+import sys
+import types
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+for name in ('src', 'src.models', 'src.routes'):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [HERE]
+        sys.modules[name] = package
+
+if 'src.models.analytics' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('src.models.analytics', os.path.join(HERE, 'analytics_models.py'))
+    models = importlib.util.module_from_spec(spec)
+    sys.modules['src.models.analytics'] = models
+    spec.loader.exec_module(models)
@@ -1,156 +1,257 @@
 import os
-import pandas as pd
+import time
 import uuid
 from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.sqlite import insert
+
+from src.dataset_version import bump_table_version
+from src.rollups import CATEGORY_ROLLUP, refresh_category_rollup
 from src.models.analytics import (
-    Transaction, Store, Product, Brand, Customer, 
+    Transaction, Store, Product, Brand, Customer,
     TransactionItem, Device, RequestBehavior, Substitution, db
 )
 
-def load_csv_data():
-    """Load CSV data into SQLite database"""
-    
-    # Get the database directory path
-    db_dir = os.path.join(os.path.dirname(__file__), 'database')
-    
+# Rows per executemany batch
+BATCH_SIZE = 5000
+
+# Directory holding the source CSVs (and app.db)
+DATABASE_DIR = os.path.join(os.path.dirname(__file__), 'database')
+
+
+def frame_records(frame):
+    """Row dicts for a DataFrame, with numpy scalars and NaN converted to Python values"""
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def bulk_upsert(model, frame, upsert=True):
+    """Write a DataFrame of model column values in batches and return the row count.
+
+    With upsert, rows whose primary key already exists are updated in place
+    (INSERT ... ON CONFLICT DO UPDATE), like session.merge() without its SELECT
+    per row. Otherwise the table's rows are replaced: it is emptied and the
+    frame inserted in the caller's transaction, so reloading the same CSV
+    never duplicates rows that have no key to upsert on.
+    """
+    table = model.__table__
+    statement = insert(table)
+    if upsert:
+        keys = [column.name for column in table.primary_key.columns]
+        updates = {column: statement.excluded[column] for column in frame.columns if column not in keys}
+        if updates:
+            statement = statement.on_conflict_do_update(index_elements=keys, set_=updates)
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=keys)
+    else:
+        db.session.execute(table.delete())
+
+    records = frame_records(frame)
+    for start in range(0, len(records), BATCH_SIZE):
+        db.session.execute(statement, records[start:start + BATCH_SIZE])
+    return len(records)
+
+
+def transactions_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'transactions.csv'))
+    return pd.DataFrame({
+        'transaction_id': df['transaction_id'],
+        'timestamp': df['created_at'],
+        'store_id': df['store_id'],
+        'store_location': df['store_location'],
+        'device_id': df['device_id'],
+        'total_amount': df['total_amount'],
+        'payment_method': df['payment_method'],
+        'customer_id': df['customer_id']
+    })
+
+
+def stores_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'stores.csv'))
+    return df[['store_id', 'name', 'location', 'barangay', 'city', 'region', 'latitude', 'longitude']]
+
+
+def products_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'products.csv'))
+    # Synthetic product ids, prices and costs, as the CSV doesn't carry them
+    index = np.arange(len(df))
+    return pd.DataFrame({
+        'product_id': [f"prod_{i + 1:04d}" for i in index],
+        'name': df['name'],
+        'category': df['category'],
+        'brand_id': df['brand_id'],
+        'price': 50.0 + (index % 100) * 2.5,
+        'cost': 30.0 + (index % 100) * 1.5
+    })
+
+
+def brands_frame(db_dir):
+    brands_path = os.path.join(db_dir, 'brands.csv')
+    df = pd.read_csv(brands_path)
+    if 'brand_id' not in df.columns:
+        df['brand_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+        df.to_csv(brands_path, index=False) # Save updated brands.csv
+    return pd.DataFrame({
+        'brand_id': df['brand_id'],
+        'name': df['name'],
+        'category': df['category'],
+        'is_tbwa': df['is_tbwa'] if 'is_tbwa' in df.columns else False, # Handle missing is_tbwa
+        'created_at': df['created_at'] if 'created_at' in df.columns else datetime.now().isoformat() # Handle missing created_at
+    })
+
+
+def customers_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'customers.csv'))
+    return df[['customer_id', 'age', 'gender', 'barangay', 'city', 'region']]
+
+
+def transaction_items_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'transaction_items.csv'))
+    product_ids = df['product_id']
+    if pd.api.types.is_numeric_dtype(product_ids):
+        # products.csv has no id column, so products_frame numbers products prod_0001, ...
+        # in file order, and items refer to them by that 1-based row number. Unmapped,
+        # no item joins to its product and the category rollup is all Uncategorized.
+        product_ids = product_ids.map(lambda n: f"prod_{int(n):04d}" if pd.notna(n) else None)
+    return pd.DataFrame({
+        'transaction_id': df['transaction_id'],
+        'product_id': product_ids,
+        'quantity': df['quantity'],
+        'unit_price': df['unit_price'],
+        'total_price': df['price'] # Use 'price' column from CSV for total_price
+    })
+
+
+def devices_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'devices.csv'))
+    return pd.DataFrame({
+        'device_id': df['device_id'],
+        'type': df['device_type'], # Use 'device_type' column from CSV
+        'location': df['location'],
+        'store_id': df['store_id']
+    })
+
+
+def request_behaviors_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'request_behaviors.csv'))
+    return df[['transaction_id', 'behavior_type', 'timestamp', 'details']]
+
+
+def substitutions_frame(db_dir):
+    df = pd.read_csv(os.path.join(db_dir, 'substitutions.csv'))
+    return df[['transaction_id', 'original_product_id', 'substitute_product_id', 'reason']]
+
+
+# (table, model, frame builder, upsert on primary key). Tables whose CSV has no
+# key column get an autoincrement id and are replaced on every load.
+TABLES = [
+    ('transactions', Transaction, transactions_frame, True),
+    ('stores', Store, stores_frame, True),
+    ('products', Product, products_frame, True),
+    ('brands', Brand, brands_frame, True),
+    ('customers', Customer, customers_frame, True),
+    ('transaction_items', TransactionItem, transaction_items_frame, False),
+    ('devices', Device, devices_frame, True),
+    ('request_behaviors', RequestBehavior, request_behaviors_frame, False),
+    ('substitutions', Substitution, substitutions_frame, False),
+]
+
+# Source CSV per table, in DATABASE_DIR
+CSV_FILES = [f"{table_name}.csv" for table_name, *_ in TABLES]
+
+# Tables rollup_daily_category is computed from
+CATEGORY_SOURCE_TABLES = {'transactions', 'transaction_items', 'products'}
+
+
+def transaction_day_range(frame):
+    """First and last day a load of these transactions touches, or None.
+
+    Covers the days the loaded ids are stored under as well, since an upsert
+    can move a transaction off its previous day.
+    """
+    ids = frame['transaction_id'].dropna().astype(object).unique().tolist()
+    days = pd.to_datetime(frame['timestamp'], errors='coerce').dropna().dt.strftime('%Y-%m-%d')
+    candidates = [days.min(), days.max()] if len(days) else []
+    statement = text("""
+        SELECT MIN(date(timestamp)), MAX(date(timestamp))
+        FROM transactions
+        WHERE transaction_id IN :ids
+    """).bindparams(bindparam('ids', expanding=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        candidates.extend(db.session.execute(statement, {'ids': ids[start:start + BATCH_SIZE]}).one())
+    candidates = [day for day in candidates if day]
+    return (min(candidates), max(candidates)) if candidates else None
+
+
+def load_csv_data(progress=None):
+    """Load CSV data into SQLite database, one transaction per table.
+
+    A table that fails to load is rolled back on its own and the rest still
+    load. progress, if given, is called as progress(table, status, rows,
+    seconds) as each table starts loading and when it is loaded or fails.
+    Returns {table: {'rows': ..., 'seconds': ...}} for the tables loaded.
+    """
+    stats = {}
+    transaction_days = None
+    for table_name, model, build_frame, upsert in TABLES:
+        started = time.perf_counter()
+        if progress:
+            progress(table_name, 'loading')
+        try:
+            frame = build_frame(DATABASE_DIR)
+            print(f"Loading {len(frame)} {table_name}...")
+            if table_name == 'transactions':
+                transaction_days = transaction_day_range(frame)
+            rows = bulk_upsert(model, frame, upsert)
+            bump_table_version(db.session, table_name)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error loading {table_name}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            if progress:
+                progress(table_name, 'failed', 0, round(time.perf_counter() - started, 3))
+            continue
+
+        seconds = time.perf_counter() - started
+        stats[table_name] = {'rows': rows, 'seconds': round(seconds, 3)}
+        print(f"  Loaded {rows:,} rows into {table_name} in {seconds:.2f}s")
+        if progress:
+            progress(table_name, 'loaded', rows, stats[table_name]['seconds'])
+
+    refresh_rollups(stats, transaction_days)
+
+    total_rows = sum(table['rows'] for table in stats.values())
+    total_seconds = sum(table['seconds'] for table in stats.values())
+    print(f"CSV data loaded into SQLite database: {total_rows:,} rows in {len(stats)} tables, {total_seconds:.2f}s")
+    return stats
+
+
+def refresh_rollups(stats, transaction_days):
+    """Recompute the category rollup for the days the loaded tables touched"""
+    loaded = CATEGORY_SOURCE_TABLES & set(stats)
+    if not loaded:
+        return
+    if loaded == {'transactions'}:
+        # Only the days of the loaded transactions changed
+        if transaction_days is None:
+            return
+        day_from, day_to = transaction_days
+    else:
+        # New items or product categories can fall on any day
+        day_from = day_to = None
+
+    started = time.perf_counter()
     try:
-        # Load transactions
-        transactions_df = pd.read_csv(os.path.join(db_dir, 'transactions.csv'))
-        print(f"Loading {len(transactions_df)} transactions...")
-        for _, row in transactions_df.iterrows():
-            transaction = Transaction(
-                transaction_id=row['transaction_id'],
-                timestamp=row['created_at'],
-                store_id=row['store_id'],
-                store_location=row['store_location'],
-                device_id=row['device_id'],
-                total_amount=row['total_amount'],
-                payment_method=row['payment_method'],
-                customer_id=row['customer_id']
-            )
-            db.session.merge(transaction)
-        
-        # Load stores
-        stores_df = pd.read_csv(os.path.join(db_dir, 'stores.csv'))
-        print(f"Loading {len(stores_df)} stores...")
-        for _, row in stores_df.iterrows():
-            store = Store(
-                store_id=row['store_id'],
-                name=row['name'],
-                location=row['location'],
-                barangay=row['barangay'],
-                city=row['city'],
-                region=row['region'],
-                latitude=row['latitude'],
-                longitude=row['longitude']
-            )
-            db.session.merge(store)
-        
-        # Load products - check if columns exist
-        products_df = pd.read_csv(os.path.join(db_dir, 'products.csv'))
-        print(f"Products columns: {list(products_df.columns)}")
-        print(f"Loading {len(products_df)} products...")
-        
-        # Create synthetic product data if columns are missing
-        for i, row in products_df.iterrows():
-            product = Product(
-                product_id=f"prod_{i+1:04d}",  # Generate synthetic product_id
-                name=row['name'],
-                category=row['category'],
-                brand_id=row['brand_id'],
-                price=50.0 + (i % 100) * 2.5,  # Generate synthetic price
-                cost=30.0 + (i % 100) * 1.5    # Generate synthetic cost
-            )
-            db.session.merge(product)
-        
-        # Load brands
-        brands_df = pd.read_csv(os.path.join(db_dir, 'brands.csv'))
-        if 'brand_id' not in brands_df.columns:
-            brands_df['brand_id'] = [str(uuid.uuid4()) for _ in range(len(brands_df))]
-            brands_df.to_csv(os.path.join(db_dir, 'brands.csv'), index=False) # Save updated brands.csv
-        print(f"Loading {len(brands_df)} brands...")
-        for _, row in brands_df.iterrows():
-            brand = Brand(
-                brand_id=row['brand_id'],
-                name=row['name'],
-                category=row['category'],
-                is_tbwa=row["is_tbwa"] if "is_tbwa" in brands_df.columns else False, # Handle missing is_tbwa
-                created_at=row["created_at"] if "created_at" in brands_df.columns else datetime.now().isoformat() # Handle missing created_at
-            )
-            db.session.merge(brand)
-        
-        # Load customers
-        customers_df = pd.read_csv(os.path.join(db_dir, 'customers.csv'))
-        print(f"Loading {len(customers_df)} customers...")
-        for _, row in customers_df.iterrows():
-            customer = Customer(
-                customer_id=row["customer_id"],
-                age=row["age"],
-                gender=row["gender"],
-                barangay=row["barangay"],
-                city=row["city"],
-                region=row["region"]
-            )
-            db.session.merge(customer)
-        
-        # Load transaction items
-        transaction_items_df = pd.read_csv(os.path.join(db_dir, 'transaction_items.csv'))
-        print(f"Loading {len(transaction_items_df)} transaction items...")
-        for _, row in transaction_items_df.iterrows():
-            item = TransactionItem(
-                transaction_id=row['transaction_id'],
-                product_id=row['product_id'],
-                quantity=row['quantity'],
-                unit_price=row["unit_price"],
-                total_price=row["price"] # Use 'price' column from CSV for total_price
-            )
-            db.session.add(item)
-        
-        # Load devices
-        devices_df = pd.read_csv(os.path.join(db_dir, 'devices.csv'))
-        print(f"Loading {len(devices_df)} devices...")
-        for _, row in devices_df.iterrows():
-            device = Device(
-                device_id=row["device_id"],
-                type=row["device_type"], # Use 'device_type' column from CSV
-                location=row["location"],
-                store_id=row["store_id"]
-            )
-            db.session.merge(device)
-        
-        # Load request behaviors
-        request_behaviors_df = pd.read_csv(os.path.join(db_dir, 'request_behaviors.csv'))
-        print(f"Loading {len(request_behaviors_df)} request behaviors...")
-        for _, row in request_behaviors_df.iterrows():
-            behavior = RequestBehavior(
-                transaction_id=row['transaction_id'],
-                behavior_type=row['behavior_type'],
-                timestamp=row['timestamp'],
-                details=row['details']
-            )
-            db.session.add(behavior)
-        
-        # Load substitutions
-        substitutions_df = pd.read_csv(os.path.join(db_dir, 'substitutions.csv'))
-        print(f"Loading {len(substitutions_df)} substitutions...")
-        for _, row in substitutions_df.iterrows():
-            substitution = Substitution(
-                transaction_id=row['transaction_id'],
-                original_product_id=row['original_product_id'],
-                substitute_product_id=row['substitute_product_id'],
-                reason=row['reason']
-            )
-            db.session.add(substitution)
-        
-        # Commit all changes
+        refresh_category_rollup(db.session, day_from, day_to)
+        bump_table_version(db.session, CATEGORY_ROLLUP)
         db.session.commit()
-        print("CSV data loaded successfully into SQLite database!")
-        
     except Exception as e:
         db.session.rollback()
-        print(f"Error loading CSV data: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Don't raise the error, just continue with empty database
-        print("Continuing with empty database...")
-
+        print(f"Error refreshing {CATEGORY_ROLLUP}: {str(e)}")
+        return
+    days = f"{day_from} to {day_to}" if day_from else "all days"
+    print(f"  Refreshed {CATEGORY_ROLLUP} for {days} in {time.perf_counter() - started:.2f}s")
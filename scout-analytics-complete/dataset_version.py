@@ -0,0 +1,34 @@
+"""Per-table load versions, bumped by every data load"""
+
+from datetime import datetime
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert
+
+from src.models.user import db
+
+
+class TableVersion(db.Model):
+    __tablename__ = 'table_versions'
+    table_name = db.Column(db.String, primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    loaded_at = db.Column(db.String)
+
+
+def bump_table_version(session, table_name):
+    """Count a load of table_name, in the caller's transaction"""
+    statement = insert(TableVersion).values(table_name=table_name, version=1, loaded_at=datetime.utcnow().isoformat())
+    session.execute(statement.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={'version': TableVersion.version + 1, 'loaded_at': statement.excluded.loaded_at}
+    ))
+
+
+def get_table_version(session, table_name):
+    """Load version of table_name (0 if never loaded)"""
+    return session.scalar(select(TableVersion.version).where(TableVersion.table_name == table_name)) or 0
+
+
+def get_dataset_version(session):
+    """Sum of all table versions, which changes whenever any table is loaded"""
+    return session.scalar(select(func.coalesce(func.sum(TableVersion.version), 0)))
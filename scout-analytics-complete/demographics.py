@@ -0,0 +1,70 @@
+"""
+Customer demographics cube.
+
+One GROUP BY over customers counts every age group × gender × region cell. The
+cells are cached per version of the customers table, and every marginal, 2-D
+cross-tab and filtered view the dashboard asks for is summed from them in
+Python without touching the table again.
+"""
+
+import threading
+
+from sqlalchemy import case, func, select
+
+from src.dataset_version import get_table_version
+from src.models.analytics import Customer
+
+DIMENSIONS = ('age_group', 'gender', 'region')
+
+AGE_GROUP = case(
+    (Customer.age < 25, '18-24'),
+    (Customer.age < 35, '25-34'),
+    (Customer.age < 45, '35-44'),
+    (Customer.age < 55, '45-54'),
+    else_='55+'
+).label('age_group')
+
+_lock = threading.Lock()
+_cache = {'version': None, 'cells': None}
+
+
+def cube_cells(session):
+    """(age_group, gender, region, count) cells for the current customers table"""
+    version = get_table_version(session, 'customers')
+    with _lock:
+        if _cache['cells'] is not None and _cache['version'] == version:
+            return _cache['cells']
+
+    query = select(
+        AGE_GROUP,
+        Customer.gender,
+        Customer.region,
+        func.count(Customer.customer_id).label('count')
+    ).group_by(AGE_GROUP, Customer.gender, Customer.region)
+    cells = [tuple(row) for row in session.execute(query)]
+
+    with _lock:
+        _cache['version'] = version
+        _cache['cells'] = cells
+    return cells
+
+
+def filter_cells(cells, filters):
+    """Cells matching every {dimension: value} in filters"""
+    positions = [(DIMENSIONS.index(dimension), value) for dimension, value in filters.items()]
+    return [cell for cell in cells if all(cell[position] == value for position, value in positions)]
+
+
+def _sort_key(key):
+    # None sorts first, as SQLite's GROUP BY orders NULLs
+    return tuple((value is not None, value) for value in key)
+
+
+def rollup(cells, dimensions):
+    """Counts summed over every dimension not listed, as (*values, count) rows"""
+    positions = [DIMENSIONS.index(dimension) for dimension in dimensions]
+    totals = {}
+    for cell in cells:
+        key = tuple(cell[position] for position in positions)
+        totals[key] = totals.get(key, 0) + cell[-1]
+    return [(*key, totals[key]) for key in sorted(totals, key=_sort_key)]
@@ -0,0 +1,101 @@
+"""JSON responses built straight from SQLAlchemy result rows"""
+
+import json
+
+from flask import Response, stream_with_context
+
+SHAPES = ('records', 'columnar')
+
+# Rows fetched per partition (yield_per) by streamed listings
+STREAM_CHUNK_ROWS = 1000
+
+# SQLite only hands back numbers, text and NULL; anything else is sent as text
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+def get_shape(args):
+    """Read the shape parameter: records (default) or columnar"""
+    shape = args.get('shape', 'records')
+    if shape not in SHAPES:
+        raise ValueError(f"shape must be one of {', '.join(SHAPES)}")
+    return shape
+
+
+def _items(columns, rows, shape):
+    if shape == 'columnar':
+        # Row isn't a tuple subclass, so the encoder needs it converted
+        return [tuple(row) for row in rows]
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def rows_data(columns, rows, shape='records'):
+    """Rows as a list of objects, or as {"columns": [...], "rows": [[...]]}"""
+    columns = list(columns)
+    if shape == 'columnar':
+        return {'columns': columns, 'rows': _items(columns, rows, shape)}
+    return _items(columns, rows, shape)
+
+
+def dumps(payload):
+    return _encoder.encode(payload).encode('utf-8')
+
+
+def json_response(payload, status=200):
+    """Like jsonify, without key sorting or indentation"""
+    return Response(dumps(payload), status=status, mimetype='application/json')
+
+
+def stream_rows_response(result, /, shape='records', count_key=None, trailer=None,
+                         capture=None, capture_limit=None, **fields):
+    """Stream {"data": rows, **fields} from a Result, one partition at a time
+
+    count_key adds the number of rows sent; trailer() returns fields only known
+    once every row is sent; capture(bytes) receives the encoded "data" value
+    unless it grows past capture_limit bytes.
+    """
+    columns = list(result.keys())
+
+    def generate():
+        captured = [] if capture else None
+        captured_size = 0
+
+        def emit(chunk):
+            nonlocal captured, captured_size
+            if captured is not None:
+                captured.append(chunk)
+                captured_size += len(chunk)
+                if capture_limit is not None and captured_size > capture_limit:
+                    captured = None
+            return chunk
+
+        yield '{"data":'
+        if shape == 'columnar':
+            yield emit('{"columns":' + _encoder.encode(columns) + ',"rows":[')
+        else:
+            yield emit('[')
+        count = 0
+        for partition in result.partitions():
+            if not partition:
+                continue
+            # Drop the enclosing [ ] so partitions join into one array
+            yield emit((',' if count else '') + _encoder.encode(_items(columns, partition, shape))[1:-1])
+            count += len(partition)
+        yield emit(']}' if shape == 'columnar' else ']')
+        if captured is not None:
+            capture(''.join(captured).encode('utf-8'))
+
+        tail = dict(fields)
+        if count_key:
+            tail[count_key] = count
+        if trailer:
+            tail.update(trailer())
+        yield ',' + _encoder.encode(tail)[1:] if tail else '}'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def data_response(data, **fields):
+    """Respond with {"data": <encoded data>, **fields}, e.g. a captured stream"""
+    body = b'{"data":' + data
+    body += b',' + dumps(fields)[1:] if fields else b'}'
+    return Response(body, mimetype='application/json')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Load-test POST /api/ask offline against the stub ScoutBot backend: fire many
+concurrent requests drawn from a few distinct questions and report throughput,
+how many answers were shared with an identical question in flight, how many
+requests were refused at capacity, and how many upstream calls were made.
+"""
+
+import os
+import sys
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import argparse
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Must be set before the scoutbot module reads its settings
+os.environ['SCOUTBOT_BACKEND'] = 'stub'
+
+from flask import Flask
+
+from src.routes.analytics import analytics_bp
+from src.scoutbot import get_scoutbot
+
+QUESTIONS = (
+    'What are the top selling categories?',
+    'Which region has the highest revenue?',
+    'How does GCash usage change by hour?',
+    'Which brands are substituted most often?',
+    'What is the average basket size in NCR?',
+    'Which stores are growing fastest this month?',
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=16, help='requests in flight at once (above capacity, the rest are refused)')
+    parser.add_argument('--questions', type=int, default=len(QUESTIONS), help='distinct questions asked')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    questions = [QUESTIONS[i % len(QUESTIONS)] + ('' if i < len(QUESTIONS) else f' (#{i})')
+                 for i in range(args.questions)]
+
+    def ask(i):
+        started = time.perf_counter()
+        response = app.test_client().post('/api/ask', json={'query': questions[i % len(questions)]})
+        body = response.get_json()
+        outcome = 'shared' if response.status_code == 200 and body['shared'] else response.status_code
+        return outcome, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(ask, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    answered = [ms for outcome, ms in results if outcome in (200, 'shared')]
+    stats = get_scoutbot().stats()
+    print(f"requests      {args.requests} ({args.clients} concurrent, {len(questions)} distinct questions)")
+    print(f"elapsed       {elapsed:.2f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"answered      {len(answered)} ({outcomes['shared']} shared an in-flight call)")
+    print(f"refused (503) {outcomes[503]}")
+    print(f"timed out     {outcomes[504]}")
+    if answered:
+        print(f"median ms     {statistics.median(answered):.0f}")
+    print(f"upstream      {stats['calls']} calls (capacity {stats['capacity']} waiting requests and calls in flight)")
+
+
+if __name__ == '__main__':
+    main()
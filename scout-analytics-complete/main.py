@@ -1,13 +1,16 @@
 import os
 import sys
+import threading
+import traceback
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, jsonify, request, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
 from src.routes.user import user_bp
 from src.routes.analytics import analytics_bp
+from src.readiness import FAILED, Readiness
 
 app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
 app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
@@ -19,10 +22,44 @@ app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(analytics_bp, url_prefix='/api')
 
 # uncomment if you need to use database
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
+DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'database', 'app.db')
+app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{DATABASE_PATH}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+DEBUG = True
+
+# Seconds clients are asked to wait before retrying while the database loads
+RETRY_AFTER_SECONDS = 5
+
+readiness = Readiness()
+
+@app.before_request
+def require_database():
+    """Answer API requests with 503 until the database has been initialized"""
+    if readiness.serving or not request.path.startswith('/api/'):
+        return None
+    snapshot = readiness.snapshot()
+    if snapshot['state'] == FAILED:
+        message = 'Database initialization failed'
+    else:
+        message = 'Database is still loading'
+    response = jsonify({'error': message, 'state': snapshot['state']})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+@app.route('/health')
+def health():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    """Readiness: 200 once every table is loaded, 503 with per-table load progress otherwise"""
+    snapshot = readiness.snapshot()
+    return jsonify(snapshot), (200 if snapshot['ready'] else 503)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
@@ -40,17 +77,42 @@ def serve(path):
             return "index.html not found", 404
 
 def initialize_database():
-    """Initialize database and load CSV data if needed"""
-    with app.app_context():
-        db.create_all()
-        
-        # Load CSV data on startup if database is empty
-        from src.models.analytics import Transaction
-        if Transaction.query.count() == 0:
-            print("Loading CSV data into database...")
-            from src.data_loader import load_csv_data
-            load_csv_data()
+    """Initialize database and load CSV data if needed, recording progress in readiness"""
+    loaded = None
+    try:
+        # A prebuilt snapshot of the current CSVs replaces the load entirely
+        from src.data_loader import CSV_FILES, DATABASE_DIR
+        from src.snapshot import restore_snapshot
+        restore_snapshot(DATABASE_DIR, DATABASE_PATH, CSV_FILES)
+
+        with app.app_context():
+            db.create_all()
+            
+            # Load CSV data on startup if database is empty
+            from src.models.analytics import Transaction
+            if Transaction.query.count() == 0:
+                print("Loading CSV data into database...")
+                from src.data_loader import TABLES, load_csv_data
+                readiness.begin_load([table_name for table_name, *_ in TABLES])
+                loaded = load_csv_data(progress=readiness.table_progress)
+            
+            from src.rollups import ensure_rollups
+            ensure_rollups(db.engine)
+    except Exception as e:
+        print(f"Database initialization failed: {str(e)}")
+        traceback.print_exc()
+        readiness.finish(error=str(e))
+        return
+    readiness.finish(loaded=loaded)
+
+def start_database_initialization():
+    """Run initialize_database in a background thread so the server starts immediately"""
+    thread = threading.Thread(target=initialize_database, name='database-init', daemon=True)
+    thread.start()
+    return thread
 
 if __name__ == '__main__':
-    initialize_database()
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Under the debug reloader only the child process serves requests, so only it loads data
+    if not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_database_initialization()
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
@@ -0,0 +1,75 @@
+"""
+Startup readiness of the Scout API.
+
+The database is created and loaded from CSVs in a background thread so the
+server can answer health checks and serve the dashboard while it runs. This
+tracks how far that load has got: the overall state plus, per table, whether
+it is pending, loading, loaded or failed and how many rows it holds. A load
+in which some tables failed finishes degraded: the API serves the tables that
+did load, but the instance doesn't report itself ready.
+"""
+
+import threading
+import time
+
+STARTING = 'starting'
+LOADING = 'loading'
+READY = 'ready'
+DEGRADED = 'degraded'
+FAILED = 'failed'
+
+
+class Readiness:
+    """Thread-safe record of database initialization progress"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = STARTING
+        self.error = None
+        self.tables = {}
+        self.started_at = time.time()
+        self.finished_at = None
+
+    @property
+    def ready(self):
+        return self.state == READY
+
+    @property
+    def serving(self):
+        """Whether API requests can be answered from the database"""
+        return self.state in (READY, DEGRADED)
+
+    def begin_load(self, table_names):
+        with self._lock:
+            self.state = LOADING
+            self.tables = {name: {'status': 'pending', 'rows': 0, 'seconds': None} for name in table_names}
+
+    def table_progress(self, table_name, status, rows=0, seconds=None):
+        """Progress callback for data_loader.load_csv_data"""
+        with self._lock:
+            self.tables[table_name] = {'status': status, 'rows': rows, 'seconds': seconds}
+
+    def finish(self, error=None, loaded=None):
+        """Record the end of initialization; loaded is load_csv_data's result, if a load ran"""
+        with self._lock:
+            failed = [name for name in self.tables if loaded is not None and name not in loaded]
+            if error:
+                self.state = FAILED
+            elif failed:
+                self.state = DEGRADED
+                error = f"Tables failed to load: {', '.join(failed)}"
+            else:
+                self.state = READY
+            self.error = error
+            self.finished_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = (self.finished_at or time.time()) - self.started_at
+            return {
+                'state': self.state,
+                'ready': self.state == READY,
+                'error': self.error,
+                'elapsed_seconds': round(elapsed, 3),
+                'tables': {name: dict(progress) for name, progress in self.tables.items()}
+            }
@@ -0,0 +1,221 @@
+"""
+Maintained rollups behind the dashboard's landing-page charts.
+
+rollup_hourly_volume holds the number of transactions per day and hour of day.
+SQLite triggers on transactions keep it current as rows are inserted, updated
+or deleted, whichever loader writes them, so the volume charts read at most
+24 rows per charted day through the table's (day, hour) primary key no matter
+how much history transactions holds.
+
+rollup_daily_category holds revenue, units and distinct transactions per
+product category per day. Distinct counts can't be maintained row by row, so
+the data loader recomputes the days a load touched instead; the category mix
+then reads one row per category per day rather than joining transaction_items
+to products on every request.
+"""
+
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+VOLUME_ROLLUP = 'rollup_hourly_volume'
+
+# Day and hour of day of a transactions row (NEW or OLD in the triggers)
+VOLUME_DAY = "date({row}.timestamp)"
+VOLUME_HOUR = "CAST(strftime('%H', {row}.timestamp) AS INTEGER)"
+
+
+def _volume_change(row, delta):
+    """Trigger statement adding delta to the bucket of a NEW or OLD row"""
+    return f"""
+        INSERT INTO {VOLUME_ROLLUP} (day, hour, transactions)
+        SELECT {VOLUME_DAY.format(row=row)}, {VOLUME_HOUR.format(row=row)}, {delta}
+        WHERE {VOLUME_DAY.format(row=row)} IS NOT NULL
+        ON CONFLICT (day, hour) DO UPDATE SET transactions = transactions + excluded.transactions;
+    """
+
+
+VOLUME_ROLLUP_DDL = [
+    f"""
+    CREATE TABLE IF NOT EXISTS {VOLUME_ROLLUP} (
+        day TEXT NOT NULL,
+        hour INTEGER NOT NULL,
+        transactions INTEGER NOT NULL,
+        PRIMARY KEY (day, hour)
+    ) WITHOUT ROWID
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {VOLUME_ROLLUP}_insert AFTER INSERT ON transactions
+    BEGIN {_volume_change('NEW', 1)} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {VOLUME_ROLLUP}_delete AFTER DELETE ON transactions
+    BEGIN {_volume_change('OLD', -1)} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {VOLUME_ROLLUP}_update AFTER UPDATE OF timestamp ON transactions
+    BEGIN {_volume_change('OLD', -1)} {_volume_change('NEW', 1)} END
+    """,
+]
+
+CATEGORY_ROLLUP = 'rollup_daily_category'
+
+CATEGORY_ROLLUP_DDL = f"""
+    CREATE TABLE IF NOT EXISTS {CATEGORY_ROLLUP} (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        revenue REAL NOT NULL,
+        units INTEGER NOT NULL,
+        transactions INTEGER NOT NULL,
+        PRIMARY KEY (day, category)
+    ) WITHOUT ROWID
+"""
+
+# Items whose product isn't in the catalogue still count towards revenue
+UNCATEGORIZED = 'Uncategorized'
+
+
+def ensure_volume_rollup(connection):
+    """Create the volume rollup and its triggers if missing; returns True if it was created.
+
+    A new rollup is backfilled from the transactions already present in the
+    same transaction as the triggers are created, so no row is missed or
+    counted twice.
+    """
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': VOLUME_ROLLUP}
+    ).first()
+    for statement in VOLUME_ROLLUP_DDL:
+        connection.execute(text(statement))
+    if exists:
+        return False
+    connection.execute(text(f"""
+        INSERT INTO {VOLUME_ROLLUP} (day, hour, transactions)
+        SELECT {VOLUME_DAY.format(row='transactions')}, {VOLUME_HOUR.format(row='transactions')}, COUNT(*)
+        FROM transactions
+        WHERE {VOLUME_DAY.format(row='transactions')} IS NOT NULL
+        GROUP BY 1, 2
+    """))
+    return True
+
+
+def refresh_category_rollup(connection, day_from=None, day_to=None):
+    """Recompute category rollup rows for the given day range (all days when omitted).
+
+    Run on a connection or session inside the load's transaction (the caller
+    commits), after the transactions, transaction_items and products it reads.
+    """
+    connection.execute(text(CATEGORY_ROLLUP_DDL))
+    rollup_conditions = []
+    # Compared on the raw timestamp so idx_transactions_timestamp can be used
+    source_conditions = ["date(t.timestamp) IS NOT NULL"]
+    params = {}
+    if day_from:
+        rollup_conditions.append("day >= :day_from")
+        source_conditions.append("t.timestamp >= :day_from")
+        params['day_from'] = day_from
+    if day_to:
+        rollup_conditions.append("day <= :day_to")
+        source_conditions.append("t.timestamp < date(:day_to, '+1 day')")
+        params['day_to'] = day_to
+    rollup_where = "WHERE " + " AND ".join(rollup_conditions) if rollup_conditions else ""
+
+    connection.execute(text(f"DELETE FROM {CATEGORY_ROLLUP} {rollup_where}"), params)
+    connection.execute(text(f"""
+        INSERT INTO {CATEGORY_ROLLUP} (day, category, revenue, units, transactions)
+        SELECT
+            date(t.timestamp) AS day,
+            COALESCE(p.category, '{UNCATEGORIZED}') AS category,
+            COALESCE(SUM(ti.total_price), 0),
+            COALESCE(SUM(ti.quantity), 0),
+            COUNT(DISTINCT ti.transaction_id)
+        FROM transaction_items ti
+        JOIN transactions t ON t.transaction_id = ti.transaction_id
+        LEFT JOIN products p ON p.product_id = ti.product_id
+        WHERE {" AND ".join(source_conditions)}
+        GROUP BY 1, 2
+    """), params)
+
+
+def ensure_category_rollup(connection):
+    """Create and fill the category rollup if missing; returns True if it was created"""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': CATEGORY_ROLLUP}
+    ).first()
+    if exists:
+        return False
+    refresh_category_rollup(connection)
+    return True
+
+
+def ensure_rollups(engine):
+    """Create any missing rollups (run after the tables exist)"""
+    with engine.begin() as connection:
+        ensure_volume_rollup(connection)
+        ensure_category_rollup(connection)
+
+
+def volume_series(connection, days=30):
+    """Hour-of-day and daily transaction counts for the `days` days ending at the latest day with data"""
+    last_day = connection.execute(text(f"SELECT MAX(day) FROM {VOLUME_ROLLUP}")).scalar()
+    last_day = date.fromisoformat(last_day) if last_day else date.today()
+    first_day = last_day - timedelta(days=days - 1)
+
+    hourly = [0] * 24
+    daily = {}
+    rows = connection.execute(text(f"""
+        SELECT day, hour, transactions
+        FROM {VOLUME_ROLLUP}
+        WHERE day BETWEEN :first_day AND :last_day
+    """), {'first_day': first_day.isoformat(), 'last_day': last_day.isoformat()})
+    for day, hour, transactions in rows:
+        hourly[hour] += transactions
+        daily[day] = daily.get(day, 0) + transactions
+
+    return {
+        'hourly': [{'hour': f"{hour:02d}:00", 'volume': volume} for hour, volume in enumerate(hourly)],
+        'daily': [
+            {'date': day, 'volume': daily.get(day, 0)}
+            for day in ((first_day + timedelta(days=i)).isoformat() for i in range(days))
+        ]
+    }
+
+
+def category_mix(connection, from_date=None, to_date=None):
+    """Revenue, units, distinct transactions and revenue share per category over a date range.
+
+    count (transactions) and avg_price (revenue per unit) keep the fields the
+    dashboard read from the original products-table aggregate.
+    """
+    conditions = []
+    params = {}
+    if from_date:
+        conditions.append("day >= date(:from_date)")
+        params['from_date'] = from_date
+    if to_date:
+        conditions.append("day <= date(:to_date)")
+        params['to_date'] = to_date
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    rows = connection.execute(text(f"""
+        SELECT category, SUM(revenue) AS revenue, SUM(units) AS units, SUM(transactions) AS transactions
+        FROM {CATEGORY_ROLLUP}
+        {where}
+        GROUP BY category
+        ORDER BY revenue DESC
+    """), params).all()
+    total = sum(row.revenue for row in rows)
+    return [
+        {
+            'category': row.category,
+            'count': row.transactions,
+            'avg_price': round(row.revenue / row.units, 2) if row.units else 0,
+            'revenue': round(row.revenue, 2),
+            'units': row.units,
+            'transactions': row.transactions,
+            'share': round(row.revenue * 100 / total, 1) if total else 0.0
+        }
+        for row in rows
+    ]
@@ -0,0 +1,234 @@
+"""
+ScoutBot question answering off the request threads.
+
+LLM calls take seconds, and the request asking still waits on its worker
+thread for the answer. Unbounded, a handful of concurrent questions would
+hold every Flask worker. Calls therefore run on a dedicated thread pool of
+SCOUTBOT_MAX_CONCURRENCY threads, and ScoutBot's capacity,
+SCOUTBOT_MAX_CONCURRENCY + SCOUTBOT_MAX_QUEUE, bounds both the requests
+waiting for an answer (including ones sharing another's call) and the calls
+in flight (including ones every waiter has given up on). Past either bound a
+question is refused at once, so at most `capacity` workers are ever tied up
+and the rest of the API keeps its workers. Identical questions already in
+flight share that single upstream call (single-flight) instead of each
+making their own. A call still queued when its last waiter times out is
+cancelled, and running calls are cut off by the client's own timeout.
+
+The model is reached through a pluggable backend chosen by SCOUTBOT_BACKEND:
+'azure' (Azure OpenAI, the default) or 'stub', a local stand-in that answers
+after SCOUTBOT_STUB_LATENCY_SECONDS so throughput can be load-tested offline.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+SCOUTBOT_BACKEND = os.getenv('SCOUTBOT_BACKEND', 'azure')
+
+# Upstream calls running at once
+MAX_CONCURRENCY = int(os.getenv('SCOUTBOT_MAX_CONCURRENCY', 4))
+
+# Questions that may wait for a free call slot before new ones are refused
+MAX_QUEUE = int(os.getenv('SCOUTBOT_MAX_QUEUE', 16))
+
+# Seconds a request waits for its answer, and an upstream call may take
+TIMEOUT_SECONDS = float(os.getenv('SCOUTBOT_TIMEOUT_SECONDS', 30))
+
+STUB_LATENCY_SECONDS = float(os.getenv('SCOUTBOT_STUB_LATENCY_SECONDS', 1.0))
+
+SYSTEM_PROMPT = """You are ScoutBot, a retail BI assistant for Scout Analytics. You help analyze Philippine retail transaction data.
+
+Database Schema:
+- transactions: transaction_id, timestamp, store_id, store_location, device_id, total_amount, payment_method, customer_id
+- stores: store_id, name, location, barangay, city, region, latitude, longitude
+- products: product_id, name, category, brand_id, price, cost
+- brands: brand_id, name, category
+- customers: customer_id, age, gender, location, barangay, city, region
+- transaction_items: transaction_id, product_id, quantity, unit_price, total_price
+
+When users ask questions, provide:
+1. Interpreted intent
+2. Suggested SQL query (if applicable)
+3. Chart recommendation (bar, line, pie, table)
+4. Key insights and recommendations
+
+Focus on Philippine retail context: regions like NCR, Cebu, Davao; categories like Beverages, Snacks, Personal Care, Household; payment methods like Cash, GCash, Credit Card."""
+
+
+class ScoutBotOverloaded(Exception):
+    """As many requests are waiting, or calls in flight, as ScoutBot allows"""
+
+
+class AzureOpenAIBackend:
+    """Answers through Azure OpenAI chat completions"""
+
+    name = 'azure'
+
+    def __init__(self):
+        from openai import AzureOpenAI
+        self.client = AzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            api_version=os.getenv("AZURE_API_VERSION"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            # An answer nobody waits for any more shouldn't hold a call slot for long
+            timeout=TIMEOUT_SECONDS
+        )
+        self.model = os.getenv("AZURE_DEPLOYMENT_NAME")
+
+    def complete(self, question):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": question}
+            ],
+            max_tokens=1000,
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+
+
+class StubBackend:
+    """Local stand-in that answers after a fixed delay, for offline load tests"""
+
+    name = 'stub'
+    model = 'stub'
+
+    def __init__(self, latency=STUB_LATENCY_SECONDS):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def complete(self, question):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return (
+            f"Interpreted intent: {question}\n"
+            "Suggested SQL: SELECT category, SUM(total_price) FROM transaction_items GROUP BY category\n"
+            "Chart recommendation: bar\n"
+            "Key insights: (stub backend response)"
+        )
+
+
+BACKENDS = {
+    'azure': AzureOpenAIBackend,
+    'stub': StubBackend,
+}
+
+
+def make_backend(name=SCOUTBOT_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"SCOUTBOT_BACKEND must be one of {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def question_key(question):
+    """Questions differing only in whitespace or case share one upstream call"""
+    return ' '.join(question.split()).casefold()
+
+
+class _Call:
+    """An upstream call in flight and how many requests are waiting for it"""
+
+    __slots__ = ('future', 'waiters')
+
+    def __init__(self, future):
+        self.future = future
+        self.waiters = 0
+
+
+class ScoutBot:
+    """Bounded-concurrency, single-flight front for a backend"""
+
+    def __init__(self, backend, max_concurrency=MAX_CONCURRENCY, max_queue=MAX_QUEUE):
+        self.backend = backend
+        self.capacity = max_concurrency + max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='scoutbot')
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.waiting = 0
+        self.calls = 0
+        self.shared = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _finished(self, key, future):
+        with self._lock:
+            call = self._in_flight.get(key)
+            if call is not None and call.future is future:
+                del self._in_flight[key]
+
+    def _join(self, question):
+        """Wait on the call for question, starting one if none is in flight; returns (call, shared)"""
+        key = question_key(question)
+        with self._lock:
+            if self.waiting >= self.capacity:
+                self.rejected += 1
+                raise ScoutBotOverloaded('ScoutBot is busy; try again shortly')
+            call = self._in_flight.get(key)
+            shared = call is not None
+            if shared:
+                self.shared += 1
+            else:
+                if len(self._in_flight) >= self.capacity:
+                    self.rejected += 1
+                    raise ScoutBotOverloaded('ScoutBot is busy; try again shortly')
+                call = self._in_flight[key] = _Call(self._executor.submit(self.backend.complete, question))
+                self.calls += 1
+            call.waiters += 1
+            self.waiting += 1
+        if not shared:
+            # Outside the lock: the callback runs at once if the call has already finished
+            call.future.add_done_callback(lambda done: self._finished(key, done))
+        return call, shared
+
+    def ask(self, question, timeout=TIMEOUT_SECONDS):
+        """Answer question, waiting at most timeout seconds.
+
+        Returns (answer, whether it was shared with an identical question in
+        flight). Raises ScoutBotOverloaded when at capacity and
+        concurrent.futures.TimeoutError when the answer is late.
+        """
+        call, shared = self._join(question)
+        try:
+            return call.future.result(timeout=timeout), shared
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                call.waiters -= 1
+                abandoned = call.waiters == 0
+            if abandoned:
+                # Outside the lock, as cancelling runs the done callback; a no-op once the call has started
+                call.future.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend.name,
+                'capacity': self.capacity,
+                'waiting': self.waiting,
+                'in_flight': len(self._in_flight),
+                'calls': self.calls,
+                'shared': self.shared,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts
+            }
+
+
+_scoutbot = None
+_scoutbot_lock = threading.Lock()
+
+
+def get_scoutbot():
+    """The process-wide ScoutBot, created on first use"""
+    global _scoutbot
+    with _scoutbot_lock:
+        if _scoutbot is None:
+            _scoutbot = ScoutBot(make_backend())
+        return _scoutbot
@@ -0,0 +1,251 @@
+"""
+Prebuilt SQLite snapshots of the Scout database.
+
+Loading the CSVs is the slow part of starting a fresh container. build_snapshot.py
+does it once: it loads the CSVs into a standalone database, indexes, ANALYZEs and
+VACUUMs it, and writes it to database/snapshot/ next to a manifest of the
+SHA-256 (and size and mtime) of every source CSV. At startup initialize_database
+copies the snapshot into place when the manifest still matches the CSVs on disk,
+so the CSV load only runs again when the data has changed; CSVs whose size and
+mtime match the manifest aren't hashed again. A snapshot only ever replaces a
+database that is missing, empty, or restored from a snapshot and not written to
+since. Triggers on every table of a snapshot flag it modified on the first
+write, so a database holding data written by the app is left alone.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+SNAPSHOT_DIR_NAME = 'snapshot'
+MANIFEST_NAME = 'manifest.json'
+
+# Bumped when the snapshot layout changes, so older snapshots are rebuilt
+SNAPSHOT_FORMAT = 2
+
+# One-row table inside each snapshot recording the version it was built as
+# and whether it has been written to since
+VERSION_TABLE = 'snapshot_version'
+
+MODIFIED_TRIGGER = VERSION_TABLE + '_{table}_{event}'
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Indexes for the dashboard's filters and joins (ones whose table or column doesn't exist are skipped)
+SNAPSHOT_INDEXES = [
+    ('idx_transactions_timestamp', 'transactions', ['timestamp']),
+    ('idx_transactions_store', 'transactions', ['store_id']),
+    ('idx_transactions_customer', 'transactions', ['customer_id']),
+    ('idx_transaction_items_transaction', 'transaction_items', ['transaction_id']),
+    ('idx_transaction_items_product', 'transaction_items', ['product_id']),
+    ('idx_products_category', 'products', ['category']),
+    ('idx_customers_region', 'customers', ['region']),
+]
+
+
+def snapshot_dir(db_dir):
+    return os.path.join(db_dir, SNAPSHOT_DIR_NAME)
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+def csv_hashes(db_dir, csv_names):
+    """SHA-256 of each source CSV, or None for ones that don't exist"""
+    hashes = {}
+    for name in csv_names:
+        path = os.path.join(db_dir, name)
+        hashes[name] = file_sha256(path) if os.path.exists(path) else None
+    return hashes
+
+
+def csv_stats(db_dir, csv_names):
+    """[size, mtime_ns] of each source CSV, or None for ones that don't exist"""
+    stats = {}
+    for name in csv_names:
+        try:
+            stat = os.stat(os.path.join(db_dir, name))
+        except FileNotFoundError:
+            stats[name] = None
+            continue
+        stats[name] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def csvs_match(db_dir, csv_names, manifest):
+    """True if the CSVs in db_dir are the ones the manifest was built from"""
+    if csv_stats(db_dir, csv_names) == manifest.get('csv_stats'):
+        return True
+    return csv_hashes(db_dir, csv_names) == manifest['csv_sha256']
+
+
+def dataset_version(hashes):
+    """Short content hash naming a snapshot built from these CSVs"""
+    payload = json.dumps({'format': SNAPSHOT_FORMAT, 'csv_sha256': hashes}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def read_manifest(db_dir):
+    path = os.path.join(snapshot_dir(db_dir), MANIFEST_NAME)
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(db_dir, version, hashes, snapshot_name, tables, stats=None):
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': version,
+        'built_at': datetime.utcnow().isoformat(),
+        'snapshot': snapshot_name,
+        'csv_sha256': hashes,
+        'csv_stats': stats,
+        'tables': tables
+    }
+    path = os.path.join(snapshot_dir(db_dir), MANIFEST_NAME)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+    return manifest
+
+
+def finalize_snapshot(path, version):
+    """Index, stamp, ANALYZE and VACUUM a freshly loaded database"""
+    conn = sqlite3.connect(path)
+    try:
+        for name, table, columns in SNAPSHOT_INDEXES:
+            try:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+            except sqlite3.OperationalError as e:
+                print(f"Skipping index {name}: {str(e)}")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {VERSION_TABLE} (
+                version TEXT NOT NULL,
+                built_at TEXT NOT NULL,
+                modified INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        conn.execute(f"DELETE FROM {VERSION_TABLE}")
+        conn.execute(f"INSERT INTO {VERSION_TABLE} (version, built_at) VALUES (?, ?)",
+                     (version, datetime.utcnow().isoformat()))
+        for table in _user_tables(conn):
+            if table == VERSION_TABLE:
+                continue
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                trigger = MODIFIED_TRIGGER.format(table=table, event=event.lower())
+                conn.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS "{trigger}" AFTER {event} ON "{table}"
+                    BEGIN UPDATE {VERSION_TABLE} SET modified = 1 WHERE modified = 0; END
+                """)
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def _connect_readonly(db_path):
+    return sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def _user_tables(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    )]
+
+
+def database_version(db_path):
+    """(version, modified) stamped in db_path, or None if it wasn't restored from a snapshot.
+
+    modified is True once any table has been written to since the snapshot was
+    built, or a table created since then (so without a trigger) holds rows.
+    """
+    if not os.path.exists(db_path):
+        return None
+    try:
+        conn = _connect_readonly(db_path)
+        try:
+            row = conn.execute(f"SELECT version, modified FROM {VERSION_TABLE}").fetchone()
+            if row is None:
+                return None
+            tracked = {row[0] for row in conn.execute(
+                "SELECT tbl_name FROM sqlite_master WHERE type = 'trigger' AND name LIKE ?",
+                (f"{VERSION_TABLE}_%",)
+            )}
+            untracked = [table for table in _user_tables(conn) if table not in tracked and table != VERSION_TABLE]
+            modified = bool(row[1]) or any(
+                conn.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() for table in untracked
+            )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return row[0], modified
+
+
+def database_is_empty(db_path):
+    """True if db_path is missing or none of its tables has a row"""
+    if not os.path.exists(db_path) or os.path.getsize(db_path) == 0:
+        return True
+    conn = _connect_readonly(db_path)
+    try:
+        return not any(conn.execute(f'SELECT 1 FROM "{table}" LIMIT 1').fetchone() for table in _user_tables(conn))
+    finally:
+        conn.close()
+
+
+def restore_snapshot(db_dir, db_path, csv_names):
+    """Copy the snapshot over db_path if it was built from the CSVs now in db_dir.
+
+    Only a missing or empty db_path, or one restored from a snapshot and not
+    written to since, is replaced. Returns the snapshot version now at db_path, or None when
+    db_path is kept or there is no usable snapshot, in which case the normal
+    load path runs. Must run before anything opens db_path.
+    """
+    manifest = read_manifest(db_dir)
+    if manifest is None or manifest.get('format') != SNAPSHOT_FORMAT:
+        return None
+    snapshot_path = os.path.join(snapshot_dir(db_dir), manifest['snapshot'])
+    if not os.path.exists(snapshot_path):
+        return None
+
+    started = time.perf_counter()
+    version = manifest['version']
+    stamp = database_version(db_path)
+    if stamp is not None and stamp[1]:
+        print(f"Keeping {db_path}: it has been written to since snapshot {stamp[0]} was restored")
+        return None
+    if stamp is not None and stamp[0] == version:
+        return version
+    if stamp is None and not database_is_empty(db_path):
+        print(f"Keeping {db_path}: it holds data that wasn't restored from a snapshot")
+        return None
+    if not csvs_match(db_dir, csv_names, manifest):
+        print(f"Database snapshot {version} is stale: the CSVs have changed since it was built")
+        return None
+
+    if os.path.exists(db_path):
+        # Fold any WAL content into the old file so it can't be replayed onto the new one
+        live = sqlite3.connect(db_path)
+        try:
+            live.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        finally:
+            live.close()
+    restoring_path = f"{db_path}.restoring"
+    shutil.copyfile(snapshot_path, restoring_path)
+    os.replace(restoring_path, db_path)
+    print(f"Restored database snapshot {version} in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return version
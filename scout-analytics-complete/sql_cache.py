@@ -0,0 +1,159 @@
+"""
+Result cache for the /sql endpoint.
+
+Dashboard tiles send the same few SELECTs over and over. Each page of results
+is kept encoded, in an LRU bounded by a byte budget, under a key made of the
+normalized SQL text, the page requested and the dataset version. A load bumps
+the dataset version, which empties the cache, so a hit never serves rows from
+before a load.
+
+Normalization only makes changes that cannot alter a query's result: comments
+and runs of whitespace collapse, whitespace around ( ) , = < > ! goes unless
+it separates two operator characters (so `a < = b` stays distinct from
+`a <= b`), text outside quotes is lowercased (SQLite keywords and identifiers are
+case-insensitive), and IN lists made only of literals are sorted and
+deduplicated. Quoted strings and identifiers are left exactly as written.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Bytes of encoded results the cache may hold
+SQL_CACHE_BYTES = int(os.getenv('SQL_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Largest share of the budget a single result may take
+MAX_ENTRY_FRACTION = 8
+
+_QUOTED = r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]"
+_LITERAL = r"'(?:[^']|'')*'|-?\d+(?:\.\d+)?"
+
+# Quoted text, comments, whitespace, and everything else a character or run at a time
+SQL_TOKENS = re.compile(rf"({_QUOTED})|(--[^\n]*|/\*.*?\*/)|(\s+)|([^'\"`\[\s\-/]+|.)", re.DOTALL)
+
+# Whitespace next to these can go without changing how the SQL tokenizes
+PUNCTUATION = set('(),=<>!')
+
+# ...except between two of these, which would join into a different operator
+OPERATOR_CHARS = set('=<>!')
+
+# Quoted text (kept as is) or an IN list of literals
+IN_LIST = re.compile(rf"({_QUOTED})|\bin\(((?:{_LITERAL})(?:,(?:{_LITERAL}))*)\)")
+LITERAL = re.compile(_LITERAL)
+
+
+def _literal_key(literal):
+    if literal.startswith("'"):
+        return (1, 0, literal)
+    return (0, float(literal), literal)
+
+
+def _sort_in_list(match):
+    if match.group(1):
+        return match.group(1)
+    literals = sorted(set(LITERAL.findall(match.group(2))), key=_literal_key)
+    return f"in({','.join(literals)})"
+
+
+def normalize_sql(sql):
+    """Canonical text for sql, equal for queries that differ only in layout, case or IN list order"""
+    parts = []
+    for quoted, comment, space, other in SQL_TOKENS.findall(sql.strip().rstrip(';')):
+        if quoted:
+            parts.append(quoted)
+        elif comment or space:
+            if parts and parts[-1] != ' ':
+                parts.append(' ')
+        else:
+            parts.append(other.lower())
+
+    kept = []
+    for i, part in enumerate(parts):
+        if part == ' ':
+            before = parts[i - 1] if i > 0 else ''
+            after = parts[i + 1] if i + 1 < len(parts) else ''
+            if not before or not after:
+                continue
+            joins_operator = before[-1] in OPERATOR_CHARS and after[0] in OPERATOR_CHARS
+            if not joins_operator and (before[-1] in PUNCTUATION or after[0] in PUNCTUATION):
+                continue
+        kept.append(part)
+    return IN_LIST.sub(_sort_in_list, ''.join(kept))
+
+
+class ResultCache:
+    """Thread-safe LRU of encoded results under a byte budget, emptied when the dataset version changes"""
+
+    def __init__(self, max_bytes=SQL_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // MAX_ENTRY_FRACTION
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.bytes = 0
+            self._version = version
+
+    def get(self, key, version):
+        """Return the (data, fields) cached for key, or None"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, version, data, fields):
+        """Cache encoded data and its response fields, evicting least recently used entries to fit"""
+        size = len(data) + len(repr(fields))
+        if size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            self._check_version(version)
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            while self._entries and self.bytes + size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+            self._entries[key] = (data, fields, size)
+            self.bytes += size
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'dataset_version': self._version
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,339 @@
+"""
+Guarded execution of analyst SQL for the /sql endpoint.
+
+Each query runs on its own read-only SQLite connection, apart from the
+application's session, and has to pass several limits:
+
+- an EXPLAIN QUERY PLAN pre-flight: the rows the plan would visit are
+  estimated from table sizes (full scans cost the whole table, index searches
+  a few rows, nested loops multiply), and queries over MAX_ESTIMATED_ROWS are
+  rejected before they run;
+- a wall-clock budget, enforced by a progress handler that interrupts the
+  statement once one fetch has run for TIME_BUDGET_SECONDS (time spent
+  waiting on a slow client between fetches doesn't count);
+- a hard cap of MAX_ROWS rows per response. When more rows remain, the
+  response carries a signed continuation cursor that fetches the next page.
+
+A query ending in ORDER BY one of its result columns is continued by key: the
+cursor holds the last key sent and the next page only reads rows past it, so
+paging through a result costs the same per page however deep it goes. That
+needs the page boundary to fall between two different keys; otherwise, and for
+other queries, the cursor holds an offset into the rerun query, and offsets
+past MAX_OFFSET rows are refused.
+
+Rows are read from the cursor in chunks and streamed to the client, so a
+large result is never held in memory all at once.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from urllib.parse import quote
+
+from itsdangerous import BadSignature, URLSafeSerializer
+
+from src.json_rows import STREAM_CHUNK_ROWS
+
+# Rows the query plan may visit before a query is rejected unrun
+MAX_ESTIMATED_ROWS = int(os.getenv('SQL_MAX_ESTIMATED_ROWS', 5_000_000))
+
+# Wall-clock seconds a query may run for
+TIME_BUDGET_SECONDS = float(os.getenv('SQL_TIME_BUDGET_SECONDS', 5))
+
+# Most rows returned per response; the rest are fetched with the continuation cursor
+MAX_ROWS = int(os.getenv('SQL_MAX_ROWS', 1000))
+
+# Deepest offset a continuation cursor may skip to when the query can't be continued by key
+MAX_OFFSET = int(os.getenv('SQL_MAX_OFFSET', 100_000))
+
+# SQLite VM instructions between wall-clock checks
+PROGRESS_STEPS = 10000
+
+# Rows assumed per loop of an index search when estimating plan cost
+SEARCH_ROWS = 10
+
+ALLOWED_STATEMENT = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+# Nested-loop steps of a query plan: "SCAN t", "SCAN t USING INDEX ...", "SEARCH t USING ..."
+PLAN_LOOP = re.compile(r'^(SCAN|SEARCH) (\w+)(?: AS \w+)?(?: (.*))?$')
+
+# Table names and aliases in FROM / JOIN clauses
+TABLE_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+# A trailing ORDER BY on a single column, which continuation by key can resume from
+ORDER_BY_COLUMN = re.compile(r'\bORDER\s+BY\s+(?:\w+\.)?"?([A-Za-z_]\w*)"?(?:\s+(ASC|DESC))?$', re.IGNORECASE)
+
+CURSOR_SALT = 'sql-cursor'
+
+
+class StaleCursorError(ValueError):
+    """A continuation cursor from before the data last changed"""
+
+
+def check_statement(sql):
+    """Return sql without trailing semicolons, raising ValueError unless it is a single read query"""
+    sql = sql.strip().rstrip(';').strip()
+    if not ALLOWED_STATEMENT.match(sql):
+        raise ValueError('Only SELECT queries are allowed')
+    return sql
+
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    # The connection is read-only already; this keeps other files and settings out of reach too
+    if action in (sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH, sqlite3.SQLITE_PRAGMA):
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+def open_readonly(db_path):
+    """Open db_path read-only, refusing ATTACH, DETACH and PRAGMA statements"""
+    uri = f"file:{quote(os.path.abspath(db_path))}?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    conn.execute("PRAGMA query_only = ON")
+    conn.set_authorizer(_authorize)
+    return conn
+
+
+def _table_rows(conn, table, cache):
+    """Row count of a table, from ANALYZE statistics when available"""
+    if table not in cache:
+        rows = None
+        try:
+            stat = conn.execute(
+                "SELECT stat FROM sqlite_stat1 WHERE tbl = ? ORDER BY idx IS NOT NULL LIMIT 1", (table,)
+            ).fetchone()
+            if stat:
+                rows = int(stat[0].split()[0])
+        except sqlite3.OperationalError:
+            pass
+        if rows is None:
+            try:
+                rows = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+            except sqlite3.Error:
+                rows = 1
+        cache[table] = rows
+    return cache[table]
+
+
+def estimate_cost(conn, sql, params=()):
+    """Estimate how many rows the plan for sql visits.
+
+    Plan steps name tables by their alias. Aliases found in FROM / JOIN clauses
+    are resolved to their tables; any other name (an alias in a comma join, a
+    CTE or a subquery) is costed as the largest table the query reads, which
+    errs towards rejecting.
+    """
+    tables_read = set()
+
+    def authorize(action, arg1, arg2, db_name, trigger):
+        if action == sqlite3.SQLITE_READ and arg1:
+            tables_read.add(arg1)
+        return _authorize(action, arg1, arg2, db_name, trigger)
+
+    conn.set_authorizer(authorize)
+    try:
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    finally:
+        conn.set_authorizer(_authorize)
+
+    table_rows = {}
+    aliases = {table: table for table in tables_read}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        if table in tables_read and alias:
+            aliases.setdefault(alias, table)
+    largest = max((_table_rows(conn, table, table_rows) for table in tables_read), default=1)
+
+    children = defaultdict(list)
+    for node_id, parent, _, detail in plan:
+        children[parent].append((node_id, detail))
+
+    def cost(parent):
+        loops = None
+        nested = 0
+        for node_id, detail in children[parent]:
+            step = PLAN_LOOP.match(detail)
+            if step and step.group(2) != 'CONSTANT':
+                kind, name, rest = step.groups()
+                rows = _table_rows(conn, aliases[name], table_rows) if name in aliases else largest
+                if kind == 'SEARCH' and rest and 'USING' in rest:
+                    rows = min(rows, SEARCH_ROWS)
+                loops = (loops or 1) * max(rows, 1)
+            nested += cost(node_id)
+        return (loops or 0) + nested
+
+    return cost(0)
+
+
+def _cursor_serializer(secret_key):
+    return URLSafeSerializer(secret_key, salt=CURSOR_SALT)
+
+
+def _sql_digest(sql):
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()[:16]
+
+
+def encode_cursor(secret_key, sql, offset, version, after=None):
+    """Signed token for the page of sql's results starting at offset, or after the key `after`"""
+    return _cursor_serializer(secret_key).dumps(
+        {'sql': _sql_digest(sql), 'offset': offset, 'version': version, 'after': after}
+    )
+
+
+def decode_cursor(secret_key, token, sql, version):
+    """(offset, after) a continuation cursor points at, checking it belongs to sql and the current data"""
+    try:
+        cursor = _cursor_serializer(secret_key).loads(token)
+    except BadSignature:
+        raise ValueError('Invalid cursor')
+    if cursor.get('sql') != _sql_digest(sql):
+        raise ValueError('Cursor does not belong to this query')
+    if cursor.get('version') != version:
+        raise StaleCursorError('The data has changed since this cursor was issued; rerun the query from the start')
+    return cursor['offset'], cursor.get('after')
+
+
+class GuardedQuery:
+    """A read query running under the cost check, time budget and row cap.
+
+    Construction runs the pre-flight check, starts the statement and fetches
+    the first chunk, so errors surface before a response is started. Iterate
+    partitions() to read the page; afterwards `sent`, `has_more` and `error`
+    describe how it ended, and next_position() where the next page starts.
+    The connection closes once the page is read. Like a SQLAlchemy Result, it
+    can be passed to stream_rows_response.
+    """
+
+    def __init__(self, db_path, sql, offset=0, after=None, max_rows=MAX_ROWS,
+                 time_budget=TIME_BUDGET_SECONDS, max_cost=MAX_ESTIMATED_ROWS):
+        self.sql = check_statement(sql)
+        self.offset = offset
+        self.max_rows = max_rows
+        self.time_budget = time_budget
+        self.sent = 0
+        self.has_more = False
+        self.error = None
+        # (last key sent, key of the row after it) when the page stopped at the row cap
+        self._boundary = None
+        self._deadline = None
+        order = ORDER_BY_COLUMN.search(self.sql)
+        self.order_column = order.group(1) if order else None
+        self.descending = bool(order and order.group(2) and order.group(2).upper() == 'DESC')
+
+        statement, params = self.sql, ()
+        if after is not None:
+            if self.order_column is None:
+                raise ValueError('Invalid cursor')
+            statement, params = self._after_key(after)
+        elif offset > MAX_OFFSET:
+            raise ValueError(
+                f"Can't continue past {MAX_OFFSET:,} rows unless the query ends in ORDER BY one of its "
+                "result columns; add filters or aggregate further"
+            )
+
+        self.conn = open_readonly(db_path)
+        try:
+            self.estimated_rows = estimate_cost(self.conn, statement, params)
+            if self.estimated_rows > max_cost:
+                raise ValueError(
+                    f"Query would visit about {self.estimated_rows:,} rows (limit {max_cost:,}); "
+                    "add filters on indexed columns or aggregate further"
+                )
+            self.conn.set_progress_handler(lambda: time.monotonic() > self._deadline, PROGRESS_STEPS)
+            self._start_budget()
+            self.cursor = self.conn.execute(statement, params)
+            self.columns = [description[0] for description in self.cursor.description or ()]
+            self.key_index = self._key_index()
+            if after is None:
+                self._skip(offset)
+            self._first = self._fetch()
+        except sqlite3.Error as e:
+            self.close()
+            raise ValueError(self._describe(e))
+        except Exception:
+            self.close()
+            raise
+
+    def _after_key(self, after):
+        """The query restricted to rows past the key `after`, in the same order"""
+        column = f'"{self.order_column}"'
+        if self.descending:
+            # NULLs sort last when descending
+            return f"SELECT * FROM ({self.sql}) WHERE {column} < ? OR {column} IS NULL ORDER BY {column} DESC", (after,)
+        return f"SELECT * FROM ({self.sql}) WHERE {column} > ? ORDER BY {column}", (after,)
+
+    def _key_index(self):
+        if self.order_column is None:
+            return None
+        names = [column.lower() for column in self.columns]
+        if names.count(self.order_column.lower()) != 1:
+            return None
+        return names.index(self.order_column.lower())
+
+    def _start_budget(self):
+        self._deadline = time.monotonic() + self.time_budget
+
+    def _describe(self, error):
+        if 'interrupted' in str(error):
+            return f"Query exceeded the {self.time_budget:g}s time budget"
+        return str(error)
+
+    def next_position(self):
+        """(offset, after) for a cursor continuing where this page stopped"""
+        after = None
+        if self._boundary is not None:
+            last, following = self._boundary
+            # Resuming past a key is only exact when the page ended between two different keys
+            if isinstance(last, (int, float, str)) and last != following:
+                after = last
+        return self.offset + self.sent, after
+
+    def _skip(self, rows):
+        while rows > 0:
+            skipped = len(self.cursor.fetchmany(min(rows, STREAM_CHUNK_ROWS)))
+            if not skipped:
+                return
+            rows -= skipped
+
+    def keys(self):
+        """Column names of the result, as Result.keys() gives them"""
+        return self.columns
+
+    def _fetch(self):
+        # One row past the cap shows whether another page follows
+        room = self.max_rows + 1 - self.sent
+        if room <= 0:
+            return []
+        self._start_budget()
+        return self.cursor.fetchmany(min(room, STREAM_CHUNK_ROWS))
+
+    def partitions(self):
+        """Yield the page's rows in chunks of at most STREAM_CHUNK_ROWS"""
+        try:
+            chunk = self._first
+            last_row = None
+            while chunk:
+                if self.sent + len(chunk) > self.max_rows:
+                    room = self.max_rows - self.sent
+                    last_row = chunk[room - 1] if room else last_row
+                    if self.key_index is not None:
+                        self._boundary = (last_row[self.key_index], chunk[room][self.key_index])
+                    chunk = chunk[:room]
+                    self.has_more = True
+                self.sent += len(chunk)
+                if chunk:
+                    last_row = chunk[-1]
+                yield chunk
+                if self.has_more:
+                    break
+                chunk = self._fetch()
+        except sqlite3.OperationalError as e:
+            # Too late for an error status; the client gets a cursor to resume from instead
+            self.error = self._describe(e)
+        finally:
+            self.close()
+
+    def close(self):
+        self.conn.close()
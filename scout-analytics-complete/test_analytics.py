@@ -0,0 +1,641 @@
+import pytest
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import Flask
+from sqlalchemy import create_engine, func, select, text
+from src import data_loader
+from src.json_rows import STREAM_CHUNK_ROWS
+from src.models.analytics import Customer, Product, Store, Substitution, Transaction, TransactionItem, db
+from src import demographics, snapshot, sql_guard
+from src.dataset_version import bump_table_version, get_dataset_version, get_table_version
+from src.readiness import DEGRADED, READY, Readiness
+from src.routes import analytics as analytics_routes
+from src.sql_cache import ResultCache, normalize_sql
+from src.sql_guard import GuardedQuery, StaleCursorError, check_statement, decode_cursor, encode_cursor, open_readonly
+from src.scoutbot import ScoutBot, ScoutBotOverloaded
+from src.rollups import CATEGORY_ROLLUP, VOLUME_ROLLUP, ensure_rollups, refresh_category_rollup
+from src.routes.analytics import analytics_bp
+
+# More transactions than one streamed partition holds
+TRANSACTION_COUNT = STREAM_CHUNK_ROWS * 2 + 500
+
+# Small source CSVs, in the columns data_loader reads
+CSV_FILES = {
+    'transactions.csv': 'transaction_id,created_at,store_id,store_location,device_id,total_amount,payment_method,customer_id\n'
+                        '1,2025-05-01 09:00:00,1,Manila,d1,120.5,Cash,c1\n'
+                        '2,2025-05-02 10:00:00,1,Manila,d1,80.0,GCash,c2\n',
+    'stores.csv': 'store_id,name,location,barangay,city,region,latitude,longitude\n1,Store 1,Manila,Ermita,Manila,NCR,14.5,121.0\n',
+    'products.csv': 'name,brand_id,category\nProduct 1,b1,Beverages\nProduct 2,b1,Snacks\n',
+    'brands.csv': 'brand_id,name,category,is_tbwa,created_at\nb1,Brand 1,Beverages,True,2025-01-01\n',
+    'customers.csv': 'customer_id,age,gender,barangay,city,region\nc1,30,Female,Ermita,Manila,NCR\nc2,45,Male,Ermita,Manila,NCR\n',
+    'transaction_items.csv': 'transaction_id,product_id,quantity,price,unit_price\n1,1,2,100.0,50.0\n1,2,1,20.5,20.5\n2,2,4,80.0,20.0\n',
+    'devices.csv': 'device_id,device_type,location,store_id\nd1,kiosk,Manila,1\n',
+    'request_behaviors.csv': 'transaction_id,behavior_type,timestamp,details\n1,unsure,2025-05-01 09:00:00,pointing\n',
+    'substitutions.csv': 'transaction_id,original_product_id,substitute_product_id,reason\n2,1,2,Out of stock\n',
+}
+
+def create_app(db_path):
+    """A Flask app serving the analytics API from the database at db_path"""
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = 'test'
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    with app.app_context():
+        db.create_all()
+    return app
+
+SOURCE_DDL = [
+    "CREATE TABLE transactions (transaction_id INTEGER PRIMARY KEY, timestamp TEXT, total_amount REAL)",
+    "CREATE TABLE products (product_id TEXT PRIMARY KEY, category TEXT)",
+    "CREATE TABLE transaction_items (transaction_id INTEGER, product_id TEXT, quantity INTEGER, total_price REAL)",
+]
+
+@pytest.fixture
+def source_db(tmp_path):
+    """A small database with transactions, products and line items"""
+    db_path = tmp_path / 'scout.db'
+    conn = sqlite3.connect(db_path)
+    for statement in SOURCE_DDL:
+        conn.execute(statement)
+    conn.executemany(
+        "INSERT INTO transactions VALUES (?, ?, ?)",
+        [(i, f"2025-05-{i % 7 + 1:02d} {i % 24:02d}:15:00", 100.0 + i) for i in range(1, 51)]
+    )
+    conn.executemany("INSERT INTO products VALUES (?, ?)", [('p1', 'Beverages'), ('p2', 'Snacks')])
+    conn.executemany(
+        "INSERT INTO transaction_items VALUES (?, ?, ?, ?)",
+        [(i, 'p1' if i % 2 else 'p2', i % 3 + 1, 10.0 * (i % 3 + 1)) for i in range(1, 51)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+@pytest.fixture
+def csv_dir(tmp_path, monkeypatch):
+    """A data directory holding CSV_FILES, used by data_loader in place of the bundled CSVs"""
+    db_dir = tmp_path / 'database'
+    db_dir.mkdir()
+    for name, content in CSV_FILES.items():
+        (db_dir / name).write_text(content)
+    monkeypatch.setattr(data_loader, 'DATABASE_DIR', str(db_dir))
+    return db_dir
+
+@pytest.fixture
+def loader_app(tmp_path, csv_dir):
+    """An app over an empty database that data_loader fills from csv_dir"""
+    app = create_app(csv_dir / 'app.db')
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+class BlockingBackend:
+    """ScoutBot backend whose answers wait until released"""
+    name = 'blocking'
+    model = 'blocking'
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def complete(self, question):
+        self.calls += 1
+        self.release.wait(5)
+        return f"answer to {question}"
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def build_snapshot(db_dir, name, transaction_ids):
+    """Stamp a snapshot of a transactions table for the CSVs in db_dir and return its version"""
+    csv_names = ['transactions.csv']
+    hashes = snapshot.csv_hashes(db_dir, csv_names)
+    version = snapshot.dataset_version(hashes)
+    (db_dir / 'snapshot').mkdir(exist_ok=True)
+    conn = sqlite3.connect(db_dir / 'snapshot' / name)
+    conn.execute("CREATE TABLE transactions (transaction_id INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO transactions VALUES (?)", [(i,) for i in transaction_ids])
+    conn.commit()
+    conn.close()
+    snapshot.finalize_snapshot(db_dir / 'snapshot' / name, version)
+    snapshot.write_manifest(db_dir, version, hashes, name, {'transactions': len(transaction_ids)},
+                            snapshot.csv_stats(db_dir, csv_names))
+    return version
+
+def restore_snapshot(db_dir, db_path):
+    return snapshot.restore_snapshot(db_dir, db_path, ['transactions.csv'])
+
+def transaction_ids(db_path):
+    conn = sqlite3.connect(db_path)
+    ids = [row[0] for row in conn.execute("SELECT transaction_id FROM transactions ORDER BY 1")]
+    conn.close()
+    return ids
+
+def table_counts(*models):
+    return [db.session.execute(select(func.count()).select_from(model)).scalar() for model in models]
+
+@pytest.fixture
+def app(tmp_path):
+    """An analytics API over a small database created from the models"""
+    app = create_app(tmp_path / 'app.db')
+    with app.app_context():
+        db.session.execute(Transaction.__table__.insert(), [
+            {'transaction_id': i, 'timestamp': f"2025-05-{i % 28 + 1:02d} 10:00:00", 'store_id': str(i % 3 + 1),
+             'total_amount': 100.0 + i, 'payment_method': 'Cash', 'customer_id': f"c{i % 40}"}
+            for i in range(1, TRANSACTION_COUNT + 1)
+        ])
+        db.session.execute(Store.__table__.insert(), [
+            {'store_id': i, 'name': f"Store {i}", 'region': 'NCR', 'latitude': 14.5, 'longitude': 121.0}
+            for i in range(1, 4)
+        ])
+        db.session.execute(Product.__table__.insert(), [
+            {'product_id': f"prod_{i:04d}", 'name': f"Product {i}", 'category': 'Snacks' if i % 2 else 'Beverages',
+             'price': 10.0 * i, 'cost': 5.0 * i}
+            for i in range(1, 11)
+        ])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+def test_transactions_streams_every_row_across_partitions(client):
+    """Test a page larger than one partition streams as valid JSON with every row once"""
+    response = client.get(f"/api/transactions?limit={TRANSACTION_COUNT}")
+    assert response.status_code == 200
+    assert response.is_streamed
+    data = json.loads(response.data)
+    assert data['total'] == TRANSACTION_COUNT
+    assert data['offset'] == 0
+    assert [row['transaction_id'] for row in data['data']] == list(range(1, TRANSACTION_COUNT + 1))
+    assert data['data'][0] == {
+        'transaction_id': 1, 'timestamp': '2025-05-02 10:00:00', 'store_id': '2', 'store_location': None,
+        'device_id': None, 'total_amount': 101.0, 'payment_method': 'Cash', 'customer_id': 'c1'
+    }
+
+    page = json.loads(client.get('/api/transactions?limit=10&offset=100&store_id=1').data)
+    assert page['total'] == 10
+    assert all(row['store_id'] == '1' for row in page['data'])
+
+def test_columnar_shape_matches_records(client):
+    """Test the columnar shape carries the same rows as the records shape"""
+    records = json.loads(client.get('/api/transactions?limit=1500').data)
+    columnar = json.loads(client.get('/api/transactions?limit=1500&shape=columnar').data)
+    columns = columnar['data']['columns']
+    assert columnar['total'] == records['total'] == 1500
+    assert [dict(zip(columns, row)) for row in columnar['data']['rows']] == records['data']
+    assert client.get('/api/transactions?shape=xml').status_code == 400
+
+def test_stores_and_products_stream_row_counts(client):
+    """Test the store and product listings return every matching row"""
+    stores = json.loads(client.get('/api/stores').data)
+    assert [store['name'] for store in stores['data']] == ['Store 1', 'Store 2', 'Store 3']
+    assert set(stores['data'][0]) == {'store_id', 'name', 'location', 'barangay', 'city', 'region', 'latitude', 'longitude'}
+
+    products = json.loads(client.get('/api/products?category=Snacks').data)
+    assert len(products['data']) == 5
+    assert all(product['category'] == 'Snacks' for product in products['data'])
+    assert len(json.loads(client.get('/api/products?limit=3').data)['data']) == 3
+    columnar = json.loads(client.get('/api/products?shape=columnar').data)
+    assert columnar['data']['columns'] == ['product_id', 'name', 'category', 'brand_id', 'price', 'cost']
+    assert len(columnar['data']['rows']) == 10
+
+def test_reloading_csvs_replaces_rows_without_duplicates(loader_app, csv_dir):
+    """Test a second load upserts keyed tables and replaces unkeyed ones instead of appending"""
+    models = (Transaction, Product, TransactionItem, Substitution)
+    with loader_app.app_context():
+        stats = data_loader.load_csv_data()
+        assert stats['transaction_items']['rows'] == 3
+        assert table_counts(*models) == [2, 2, 3, 1]
+
+        (csv_dir / 'transactions.csv').write_text(CSV_FILES['transactions.csv'].replace('120.5', '99.0'))
+        data_loader.load_csv_data()
+        assert table_counts(*models) == [2, 2, 3, 1]
+        assert db.session.get(Transaction, 1).total_amount == 99.0
+
+def test_readiness_degraded_when_a_table_fails_to_load(loader_app, csv_dir):
+    """Test a load with a failed table leaves the API serving but not ready"""
+    (csv_dir / 'stores.csv').write_text('name\nStore without an id\n')
+    readiness = Readiness()
+    readiness.begin_load([table_name for table_name, *_ in data_loader.TABLES])
+    with loader_app.app_context():
+        loaded = data_loader.load_csv_data(progress=readiness.table_progress)
+    readiness.finish(loaded=loaded)
+
+    snapshot = readiness.snapshot()
+    assert snapshot['state'] == DEGRADED
+    assert not snapshot['ready'] and readiness.serving
+    assert snapshot['error'] == 'Tables failed to load: stores'
+    assert snapshot['tables']['stores']['status'] == 'failed'
+    assert snapshot['tables']['transactions'] == {'status': 'loaded', 'rows': 2, 'seconds': loaded['transactions']['seconds']}
+
+    readiness = Readiness()
+    readiness.begin_load(['transactions'])
+    readiness.finish(loaded={'transactions': loaded['transactions']})
+    assert readiness.snapshot()['state'] == READY
+
+def test_restore_snapshot_keeps_databases_with_app_data(tmp_path):
+    """Test a snapshot replaces a missing or untouched restored database but never one holding other data"""
+    (tmp_path / 'transactions.csv').write_text('transaction_id\n1\n')
+    version = build_snapshot(tmp_path, 'app-1.db', [1])
+    db_path = tmp_path / 'app.db'
+    assert restore_snapshot(tmp_path, db_path) == version
+    assert restore_snapshot(tmp_path, db_path) == version
+
+    db_path.unlink()
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT)")
+    conn.execute("INSERT INTO users VALUES (1, 'analyst')")
+    conn.commit()
+    conn.close()
+    assert restore_snapshot(tmp_path, db_path) is None
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT username FROM users").fetchall() == [('analyst',)]
+    conn.close()
+
+def test_restore_snapshot_keeps_a_restored_database_once_written(tmp_path):
+    """Test a newer snapshot replaces an untouched restored database but not one the app wrote to"""
+    (tmp_path / 'transactions.csv').write_text('transaction_id\n1\n')
+    build_snapshot(tmp_path, 'app-1.db', [1])
+    db_path = tmp_path / 'app.db'
+    restore_snapshot(tmp_path, db_path)
+
+    (tmp_path / 'transactions.csv').write_text('transaction_id\n1\n2\n')
+    version = build_snapshot(tmp_path, 'app-2.db', [1, 2])
+    assert restore_snapshot(tmp_path, db_path) == version
+    assert transaction_ids(db_path) == [1, 2]
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("DELETE FROM transactions WHERE transaction_id = 2")
+    conn.commit()
+    conn.close()
+    assert snapshot.database_version(db_path) == (version, True)
+    (tmp_path / 'transactions.csv').write_text('transaction_id\n1\n2\n3\n')
+    build_snapshot(tmp_path, 'app-3.db', [1, 2, 3])
+    assert restore_snapshot(tmp_path, db_path) is None
+    assert transaction_ids(db_path) == [1]
+
+def test_restore_snapshot_hashes_csvs_only_when_changed(tmp_path, monkeypatch):
+    """Test CSVs matching the manifest's size and mtime aren't hashed, and changed ones are"""
+    csv_path = tmp_path / 'transactions.csv'
+    csv_path.write_text('transaction_id\n1\n')
+    version = build_snapshot(tmp_path, 'app-1.db', [1])
+    hashed = []
+    file_sha256 = snapshot.file_sha256
+    monkeypatch.setattr(snapshot, 'file_sha256', lambda path: hashed.append(path) or file_sha256(path))
+
+    assert restore_snapshot(tmp_path, tmp_path / 'app.db') == version
+    assert restore_snapshot(tmp_path, tmp_path / 'app.db') == version
+    assert hashed == []
+
+    csv_path.write_text('transaction_id\n2\n')
+    (tmp_path / 'app.db').unlink()
+    assert restore_snapshot(tmp_path, tmp_path / 'app.db') is None
+    assert len(hashed) == 1
+
+def test_volume_rollup_triggers_match_full_recompute(source_db):
+    """Test the trigger-maintained hourly rollup equals a GROUP BY over transactions"""
+    engine = create_engine(f"sqlite:///{source_db}")
+    ensure_rollups(engine)
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO transactions VALUES (51, '2025-05-09 08:00:00', 10), (52, '2025-05-09 08:30:00', 20)"
+        ))
+        connection.execute(text("UPDATE transactions SET timestamp = '2025-05-10 23:59:00' WHERE transaction_id <= 5"))
+        connection.execute(text("DELETE FROM transactions WHERE transaction_id BETWEEN 20 AND 30"))
+
+    with engine.connect() as connection:
+        maintained = connection.execute(text(
+            f"SELECT day, hour, transactions FROM {VOLUME_ROLLUP} WHERE transactions != 0 ORDER BY day, hour"
+        )).all()
+        recomputed = connection.execute(text("""
+            SELECT date(timestamp), CAST(strftime('%H', timestamp) AS INTEGER), COUNT(*)
+            FROM transactions GROUP BY 1, 2 ORDER BY 1, 2
+        """)).all()
+    engine.dispose()
+    assert maintained == recomputed
+
+def test_volume_route_reads_the_rollup(app, client):
+    """Test /volume charts every day of the window ending at the latest day with data"""
+    with app.app_context():
+        ensure_rollups(db.engine)
+
+    data = json.loads(client.get('/api/volume?days=7').data)
+    assert [day['date'] for day in data['daily']] == [f"2025-05-{day}" for day in range(22, 29)]
+    assert sum(day['volume'] for day in data['daily']) == sum(
+        1 for i in range(1, TRANSACTION_COUNT + 1) if i % 28 + 1 >= 22
+    )
+    assert [hour['volume'] for hour in data['hourly'] if hour['hour'] != '10:00'] == [0] * 23
+
+    assert len(json.loads(client.get('/api/volume').data)['daily']) == 30
+    assert client.get('/api/volume?days=0').status_code == 400
+
+def test_table_versions_count_loads(loader_app):
+    """Test every table load bumps its version and the dataset version"""
+    with loader_app.app_context():
+        assert get_dataset_version(db.session) == 0
+        data_loader.load_csv_data()
+        assert get_table_version(db.session, 'customers') == 1
+        first = get_dataset_version(db.session)
+        data_loader.load_csv_data()
+        assert get_table_version(db.session, 'customers') == 2
+        assert get_table_version(db.session, 'missing') == 0
+        assert get_dataset_version(db.session) > first
+
+def test_demographics_served_from_cube_per_customers_version(loader_app, monkeypatch):
+    """Test marginals and cross-tabs come from one cached cube that a customers load invalidates"""
+    monkeypatch.setattr(demographics, '_cache', {'version': None, 'cells': None})
+    client = loader_app.test_client()
+    with loader_app.app_context():
+        data_loader.load_csv_data()
+        cells = demographics.cube_cells(db.session)
+        assert cells == [('25-34', 'Female', 'NCR', 1), ('45-54', 'Male', 'NCR', 1)]
+        assert demographics.cube_cells(db.session) is cells
+
+    data = json.loads(client.get('/api/demographics').data)
+    assert data == {
+        'age_groups': [{'age_group': '25-34', 'count': 1}, {'age_group': '45-54', 'count': 1}],
+        'gender': [{'gender': 'Female', 'count': 1}, {'gender': 'Male', 'count': 1}],
+        'regions': [{'region': 'NCR', 'count': 2}]
+    }
+    filtered = json.loads(client.get('/api/demographics?gender=Male&crosstab=age_group,region').data)
+    assert filtered['age_groups'] == [{'age_group': '45-54', 'count': 1}]
+    assert filtered['crosstab'] == [{'age_group': '45-54', 'region': 'NCR', 'count': 1}]
+    assert client.get('/api/demographics?crosstab=gender,gender').status_code == 400
+
+    with loader_app.app_context():
+        db.session.execute(Customer.__table__.insert(), [{'customer_id': 'c3', 'age': 19, 'gender': 'Male', 'region': 'Visayas'}])
+        bump_table_version(db.session, 'customers')
+        db.session.commit()
+    regions = json.loads(client.get('/api/demographics').data)['regions']
+    assert regions == [{'region': 'NCR', 'count': 2}, {'region': 'Visayas', 'count': 1}]
+
+def test_category_rollup_refresh_of_touched_days_matches_full_recompute(source_db):
+    """Test refreshing only the days a change touched gives the same rollup as a full rebuild"""
+    engine = create_engine(f"sqlite:///{source_db}")
+    ensure_rollups(engine)
+    rollup = f"SELECT day, category, revenue, units, transactions FROM {CATEGORY_ROLLUP} ORDER BY day, category"
+    with engine.begin() as connection:
+        # Moves transaction 3 from 2025-05-04 to 2025-05-06
+        connection.execute(text("UPDATE transactions SET timestamp = '2025-05-06 10:00:00' WHERE transaction_id = 3"))
+        refresh_category_rollup(connection, '2025-05-04', '2025-05-06')
+        partial = connection.execute(text(rollup)).all()
+        refresh_category_rollup(connection)
+        full = connection.execute(text(rollup)).all()
+    engine.dispose()
+    assert partial == full
+
+def test_transaction_day_range_covers_old_and_new_days(loader_app, csv_dir):
+    """Test a reload's day range spans the days in the CSV and the days its ids were stored under"""
+    with loader_app.app_context():
+        data_loader.load_csv_data()
+        (csv_dir / 'transactions.csv').write_text(
+            CSV_FILES['transactions.csv'].replace('2025-05-02 10:00:00', '2025-05-20 10:00:00')
+        )
+        frame = data_loader.transactions_frame(str(csv_dir))
+        assert data_loader.transaction_day_range(frame) == ('2025-05-01', '2025-05-20')
+        assert data_loader.transaction_day_range(frame.iloc[1:]) == ('2025-05-02', '2025-05-20')
+        assert data_loader.transaction_day_range(frame.iloc[:0]) is None
+
+def test_category_mix_from_loaded_items(loader_app):
+    """Test loaded items join to their products and /category-mix reports real revenue per category"""
+    client = loader_app.test_client()
+    with loader_app.app_context():
+        data_loader.load_csv_data()
+
+    data = json.loads(client.get('/api/category-mix').data)['data']
+    assert data == [
+        {'category': 'Snacks', 'count': 2, 'avg_price': 20.1, 'revenue': 100.5, 'units': 5, 'transactions': 2, 'share': 50.1},
+        {'category': 'Beverages', 'count': 1, 'avg_price': 50.0, 'revenue': 100.0, 'units': 2, 'transactions': 1, 'share': 49.9},
+    ]
+    may_2 = json.loads(client.get('/api/category-mix?from_date=2025-05-02&to_date=2025-05-02').data)['data']
+    assert [(row['category'], row['revenue'], row['share']) for row in may_2] == [('Snacks', 80.0, 100.0)]
+
+def read_page(query):
+    return [row for chunk in query.partitions() for row in chunk]
+
+def test_sql_guard_allows_only_read_queries(source_db):
+    """Test writes, multiple statements and PRAGMAs are refused"""
+    with pytest.raises(ValueError, match='Only SELECT'):
+        check_statement("DELETE FROM transactions")
+    with pytest.raises(ValueError):
+        GuardedQuery(str(source_db), "SELECT 1; DELETE FROM transactions")
+    with pytest.raises(ValueError, match='not authorized'):
+        GuardedQuery(str(source_db), "SELECT * FROM pragma_table_info('transactions')")
+
+    conn = open_readonly(str(source_db))
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM transactions")
+    conn.close()
+
+def test_sql_guard_caps_rows_and_pages_with_cursor(source_db):
+    """Test the row cap and offset cursors walk an unordered result exactly once"""
+    sql = "SELECT transaction_id FROM transactions"
+    first = GuardedQuery(str(source_db), sql, max_rows=20)
+    rows = read_page(first)
+    assert len(rows) == 20
+    assert first.has_more
+    assert first.next_position() == (20, None)
+
+    token = encode_cursor('secret', sql, 20, version=3)
+    assert decode_cursor('secret', token, sql, 3) == (20, None)
+    with pytest.raises(StaleCursorError):
+        decode_cursor('secret', token, sql, 4)
+    with pytest.raises(ValueError, match='does not belong'):
+        decode_cursor('secret', token, "SELECT 1", 3)
+
+    last = GuardedQuery(str(source_db), sql, offset=40, max_rows=20)
+    rows += read_page(last)
+    assert not last.has_more
+    assert [row[0] for row in rows] == list(range(1, 21)) + list(range(41, 51))
+
+def test_sql_guard_continues_ordered_queries_by_key(source_db):
+    """Test ORDER BY a result column resumes past the last key instead of skipping rows"""
+    for direction, expected in (('', list(range(1, 51))), (' DESC', list(range(50, 0, -1)))):
+        sql = f"SELECT transaction_id, total_amount FROM transactions ORDER BY transaction_id{direction}"
+        offset, after, ids = 0, None, []
+        while True:
+            query = GuardedQuery(str(source_db), sql, offset=offset, after=after, max_rows=15)
+            ids += [row[0] for row in read_page(query)]
+            if not query.has_more:
+                break
+            offset, after = query.next_position()
+            assert after == ids[-1]
+        assert ids == expected
+
+    # A page ending inside a run of equal keys falls back to the offset
+    sql = "SELECT transaction_id, date(timestamp) AS day FROM transactions ORDER BY day"
+    query = GuardedQuery(str(source_db), sql, max_rows=10)
+    assert [row[1] for row in read_page(query)][-1] == '2025-05-02'
+    assert query.next_position() == (10, None)
+
+def test_sql_guard_caps_offsets_of_unkeyed_queries(source_db, monkeypatch):
+    """Test offset continuation stops at MAX_OFFSET while key continuation has no depth limit"""
+    monkeypatch.setattr(sql_guard, 'MAX_OFFSET', 30)
+    with pytest.raises(ValueError, match='past 30 rows'):
+        GuardedQuery(str(source_db), "SELECT transaction_id FROM transactions", offset=40)
+    keyed = GuardedQuery(str(source_db), "SELECT transaction_id FROM transactions ORDER BY transaction_id",
+                         offset=40, after=40)
+    assert [row[0] for row in read_page(keyed)] == list(range(41, 51))
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        GuardedQuery(str(source_db), "SELECT transaction_id FROM transactions", after=40)
+
+def test_sql_guard_enforces_cost_and_time_budgets(source_db):
+    """Test expensive plans are rejected unrun and long queries are interrupted"""
+    with pytest.raises(ValueError, match='would visit'):
+        GuardedQuery(str(source_db), "SELECT COUNT(*) FROM transactions a, transactions b", max_cost=100)
+
+    endless = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) SELECT COUNT(*) FROM n"
+    started = time.monotonic()
+    with pytest.raises(ValueError, match='time budget'):
+        GuardedQuery(str(source_db), endless, time_budget=0.2)
+    assert time.monotonic() - started < 5
+
+def test_sql_guard_time_budget_is_per_fetch(source_db):
+    """Test time spent waiting on the client between chunks doesn't count against the budget"""
+    numbers = "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n LIMIT 5000) SELECT x FROM n"
+    query = GuardedQuery(str(source_db), numbers, max_rows=5000, time_budget=0.2)
+    rows = 0
+    for chunk in query.partitions():
+        rows += len(chunk)
+        time.sleep(0.25)
+    assert query.error is None
+    assert rows == 5000
+
+def test_sql_route_pages_through_ordered_results(app, client):
+    """Test /sql returns capped pages whose cursors resume by key until every row is sent"""
+    sql = "SELECT transaction_id, total_amount FROM transactions ORDER BY transaction_id"
+    ids = []
+    body = {'sql': sql, 'max_rows': 1000}
+    while True:
+        page = json.loads(client.post('/api/sql', json=body).data)
+        ids += [row['transaction_id'] for row in page['data']]
+        assert page['row_count'] == len(page['data'])
+        if not page['next_cursor']:
+            break
+        assert decode_cursor('test', page['next_cursor'], normalize_sql(sql), 0) == (len(ids), ids[-1])
+        body['cursor'] = page['next_cursor']
+    assert ids == list(range(1, TRANSACTION_COUNT + 1))
+    assert not page['truncated']
+
+def test_result_cache_invalidates_on_dataset_version():
+    """Test a new dataset version empties the cache and LRU eviction keeps it in budget"""
+    cache = ResultCache(max_bytes=800)
+    assert cache.put('a', 1, b'x' * 50, {})
+    assert cache.get('a', 1) == (b'x' * 50, {})
+    assert cache.get('a', 2) is None
+    assert cache.stats()['invalidations'] == 1
+
+    for key in 'bcdefghijklmnopq':
+        cache.put(key, 2, b'y' * 60, {})
+    stats = cache.stats()
+    assert stats['bytes'] <= 800
+    assert stats['evictions'] > 0
+    assert cache.get('b', 2) is None
+    assert cache.get('q', 2) is not None
+
+def test_normalize_sql_never_joins_operators():
+    """Test layout, case and IN list order share a key but separated operators don't"""
+    assert normalize_sql("SELECT *  FROM t WHERE a IN (3, 1, 2);") == normalize_sql("select * from t where a in(1,2,3)")
+    assert normalize_sql("select * from t where a <= b") == normalize_sql("select * from t where a<=b")
+    assert normalize_sql("select * from t where a < = b") != normalize_sql("select * from t where a <= b")
+    assert normalize_sql("select 'A  B'") != normalize_sql("select 'a b'")
+
+def test_sql_route_serves_repeats_from_cache_until_a_load(app, client, monkeypatch):
+    """Test a reformatted repeat of a query is a cache hit with the same body, and a load makes it a miss"""
+    monkeypatch.setattr(analytics_routes, 'result_cache', ResultCache())
+    first = client.post('/api/sql', json={'sql': "SELECT store_id, COUNT(*) AS n FROM transactions GROUP BY store_id"})
+    assert first.headers['X-Cache'] == 'MISS'
+    first_body = json.loads(first.data)
+    repeat = client.post('/api/sql', json={'sql': "select store_id, count(*) as n\nfrom transactions group by store_id;"})
+    assert repeat.headers['X-Cache'] == 'HIT'
+    repeat_body = json.loads(repeat.data)
+    assert repeat_body['data'] == first_body['data']
+    assert sum(row['n'] for row in repeat_body['data']) == TRANSACTION_COUNT
+    assert {key: value for key, value in repeat_body.items() if key != 'sql'} == \
+        {key: value for key, value in first_body.items() if key != 'sql'}
+
+    with app.app_context():
+        bump_table_version(db.session, 'transactions')
+        db.session.commit()
+    again = client.post('/api/sql', json={'sql': "SELECT store_id, COUNT(*) AS n FROM transactions GROUP BY store_id"})
+    assert again.headers['X-Cache'] == 'MISS'
+    assert json.loads(client.get('/api/sql/cache').data)['invalidations'] == 1
+
+def test_scoutbot_counts_shared_waiters_against_capacity():
+    """Test requests sharing a call still take capacity and the rest are refused"""
+    backend = BlockingBackend()
+    bot = ScoutBot(backend, max_concurrency=1, max_queue=1)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(bot.ask('Top categories?'))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    wait_for(lambda: bot.stats()['waiting'] == 2)
+
+    with pytest.raises(ScoutBotOverloaded):
+        bot.ask('top   CATEGORIES?')
+    with pytest.raises(ScoutBotOverloaded):
+        bot.ask('Another question')
+
+    backend.release.set()
+    for thread in threads:
+        thread.join()
+    assert sorted(shared for _, shared in results) == [False, True]
+    assert backend.calls == 1
+    stats = bot.stats()
+    assert stats['rejected'] == 2
+    assert stats['waiting'] == stats['in_flight'] == 0
+
+def test_scoutbot_cancels_queued_calls_nobody_waits_for():
+    """Test a question that times out while queued frees its slot without reaching the backend"""
+    backend = BlockingBackend()
+    bot = ScoutBot(backend, max_concurrency=1, max_queue=1)
+    running = threading.Thread(target=lambda: bot.ask('Busy question'))
+    running.start()
+    wait_for(lambda: backend.calls == 1)
+
+    with pytest.raises(FutureTimeoutError):
+        bot.ask('Queued question', timeout=0.1)
+    stats = bot.stats()
+    assert stats['timeouts'] == 1
+    assert stats['waiting'] == 1 and stats['in_flight'] == 1
+
+    backend.release.set()
+    running.join()
+    assert backend.calls == 1
+    assert bot.ask('Queued question') == ('answer to Queued question', False)
+
+def test_ask_route_returns_503_at_capacity(monkeypatch):
+    """Test /ask refuses at once with Retry-After while ScoutBot is full"""
+    backend = BlockingBackend()
+    bot = ScoutBot(backend, max_concurrency=1, max_queue=0)
+    monkeypatch.setattr(analytics_routes, 'get_scoutbot', lambda: bot)
+    app = Flask(__name__)
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    client = app.test_client()
+
+    waiting = threading.Thread(target=lambda: bot.ask('Busy question'))
+    waiting.start()
+    wait_for(lambda: bot.stats()['waiting'] == 1)
+    response = client.post('/api/ask', json={'query': 'Another question'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == str(analytics_routes.SCOUTBOT_RETRY_AFTER_SECONDS)
+
+    backend.release.set()
+    waiting.join()
+    response = client.post('/api/ask', json={'query': 'Another question'})
+    assert response.status_code == 200
+    assert json.loads(response.data)['response'] == 'answer to Another question'
+    assert client.post('/api/ask', json={'query': '  '}).status_code == 400
@@ -6,8 +6,67 @@ Update Scout Analytics Mock API with Enhanced Dataset
 import sqlite3
 import pandas as pd
 import os
+import re
+import time
 from pathlib import Path
 
+# Suffix of the copies built tables are staged in before they replace the live ones
+SHADOW_SUFFIX = '__shadow'
+
+def swap_database(build_path, db_path):
+    """Replace the tables of db_path with the fully built ones at build_path.
+    
+    The build database is attached to the live one and each built table is
+    copied into a shadow table beside its live counterpart. Then a single
+    BEGIN IMMEDIATE transaction drops the live tables, renames the shadows
+    into place and recreates their indexes. Readers (in WAL mode) keep using
+    their open connections and see either all old tables or all new ones,
+    never a mix or a missing table. Tables the build doesn't contain, such as
+    users written by the API, are left as they are.
+    """
+    started = time.perf_counter()
+    live = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        live.execute("PRAGMA journal_mode=WAL")
+        # Views and foreign keys name the live tables, which the renames below restore
+        live.execute("PRAGMA legacy_alter_table=ON")
+        live.execute("ATTACH DATABASE ? AS build", (build_path,))
+        tables = live.execute(
+            "SELECT name, sql FROM build.sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        ).fetchall()
+        indexes = live.execute(
+            "SELECT tbl_name, sql FROM build.sqlite_master WHERE type = 'index' AND sql IS NOT NULL"
+        ).fetchall()
+        
+        try:
+            for name, sql in tables:
+                shadow = f"{name}{SHADOW_SUFFIX}"
+                live.execute(f'DROP TABLE IF EXISTS main."{shadow}"')
+                live.execute(re.sub(r'^CREATE TABLE\s+("?)' + re.escape(name) + r'\1',
+                                    f'CREATE TABLE main."{shadow}"', sql, count=1))
+                live.execute(f'INSERT INTO main."{shadow}" SELECT * FROM build."{name}"')
+            
+            live.execute("BEGIN IMMEDIATE")
+            try:
+                for name, _ in tables:
+                    live.execute(f'DROP TABLE IF EXISTS main."{name}"')
+                    live.execute(f'ALTER TABLE main."{name}{SHADOW_SUFFIX}" RENAME TO "{name}"')
+                # Index names are global, so they can only be created once the old tables are gone
+                for _, sql in indexes:
+                    live.execute(sql)
+                live.execute("COMMIT")
+            except Exception:
+                live.execute("ROLLBACK")
+                raise
+        finally:
+            for name, _ in tables:
+                live.execute(f'DROP TABLE IF EXISTS main."{name}{SHADOW_SUFFIX}"')
+            live.execute("DETACH DATABASE build")
+    finally:
+        live.close()
+    os.remove(build_path)
+    print(f"Swapped in {len(tables)} tables into {db_path} in {(time.perf_counter() - started) * 1000:.1f} ms")
+
 def update_database_with_enhanced_data():
     """Update the SQLite database with enhanced dataset"""
     print("=== Updating Mock API Database with Enhanced Dataset ===")
@@ -16,20 +75,14 @@ def update_database_with_enhanced_data():
     db_path = '/home/ubuntu/scout-analytics-api/scout_analytics.db'
     enhanced_data_dir = '/home/ubuntu/enhanced_output'
     
-    # Connect to database
-    conn = sqlite3.connect(db_path)
+    # Build into a side database and swap it in once loaded and indexed, so the
+    # API keeps serving the current data instead of empty or missing tables
+    build_path = f"{db_path}.building"
+    if os.path.exists(build_path):
+        os.remove(build_path)
+    conn = sqlite3.connect(build_path)
     cursor = conn.cursor()
     
-    # Drop existing tables to recreate with new data
-    tables_to_drop = [
-        'transactions', 'transaction_items', 'products', 'brands', 
-        'stores', 'customers', 'devices', 'substitutions', 'request_behaviors'
-    ]
-    
-    print("Dropping existing tables...")
-    for table in tables_to_drop:
-        cursor.execute(f"DROP TABLE IF EXISTS {table}")
-    
     # Create tables with enhanced schema
     print("Creating enhanced tables...")
     
@@ -238,6 +291,8 @@ def update_database_with_enhanced_data():
     conn.commit()
     conn.close()
     
+    swap_database(build_path, db_path)
+    
     print("Database update completed successfully!")
     
     # Verify data counts